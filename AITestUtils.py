@@ -1,11 +1,15 @@
 import os
-import json
-import time
-import requests
-import re
 import pandas as pd
 from openpyxl.styles import Alignment, Font, PatternFill, Border, Side
 from dotenv import load_dotenv
+from ai_client import AIClient, run_sync
+from case_generation import CaseGenerator, PRIORITY_MAP
+from metrics import METRICS
+from json_output import report_parse_stats
+from requirement_stream import stream_excel_requirements
+from structured_log import get_logger
+
+logger = get_logger("AITestUtils")
 
 class AITestSuiteUtils:
     def __init__(self):
@@ -24,6 +28,8 @@ class AITestSuiteUtils:
             "default": {
                 "api_key_env": "AI_API_KEY",
                 "endpoint": self.API_ENDPOINT,
+                "stream_format": "openai",  # 流式响应(SSE)格式
+                "json_format": "json_object",  # JSON输出方式，见ai_client.JSON_FORMATS
                 "headers": lambda key: {
                     "Authorization": f"Bearer {key}",
                     "Content-Type": "application/json; charset=utf-8"
@@ -47,10 +53,16 @@ class AITestSuiteUtils:
             "迭代": "迭代",
             "处理人": ""
         }
-        self.PRIORITY_MAP = {
-            "高": "High", "中": "Middle", "低": "Low", "可选": "Nice To Have",
-            "high": "High", "middle": "Middle", "low": "Low", "nice to have": "Nice To Have"
-        }
+        self.PRIORITY_MAP = PRIORITY_MAP
+        
+        # 异步调用引擎，复用上面的模型配置
+        self.client = AIClient(self.MODEL_CONFIGS, self.DEFAULT_MODEL)
+        
+        # 各模型回复的解析统计
+        self.parse_stats = {}
+        
+        # 测试用例生成与解析流程，与generate_testcase.py共用同一实现
+        self.generator = CaseGenerator(self.client, self.DEFAULT_CONFIG, self.parse_stats)
 
     def _add_model_configs(self):
         """添加其他模型配置"""
@@ -58,6 +70,8 @@ class AITestSuiteUtils:
             self.MODEL_CONFIGS["qianwen"] = {
                 "api_key_env": "QIANWEN_API_KEY",
                 "endpoint": "https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation",
+                "stream_format": "dashscope",  # 流式响应(SSE)格式
+                "json_format": "dashscope",  # JSON输出方式，见ai_client.JSON_FORMATS
                 "headers": lambda key: {
                     "Authorization": f"Bearer {key}",
                     "Content-Type": "application/json; charset=utf-8"
@@ -74,6 +88,8 @@ class AITestSuiteUtils:
             self.MODEL_CONFIGS["mygemini"] = {
                 "api_key_env": "GEMINI_API_KEY",
                 "endpoint": os.getenv("GEMINI_BASE_URL"),
+                "stream_format": "openai",  # 流式响应(SSE)格式
+                "json_format": "json_schema",  # JSON输出方式，见ai_client.JSON_FORMATS
                 "headers": lambda key: {
                     "Authorization": f"Bearer {key}",
                     "Content-Type": "application/json"
@@ -93,7 +109,7 @@ class AITestSuiteUtils:
             from generate_sample_requirements import generate_sample_requirements as generate_sample
             return generate_sample()
         except ImportError as e:
-            print(f"无法导入generate_sample_requirements模块: {str(e)}")
+            logger.warning("无法导入generate_sample_requirements模块: %s", e)
             # 如果导入失败，使用内置的示例生成函数
             try:
                 # 示例需求数据
@@ -120,13 +136,13 @@ class AITestSuiteUtils:
                 output_file = "./需求文档/sample_requirements.xlsx"
                 df.to_excel(output_file, index=False)
             
-                print(f"已生成示例需求文件: {output_file}")
+                logger.info("已生成示例需求文件: %s", output_file)
                 return output_file
             except Exception as e:
-                print(f"生成示例需求文件失败: {str(e)}")
+                logger.error("生成示例需求文件失败: %s", e)
                 return None
         except Exception as e:
-            print(f"生成示例需求文件失败: {str(e)}")
+            logger.error("生成示例需求文件失败: %s", e)
             return None
 
     def generate_pdf_requirements(self, output_file="./需求文档/API文档示例.pdf"):
@@ -137,19 +153,20 @@ class AITestSuiteUtils:
             from pdf_create_sample_requirements import create_pdf_document
             # 调用生成PDF的函数
             create_pdf_document(output_file)
-            print(f"示例PDF需求文档已生成: {output_file}")
+            logger.info("示例PDF需求文档已生成: %s", output_file)
             return True
         except ImportError as e:
-            print(f"无法导入pdf_create_sample_requirements模块: {str(e)}")
+            logger.warning("无法导入pdf_create_sample_requirements模块: %s", e)
             # 如果导入失败，使用内置的PDF生成逻辑
             try:
                 # 这里可以添加内置的PDF生成逻辑
-                print("使用内置逻辑生成PDF文档")
+                logger.info("使用内置逻辑生成PDF文档")
                 return False
             except Exception as e:
-                print(f"生成PDF需求文档失败: {str(e)}")
+                logger.error("生成PDF需求文档失败: %s", e)
                 return False
 
+    @METRICS.timer("excel_read")
     def read_excel_requirements(self, file_path):
         """读取Excel需求文档"""
         try:
@@ -160,7 +177,7 @@ class AITestSuiteUtils:
             missing_columns = [col for col in required_columns if col not in df.columns]
             
             if missing_columns:
-                print(f"错误：Excel文件缺少必要的列: {', '.join(missing_columns)}")
+                logger.error("Excel文件缺少必要的列: %s", ', '.join(missing_columns))
                 return None
             
             # 如果没有需求ID列，添加自动生成的ID
@@ -191,260 +208,55 @@ class AITestSuiteUtils:
             requirements = df.to_dict('records')
             return requirements
         except Exception as e:
-            print(f"读取Excel文件失败: {str(e)}")
+            logger.error("读取Excel文件失败: %s", e)
             return None
 
-    def call_ai_model(self, model_name, messages, max_retries=3, temperature=0.3):
-        """调用AI模型生成内容"""
-        if model_name not in self.MODEL_CONFIGS:
-            print(f"错误：不支持的模型 '{model_name}'，将使用默认模型 '{self.DEFAULT_MODEL}'")
-            model_name = self.DEFAULT_MODEL
-        
-        model_config = self.MODEL_CONFIGS[model_name]
-        api_key = os.getenv(model_config["api_key_env"])
-        
-        if not api_key:
-            print(f"错误：未设置 {model_config['api_key_env']} 环境变量")
-            return None
-        
-        headers = model_config["headers"](api_key)
-        endpoint = model_config["endpoint"]
-        
-        if not endpoint:
-            print(f"错误：未设置API端点，请在.env文件中配置AI_BASE_URL或AI_API_ENDPOINT")
-            return None
-        
-        total_tokens = 0
-        
-        for attempt in range(max_retries):
-            try:
-                payload = model_config["payload"](messages, temperature)
-                
-                # 将payload转换为JSON字符串，确保正确处理中文
-                json_data_str = json.dumps(payload, ensure_ascii=False)
-                
-                # 准备请求参数
-                request_kwargs = {
-                    "headers": headers,
-                    "data": json_data_str.encode('utf-8'),
-                    "timeout": 60
-                }
-                
-                # 如果有URL参数，添加到请求中
-                if "url_params" in model_config:
-                    url_params = model_config["url_params"](api_key)
-                    endpoint = f"{endpoint}?{'&'.join([f'{k}={v}' for k, v in url_params.items()])}"
-                
-                # 发送请求
-                print(f"正在调用API: {endpoint}")
-                response = requests.post(endpoint, **request_kwargs)
-                
-                # 检查响应状态
-                response.raise_for_status()
-                
-                # 解析响应
-                json_data = response.json()
-                
-                # 使用模型特定的解析器提取内容
-                content = model_config["response_parser"](json_data)
-                
-                if not content:
-                    print(f"警告：模型 {model_name} 返回的内容为空")
-                    
-                if "usage" in json_data and "total_tokens" in json_data["usage"]:
-                    tokens = json_data["usage"]["total_tokens"]
-                    total_tokens += tokens
-                    print(f"本次请求消耗 {tokens} tokens，累计 {total_tokens} tokens")
-                
-                return content
-            except requests.exceptions.RequestException as e:
-                print(f"请求异常 ({attempt + 1}/{max_retries}): {str(e)}")
-                if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt  # 指数退避
-                    print(f"等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
-                else:
-                    print("达到最大重试次数，放弃请求")
-                    return None
-            except Exception as e:
-                print(f"未知错误 ({attempt + 1}/{max_retries}): {str(e)}")
-                if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt
-                    print(f"等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
-                else:
-                    print("达到最大重试次数，放弃请求")
-                    return None
-        
-        return None
+    def iter_excel_requirements(self, file_path, collect=None):
+        """以只读模式逐行读取Excel需求文档，逐条产出与read_excel_requirements格式相同的需求
 
-    def generate_test_cases(self, requirements, model_name):
-        """根据需求生成测试用例"""
-        all_test_cases = []
-        system_prompt = "你是一位专业的测试工程师，擅长编写详细、全面的测试用例。"
-        
-        # 对于DeepSeek模型，可能需要调整提示
-        if model_name.startswith("deepseek"):
-            system_prompt = "你是一位专业的测试工程师，擅长编写详细、全面的测试用例。请严格按照指定格式输出。"
-        
-        for req in requirements:
-            req_id = req["需求ID"]
-            req_title = req["标题"]
-            req_desc = req["详细描述"]
-            priority = req["优先级"]
-            parent_req = req.get("父需求", "")
-            req_category = req.get("需求分类", self.DEFAULT_CONFIG["需求分类"])
-            iteration = req.get("迭代", self.DEFAULT_CONFIG["迭代"])
-            assignee = req.get("处理人", self.DEFAULT_CONFIG["处理人"])
-            
-            print(f"\n处理需求 {req_id}: {req_title[:50]}...")
-            
-            # 标准化优先级
-            std_priority = self.PRIORITY_MAP.get(priority.lower(), "Middle")
-            
-            # 构建提示信息
-            prompt = f"""
-请根据以下需求生成详细的测试用例：
+        适用于很大的需求表：不整表载入内存，可直接传给generate_test_cases边读边生成；
+        collect不为None时读到的需求同时追加到该列表。
+        """
+        return stream_excel_requirements(file_path, self.DEFAULT_CONFIG, collect)
 
-需求ID: {req_id}
-需求标题: {req_title}
-需求描述: {req_desc}
-优先级: {priority}
-需求分类: {req_category}
-迭代: {iteration}
+    def call_ai_model(self, model_name, messages, max_retries=3, temperature=0.3):
+        """调用AI模型生成内容（acall_ai_model的同步封装）"""
+        return run_sync(self.acall_ai_model(model_name, messages, max_retries, temperature))
 
-请生成至少3个测试用例，每个测试用例包括：
-1. 测试目标
-2. 前置条件
-3. 详细的测试步骤
-4. 预期结果
-5. 优先级（高/中/低）
+    async def acall_ai_model(self, model_name, messages, max_retries=3, temperature=0.3, json_schema=None):
+        """异步调用AI模型生成内容，json_schema不为None时要求模型按该结构输出JSON"""
+        return await self.client.acall(model_name, messages, max_retries=max_retries, temperature=temperature,
+                                       json_schema=json_schema)
 
-请严格按照以下格式输出：
+    def generate_test_cases(self, requirements, model_name, **options):
+        """根据需求生成测试用例（agenerate_test_cases的同步封装，参数相同）"""
+        return run_sync(self.agenerate_test_cases(requirements, model_name, **options))
 
-### 测试用例1：[测试目标]
-**优先级**：[高/中/低]
-**前置条件**：[前置条件描述]
-**测试步骤**：
-1. [步骤1]
-2. [步骤2]
-...
-**预期结果**：[预期结果描述]
+    async def agenerate_test_cases(self, requirements, model_name, **options):
+        """异步根据需求生成测试用例，参数见case_generation.CaseGenerator.agenerate_test_cases"""
+        return await self.generator.agenerate_test_cases(requirements, model_name, **options)
 
-### 测试用例2：[测试目标]
-...
-"""
-            
-            # 调用AI模型
-            if model_name == "gemini-pro":
-                # Gemini不支持system角色，将system提示合并到user提示中
-                system_prompt = "你是一位专业的测试工程师，擅长编写详细、全面的测试用例。"
-                user_prompt = f"{system_prompt}\n\n{prompt}"
-                
-                response = self.call_ai_model(
-                    model_name,
-                    [
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    temperature=0.7
-                )
-            else:
-                # 其他模型使用标准格式
-                response = self.call_ai_model(
-                    model_name,
-                    [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.7
-                )
-            
-            if not response:
-                print(f"警告：需求 {req_id} 未能生成测试用例")
-                continue
-                
-            # 解析测试用例
-            parsed_cases = self.parse_test_cases(response, req_id, req_title, parent_req, std_priority)
-            all_test_cases.extend(parsed_cases)
-            
-            print(f"为需求 {req_id} 生成了 {len(parsed_cases)} 条测试用例")
-        
-        return all_test_cases
+    def get_parse_stats(self, model_name):
+        """获取模型回复的解析统计"""
+        return self.generator.get_parse_stats(model_name)
+
+    def report_parse_stats(self):
+        """打印各模型回复的解析成功率"""
+        report_parse_stats(self.parse_stats)
 
     def parse_test_cases(self, response, req_id, req_title, parent_req, std_priority):
         """解析AI生成的测试用例文本"""
-        if not response:
-            return []
-
-        # 预处理：去除AI对话式的开头
-        response = re.sub(r'^.*?(?:### 测试用例|测试用例1|测试用例：)', '', response, flags=re.DOTALL).strip()
+        return self.generator.parse_test_cases(response, req_id, req_title, parent_req, std_priority)
 
-        test_cases = []
-        case_blocks = re.split(r'###\s+测试用例\d+[:：]', response)
-        
-        # 移除第一个空块（如果存在）
-        if case_blocks and not case_blocks[0].strip():
-            case_blocks = case_blocks[1:]
-        
-        for i, block in enumerate(case_blocks, 1):
-            if not block.strip():
-                continue
-            
-            try:
-                # 提取测试目标
-                title_match = re.match(r'(.+?)(?:\*\*优先级|\n)', block)
-                title = title_match.group(1).strip() if title_match else f"测试用例{i}"
-                
-                # 提取优先级
-                priority_match = re.search(r'\*\*优先级\*\*[:：]\s*([高中低]|High|Middle|Low|Nice To Have)', block)
-                raw_priority = priority_match.group(1).strip() if priority_match else "中"
-                priority = self.PRIORITY_MAP.get(raw_priority.lower(), std_priority)
-                
-                # 提取前置条件
-                precondition_match = re.search(r'\*\*前置条件\*\*[:：]\s*(.+?)(?=\*\*|\Z)', block, re.DOTALL)
-                precondition = precondition_match.group(1).strip() if precondition_match else ""
-                
-                # 提取测试步骤
-                steps_match = re.search(r'\*\*测试步骤\*\*[:：]\s*(.+?)(?=\*\*预期结果|\Z)', block, re.DOTALL)
-                steps_text = steps_match.group(1).strip() if steps_match else ""
-                
-                # 格式化步骤
-                steps = []
-                for step in re.findall(r'\d+\.\s*(.+?)(?=\d+\.|$)', steps_text, re.DOTALL):
-                    steps.append(step.strip())
-                
-                formatted_steps = "\n".join([f"{j+1}. {step}" for j, step in enumerate(steps)])
-                
-                # 提取预期结果
-                expected_match = re.search(r'\*\*预期结果\*\*[:：]\s*(.+?)(?=###|\Z)', block, re.DOTALL)
-                expected_result = expected_match.group(1).strip() if expected_match else ""
-                
-                # 创建测试用例
-                case_id = f"TC-{req_id}-{i:02d}"
-                test_case = {
-                    "用例编号": case_id,
-                    "需求ID": req_id,
-                    "父需求": parent_req,
-                    "需求分类": self.DEFAULT_CONFIG["需求分类"],
-                    "标题": f"测试-{req_title}-{title}",
-                    "详细描述": f"**前置条件**：\n{precondition}\n\n**测试步骤**：\n{formatted_steps}\n\n**预期结果**：\n{expected_result}",
-                    "测试步骤": formatted_steps,
-                    "预期结果": expected_result,
-                    "优先级": priority,
-                    "迭代": self.DEFAULT_CONFIG["迭代"],
-                    "处理人": self.DEFAULT_CONFIG["处理人"]
-                }
-                test_cases.append(test_case)
-            except Exception as e:
-                print(f"解析测试用例失败: {str(e)}")
-                continue
-        
-        return test_cases
+    def parse_json_test_cases(self, response, req_id, req_title, parent_req, std_priority):
+        """解析JSON格式的测试用例回复，回复不是预期的JSON时返回None"""
+        return self.generator.parse_json_test_cases(response, req_id, req_title, parent_req, std_priority)
 
+    @METRICS.timer("export")
     def export_to_excel(self, test_cases, output_file):
         """导出测试用例到Excel"""
         if not test_cases:
-            print("错误：没有测试用例可导出")
+            logger.error("没有测试用例可导出")
             return False
         
         try:
@@ -464,16 +276,17 @@ class AITestSuiteUtils:
             
             # 导出到Excel
             df.to_excel(output_file, index=False, engine="openpyxl")
-            print(f"测试用例已成功导出到: {output_file}")
+            logger.info("测试用例已成功导出到: %s", output_file)
             return True
         except Exception as e:
-            print(f"导出测试用例失败: {str(e)}")
+            logger.error("导出测试用例失败: %s", e)
             return False
 
+    @METRICS.timer("report")
     def generate_test_report(self, test_cases, output_file):
         """生成测试报告"""
         if not test_cases:
-            print("错误：没有测试用例可生成报告")
+            logger.error("没有测试用例可生成报告")
             return False
     
         try:
@@ -631,8 +444,8 @@ class AITestSuiteUtils:
                         cell.alignment = Alignment(wrap_text=True, vertical='top')
                         cell.border = border
         
-            print(f"成功生成测试报告: {output_file}")
+            logger.info("成功生成测试报告: %s", output_file)
             return True
         except Exception as e:
-            print(f"生成测试报告失败: {str(e)}")
+            logger.error("生成测试报告失败: %s", e)
             return False
@@ -0,0 +1,774 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import importlib.util
+import httpx
+from hedging import LatencyTracker, HedgeStats
+from circuit_breaker import CircuitBreaker
+from token_budget import (TokenStats, estimate_messages_tokens,
+                          DEFAULT_CONTEXT_TOKENS, DEFAULT_OUTPUT_RESERVE)
+from rate_limiter import RateLimiter, parse_retry_after
+from metrics import METRICS
+from structured_log import get_logger, RUN_ID, REQ_ID
+
+logger = get_logger("ai_client")
+
+# 连接池默认参数，可在模型配置的"pool"字段或环境变量 {前缀}_POOL_SIZE 等中覆盖
+DEFAULT_POOL_SIZE = 100
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+
+# 收到429后按Retry-After等待重试的最大次数（不计入普通重试次数）
+MAX_THROTTLE_RETRIES = 8
+
+# 模型配置"json_format"的可选值：OpenAI兼容接口的response_format（json_schema/json_object）
+# 或通义千问原生接口的parameters.response_format
+JSON_FORMATS = ["json_schema", "json_object", "dashscope"]
+
+
+class StreamInterrupted(Exception):
+    """流式响应已产出部分内容后中断，已收到的内容不完整"""
+
+
+class _LoopThread:
+    """常驻后台线程的事件循环，同步接口通过它执行协程"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name="ai-client-loop", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+
+def run_sync(coro):
+    """在后台事件循环中执行协程，并阻塞等待结果
+
+    所有同步接口共用同一个事件循环，因此连接池等异步资源可以在多次调用之间复用。
+    """
+    global _loop_thread
+    with _loop_lock:
+        if _loop_thread is None:
+            _loop_thread = _LoopThread()
+
+    if threading.current_thread() is _loop_thread.thread:
+        coro.close()
+        raise RuntimeError("不能在异步引擎的事件循环内调用同步接口，请改用对应的异步方法")
+
+    return asyncio.run_coroutine_threadsafe(coro, _loop_thread.loop).result()
+
+
+def env_prefix(model_config):
+    """模型配置对应的环境变量前缀，如 GEMINI_API_KEY -> GEMINI"""
+    return model_config["api_key_env"].replace("_API_KEY", "")
+
+
+def _env_flag(value):
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+class PoolStats:
+    """单个模型连接池的复用统计"""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+
+    @property
+    def reused(self):
+        return max(0, self.requests - self.new_connections)
+
+    @property
+    def reuse_rate(self):
+        return self.reused / self.requests if self.requests else 0.0
+
+    def to_dict(self):
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused": self.reused,
+            "reuse_rate": round(self.reuse_rate, 4)
+        }
+
+
+class AIClient:
+    """按MODEL_CONFIGS调用AI模型的异步引擎
+
+    复用各模型配置中的headers/payload/response_parser，单个事件循环即可同时挂起
+    成百上千个请求，无需为每个请求占用一个线程。
+    """
+
+    def __init__(self, model_configs, default_model="default", timeout=60):
+        self.model_configs = model_configs
+        self.default_model = default_model
+        self.timeout = timeout
+        
+        # 每个模型一个常驻的连接池，绑定创建它的事件循环：{事件循环: {模型名: httpx.AsyncClient}}
+        self._clients = {}
+        self.pool_stats = {}
+        
+        # 可选的响应缓存（response_cache.ResponseCache），为None时不使用缓存
+        self.cache = None
+        
+        # 每个模型一个共享的限流器
+        self.limiters = {}
+        
+        # 对冲策略：主模型 -> 备用模型，也可在模型配置中用"hedge_to"指定
+        self.hedge_to = {}
+        self.latency = {}
+        self.hedge_stats = {}
+        
+        # 每个模型一个熔断器；主模型失败或熔断时按failover_models顺序切换到下一个模型
+        self.breakers = {}
+        self.failover_models = []
+        self.failovers = 0
+        
+        # 各模型tokens预估与实际用量统计
+        self.token_stats = {}
+        
+        # 请求耗时、重试、错误及tokens指标（metrics.MetricsRegistry）
+        self.metrics = METRICS
+        
+        # 可选的跨运行调用台账（usage_ledger.UsageLedger），为None时不记录
+        self.ledger = None
+
+    def resolve_model(self, model_name):
+        """返回实际使用的模型名称，不支持的模型回退到默认模型"""
+        if model_name not in self.model_configs:
+            logger.error("不支持的模型 '%s'，将使用默认模型 '%s'", model_name, self.default_model)
+            return self.default_model
+        return model_name
+
+    async def acall(self, model_name, messages, max_retries=3, temperature=0.3, include_usage=False,
+                    json_schema=None):
+        """异步调用AI模型生成内容
+
+        返回模型生成的文本，失败时返回None；include_usage为True时返回(content, usage)。
+        主模型失败或已熔断时，依次尝试failover_models中的模型。
+        json_schema不为None时，按各模型的json_format要求以JSON格式输出，不支持的模型照常请求。
+        """
+        content, usage = None, {}
+        for index, candidate in enumerate(self.failover_chain(model_name)):
+            if index:
+                self.failovers += 1
+                logger.warning("切换到备用模型 %s", candidate, extra={"model": candidate})
+            content, usage = await self._ahedged_call(candidate, messages, max_retries, temperature, json_schema)
+            if content:
+                break
+        return (content, usage) if include_usage else content
+
+    def call(self, model_name, messages, max_retries=3, temperature=0.3, include_usage=False, json_schema=None):
+        """同步调用AI模型，内部复用异步实现"""
+        return run_sync(self.acall(model_name, messages, max_retries, temperature, include_usage, json_schema))
+
+    def pool_options(self, model_config):
+        """解析模型的连接池配置：模型配置 > 环境变量 > 默认值"""
+        prefix = env_prefix(model_config)
+        options = dict(model_config.get("pool", {}))
+        options.setdefault("max_connections", int(os.getenv(f"{prefix}_POOL_SIZE", DEFAULT_POOL_SIZE)))
+        options.setdefault("keepalive_expiry", float(os.getenv(f"{prefix}_KEEPALIVE", DEFAULT_KEEPALIVE_EXPIRY)))
+        options.setdefault("http2", _env_flag(os.getenv(f"{prefix}_HTTP2", "false")))
+        return options
+
+    def _get_client(self, model_name, model_config):
+        """获取模型的常驻连接池，首次使用时创建"""
+        loop = asyncio.get_running_loop()
+        clients = self._clients.get(loop)
+        if clients is None:
+            # 连接绑定在事件循环上，换了事件循环只能新建；原事件循环上的连接池保留到aclose时关闭
+            self._discard_closed_loops()
+            clients = self._clients[loop] = {}
+        
+        client = clients.get(model_name)
+        if client is None:
+            options = self.pool_options(model_config)
+            http2 = options["http2"]
+            if http2 and importlib.util.find_spec("h2") is None:
+                logger.warning("未安装h2，模型 %s 将使用HTTP/1.1（pip install httpx[http2]）", model_name)
+                http2 = False
+            client = httpx.AsyncClient(
+                timeout=model_config.get("timeout", self.timeout),
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=options["max_connections"],
+                    max_keepalive_connections=options["max_connections"],
+                    keepalive_expiry=options["keepalive_expiry"]
+                )
+            )
+            clients[model_name] = client
+        return client
+
+    def _discard_closed_loops(self):
+        """丢弃已关闭的事件循环上的连接池：其连接已无法在任何事件循环中正常关闭"""
+        for loop in [loop for loop in self._clients if loop.is_closed()]:
+            models = sorted(self._clients.pop(loop))
+            if models:
+                logger.warning("事件循环结束前未调用aclose()，模型 %s 的连接池未能关闭", ", ".join(models))
+
+    def get_limiter(self, model_name, model_config):
+        """获取模型共享的限流器，配额来自模型配置的"rate_limit"字段或环境变量 {前缀}_RPM/{前缀}_TPM"""
+        limiter = self.limiters.get(model_name)
+        if limiter is None:
+            prefix = env_prefix(model_config)
+            rate_limit = model_config.get("rate_limit", {})
+            limiter = RateLimiter(
+                rpm=int(rate_limit.get("rpm", os.getenv(f"{prefix}_RPM", 0))),
+                tpm=int(rate_limit.get("tpm", os.getenv(f"{prefix}_TPM", 0)))
+            )
+            self.limiters[model_name] = limiter
+        return limiter
+
+    def get_breaker(self, model_name, model_config):
+        """获取模型的熔断器，参数来自模型配置的"circuit_breaker"字段"""
+        breaker = self.breakers.get(model_name)
+        if breaker is None:
+            breaker = CircuitBreaker(**model_config.get("circuit_breaker", {}))
+            self.breakers[model_name] = breaker
+        return breaker
+
+    def failover_chain(self, model_name):
+        """返回依次尝试的模型列表：请求的模型在前，其后为failover_models中的其他模型"""
+        chain = [model_name]
+        for name in self.failover_models:
+            if name in self.model_configs and name not in chain:
+                chain.append(name)
+        return chain
+
+    def get_breaker_states(self):
+        """返回各模型熔断器状态"""
+        return {name: breaker.to_dict() for name, breaker in self.breakers.items()}
+
+    def report_breaker_states(self):
+        """打印各模型熔断器状态及故障切换次数"""
+        for name, breaker in self.breakers.items():
+            if breaker.trips or breaker.rejected:
+                print(f"模型 {name} 熔断器：当前状态 {breaker.state}，熔断 {breaker.trips} 次，"
+                      f"快速失败 {breaker.rejected} 次")
+        if self.failovers:
+            print(f"故障切换到备用模型共 {self.failovers} 次")
+
+    def prompt_budget(self, model_name):
+        """模型允许的最大输入tokens数：上下文窗口减去为输出预留的部分
+
+        上下文窗口来自模型配置的"context_tokens"字段或环境变量 {前缀}_CONTEXT_TOKENS，
+        输出预留来自"output_reserve"字段或 {前缀}_OUTPUT_RESERVE。
+        """
+        model_config = self.model_configs.get(model_name) or self.model_configs[self.default_model]
+        prefix = env_prefix(model_config)
+        context_tokens = int(model_config.get("context_tokens", os.getenv(f"{prefix}_CONTEXT_TOKENS", DEFAULT_CONTEXT_TOKENS)))
+        return context_tokens - self.output_reserve(model_name)
+
+    def output_reserve(self, model_name):
+        """为模型输出预留的tokens数，来自模型配置的"output_reserve"字段或环境变量 {前缀}_OUTPUT_RESERVE"""
+        model_config = self.model_configs.get(model_name) or self.model_configs[self.default_model]
+        prefix = env_prefix(model_config)
+        return int(model_config.get("output_reserve", os.getenv(f"{prefix}_OUTPUT_RESERVE", DEFAULT_OUTPUT_RESERVE)))
+
+    def _reservation(self, model_name, payload, prompt_tokens):
+        """请求的tokens上限估算：输入tokens加输出上限（payload中的max_tokens，未设置时为输出预留）
+
+        限流器还没有实际用量可参考时，按该值预扣TPM配额。
+        """
+        max_tokens = payload.get("max_tokens") or (payload.get("parameters") or {}).get("max_tokens")
+        return prompt_tokens + int(max_tokens or self.output_reserve(model_name))
+
+    def json_format(self, model_name):
+        """模型支持的JSON输出方式（JSON_FORMATS之一），不支持时返回None
+
+        来自模型配置的"json_format"字段，可用环境变量 {前缀}_JSON_FORMAT 覆盖（设为off关闭）。
+        """
+        model_config = self.model_configs.get(model_name) or self.model_configs[self.default_model]
+        value = os.getenv(f"{env_prefix(model_config)}_JSON_FORMAT", model_config.get("json_format") or "")
+        value = value.strip().lower()
+        return value if value in JSON_FORMATS else None
+
+    def price(self, model_name):
+        """模型的(输入, 输出)单价，单位为每百万tokens的费用，未配置时为0
+
+        来自模型配置的"price"字段（{"prompt": ..., "completion": ...}），
+        可用环境变量 {前缀}_PRICE_PROMPT、{前缀}_PRICE_COMPLETION 覆盖。
+        """
+        model_config = self.model_configs.get(model_name) or self.model_configs[self.default_model]
+        prefix = env_prefix(model_config)
+        price = model_config.get("price", {})
+        return (float(os.getenv(f"{prefix}_PRICE_PROMPT", price.get("prompt", 0))),
+                float(os.getenv(f"{prefix}_PRICE_COMPLETION", price.get("completion", 0))))
+
+    def get_token_stats(self, model_name):
+        """获取模型的tokens用量统计"""
+        return self.token_stats.setdefault(model_name, TokenStats())
+
+    def _preflight(self, model_name, messages):
+        """请求前估算输入tokens，超出模型上下文窗口时返回None，不发起网络请求"""
+        estimated = estimate_messages_tokens(messages)
+        budget = self.prompt_budget(model_name)
+        if estimated > budget:
+            self.get_token_stats(model_name).rejected += 1
+            self.metrics.inc("errors_total", model=model_name, type="context_overflow")
+            logger.error("提示约 %d tokens，超过模型 %s 的输入上限 %d tokens，已拒绝请求", estimated, model_name, budget,
+                         extra={"model": model_name, "estimated_tokens": estimated, "budget": budget})
+            return None
+        return estimated
+
+    def _record_usage(self, model_name, prompt_tokens, usage, latency, stream=False):
+        """记录一次成功请求的tokens用量（统计、指标与调用台账）"""
+        self.get_token_stats(model_name).record(prompt_tokens, usage)
+        if self.ledger is not None:
+            self.ledger.record(model_name, usage, latency, self.price(model_name), estimated_prompt=prompt_tokens,
+                               stream=stream, run_id=RUN_ID.get(), req_id=REQ_ID.get())
+        self.metrics.inc("tokens_total", prompt_tokens, model=model_name, kind="estimated_prompt")
+        for kind, keys in (("prompt", ("prompt_tokens", "input_tokens")),
+                           ("completion", ("completion_tokens", "output_tokens")),
+                           ("total", ("total_tokens",))):
+            value = next((usage[key] for key in keys if usage.get(key)), 0)
+            if value:
+                self.metrics.inc("tokens_total", value, model=model_name, kind=kind)
+
+    def report_token_stats(self):
+        """打印各模型预估与实际tokens用量"""
+        for name, stats in self.token_stats.items():
+            error = stats.estimate_error
+            error_text = f"，预估偏差 {error * 100:+.1f}%" if error is not None else ""
+            print(f"模型 {name} tokens：请求 {stats.requests} 次，预估输入 {stats.estimated_prompt}，"
+                  f"实际输入 {stats.actual_prompt}，实际总计 {stats.actual_total}{error_text}"
+                  + (f"，超限拒绝 {stats.rejected} 次" if stats.rejected else ""))
+
+    def get_latency_tracker(self, model_name):
+        """获取模型的请求耗时统计"""
+        return self.latency.setdefault(model_name, LatencyTracker())
+
+    async def _ahedged_call(self, model_name, messages, max_retries, temperature, json_schema=None):
+        """调用模型；超过其观测p95仍未返回时向备用模型发送相同请求，采用先返回的结果"""
+        if model_name not in self.model_configs:
+            return await self._acall(model_name, messages, max_retries, temperature, json_schema)
+        
+        secondary = self.hedge_to.get(model_name) or self.model_configs[model_name].get("hedge_to")
+        if not secondary or secondary == model_name or secondary not in self.model_configs:
+            return await self._acall(model_name, messages, max_retries, temperature, json_schema)
+        
+        stats = self.hedge_stats.setdefault(model_name, HedgeStats())
+        stats.calls += 1
+        primary = asyncio.create_task(self._acall(model_name, messages, max_retries, temperature, json_schema))
+        
+        delay = self.get_latency_tracker(model_name).hedge_delay()
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            content, usage = primary.result()
+            if content:
+                stats.primary_wins += 1
+            return content, usage
+        
+        stats.hedged += 1
+        logger.info("模型 %s 超过p95（%.1f秒）未返回，向 %s 发送对冲请求", model_name, delay, secondary,
+                    extra={"model": model_name, "hedge_model": secondary, "delay": round(delay, 3)})
+        hedge = asyncio.create_task(self._acall(secondary, messages, max_retries, temperature, json_schema))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    content, usage = task.result()
+                    if content:
+                        if task is primary:
+                            stats.primary_wins += 1
+                        else:
+                            stats.hedge_wins += 1
+                        return content, usage
+            return None, {}
+        finally:
+            # 取消较慢的请求
+            for task in pending:
+                task.cancel()
+
+    def get_hedge_stats(self):
+        """返回各模型对冲统计"""
+        return {name: stats.to_dict() for name, stats in self.hedge_stats.items()}
+
+    def report_hedge_stats(self):
+        """打印各模型对冲统计"""
+        for name, stats in self.hedge_stats.items():
+            print(f"模型 {name} 对冲：调用 {stats.calls} 次，对冲 {stats.hedged} 次（{stats.hedge_rate * 100:.1f}%），"
+                  f"主模型胜出 {stats.primary_wins} 次，备用模型胜出 {stats.hedge_wins} 次")
+
+    def _trace_for(self, model_name):
+        """返回记录新建连接次数的httpcore trace回调"""
+        stats = self.pool_stats.setdefault(model_name, PoolStats())
+
+        async def trace(event_name, info):
+            if event_name == "connection.connect_tcp.complete":
+                stats.new_connections += 1
+
+        return stats, trace
+
+    def get_pool_stats(self):
+        """返回各模型连接复用统计"""
+        return {name: stats.to_dict() for name, stats in self.pool_stats.items()}
+
+    def report_pool_stats(self):
+        """打印各模型连接复用统计"""
+        for name, stats in self.pool_stats.items():
+            print(f"模型 {name} 连接池：请求 {stats.requests} 次，新建连接 {stats.new_connections} 个，"
+                  f"复用率 {stats.reuse_rate * 100:.1f}%")
+
+    async def aclose(self):
+        """关闭所有连接池，包括在其他事件循环（如run_sync的后台循环）中创建的连接池"""
+        self._discard_closed_loops()
+        current = asyncio.get_running_loop()
+        clients_by_loop, self._clients = self._clients, {}
+        for loop, clients in clients_by_loop.items():
+            for model_name, client in clients.items():
+                if loop is current:
+                    await client.aclose()
+                elif loop.is_running():
+                    # 连接只能在创建它的事件循环中关闭
+                    await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), loop))
+                else:
+                    logger.warning("事件循环未在运行，模型 %s 的连接池未能关闭", model_name)
+
+    def close(self):
+        """关闭所有连接池（aclose的同步封装）"""
+        run_sync(self.aclose())
+
+    def _prepare(self, model_name, messages, temperature, json_schema=None):
+        """解析模型配置并构建请求参数，配置不完整时返回None"""
+        model_name = self.resolve_model(model_name)
+
+        model_config = self.model_configs[model_name]
+        api_key = os.getenv(model_config["api_key_env"])
+
+        if not api_key:
+            logger.error("未设置 %s 环境变量", model_config['api_key_env'])
+            return None
+
+        headers = model_config["headers"](api_key)
+        endpoint = model_config["endpoint"]
+
+        if not endpoint:
+            logger.error("未设置API端点，请在.env文件中配置AI_BASE_URL或AI_API_ENDPOINT")
+            return None
+
+        # 如果有URL参数，添加到请求地址中
+        if "url_params" in model_config:
+            url_params = model_config["url_params"](api_key)
+            endpoint = f"{endpoint}?{'&'.join([f'{k}={v}' for k, v in url_params.items()])}"
+
+        payload = model_config["payload"](messages, temperature)
+        if json_schema is not None:
+            payload = _with_json_format(payload, self.json_format(model_name), json_schema)
+        return model_name, model_config, headers, endpoint, payload
+
+    def _cached(self, model_name, endpoint, payload):
+        """查询响应缓存，返回(缓存键, 缓存内容)；未启用缓存时缓存键为None"""
+        if self.cache is None or self.cache.mode == "off":
+            return None, None
+        cache_key = self.cache.make_key(model_name, endpoint, payload)
+        return cache_key, self.cache.get(cache_key)
+
+    async def _attempts(self, model_name, model_config, max_retries, reservation=0):
+        """依次产出请求尝试（_Attempt），直到请求成功、模型熔断或用完重试次数
+
+        调用方在async with attempt中发送请求：收到429时调用attempt.throttle后continue，
+        成功时调用attempt.succeed后结束循环。429不占用普通重试次数，其他失败按指数退避重试；
+        流式响应已产出内容后失败不再重试，抛出StreamInterrupted。reservation为请求的tokens上限估算，见_reservation。
+        """
+        limiter = self.get_limiter(model_name, model_config)
+        breaker = self.get_breaker(model_name, model_config)
+        stats, trace = self._trace_for(model_name)
+
+        attempt_count = 0
+        throttled = 0
+        while attempt_count < max_retries:
+            # 熔断期间直接失败，不再消耗超时和重试时间
+            if not breaker.allow():
+                self.metrics.inc("errors_total", model=model_name, type="circuit_open")
+                logger.warning("模型 %s 已熔断，跳过请求", model_name, extra={"model": model_name})
+                return
+            attempt = _Attempt(self, model_name, limiter, breaker, stats, trace,
+                               attempt_count + 1, max_retries, throttled, reservation)
+            yield attempt
+            throttled = attempt.throttled
+            if attempt.outcome == "throttled":
+                continue
+            if attempt.outcome != "failed":
+                return
+
+            attempt_count += 1
+            if attempt_count < max_retries:
+                self.metrics.inc("retries_total", model=model_name, reason="error")
+                wait_time = 2 ** (attempt_count - 1)  # 指数退避
+                logger.info("等待 %s 秒后重试...", wait_time, extra={"model": model_name})
+                await asyncio.sleep(wait_time)
+            else:
+                logger.error("达到最大重试次数，放弃请求", extra={"model": model_name})
+
+    async def _acall(self, model_name, messages, max_retries, temperature, json_schema=None):
+        request = self._prepare(model_name, messages, temperature, json_schema)
+        if request is None:
+            return None, {}
+        model_name, model_config, headers, endpoint, payload = request
+
+        # 先查响应缓存，命中时不发起网络请求
+        cache_key, cached = self._cached(model_name, endpoint, payload)
+        if cached is not None:
+            self.metrics.inc("cache_hits_total", model=model_name)
+            return cached["content"], {}
+
+        prompt_tokens = self._preflight(model_name, messages)
+        if prompt_tokens is None:
+            return None, {}
+
+        # 将payload转换为JSON字符串，确保正确处理中文
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+        client = self._get_client(model_name, model_config)
+        reservation = self._reservation(model_name, payload, prompt_tokens)
+
+        async for attempt in self._attempts(model_name, model_config, max_retries, reservation):
+            async with attempt:
+                logger.debug("正在调用API: %s", endpoint, extra={"model": model_name})
+                response = await client.post(endpoint, headers=headers, content=body,
+                                             extensions={"trace": attempt.trace})
+                if attempt.throttle(response):
+                    continue
+
+                # 检查响应状态
+                response.raise_for_status()
+
+                # 解析响应
+                json_data = response.json()
+
+                # 使用模型特定的解析器提取内容
+                content = model_config["response_parser"](json_data)
+
+                if not content:
+                    logger.warning("模型 %s 返回的内容为空", model_name, extra={"model": model_name})
+
+                usage = json_data.get("usage", {}) or {}
+                if cache_key and content:
+                    self.cache.put(cache_key, {"content": content, "usage": usage})
+
+                attempt.succeed(prompt_tokens, usage)
+                return content, usage
+
+        return None, {}
+
+    async def astream(self, model_name, messages, max_retries=3, temperature=0.3):
+        """流式调用AI模型，逐段产出生成的文本（异步生成器）
+
+        模型配置中的"stream_format"指定SSE格式："openai"（OpenAI兼容接口）或
+        "dashscope"（通义千问原生接口）；未配置时退化为普通调用，一次性产出完整内容。
+        已经产出部分内容后连接中断不会重试，以免重复产出，而是抛出StreamInterrupted；
+        尚未产出内容时按failover_models切换到下一个模型。
+        """
+        for index, candidate in enumerate(self.failover_chain(model_name)):
+            if index:
+                self.failovers += 1
+                logger.warning("切换到备用模型 %s", candidate, extra={"model": candidate})
+            produced = False
+            async for delta in self._astream(candidate, messages, max_retries, temperature):
+                produced = True
+                yield delta
+            if produced:
+                return
+
+    async def _astream(self, model_name, messages, max_retries, temperature):
+        request = self._prepare(model_name, messages, temperature)
+        if request is None:
+            return
+        model_name, model_config, headers, endpoint, payload = request
+
+        stream_format = model_config.get("stream_format")
+        if stream_format not in ("openai", "dashscope"):
+            content, _ = await self._acall(model_name, messages, max_retries, temperature)
+            if content:
+                yield content
+            return
+
+        # 缓存键基于非流式payload，流式与普通调用共享缓存
+        cache_key, cached = self._cached(model_name, endpoint, payload)
+        if cached is not None:
+            self.metrics.inc("cache_hits_total", model=model_name)
+            yield cached["content"]
+            return
+
+        prompt_tokens = self._preflight(model_name, messages)
+        if prompt_tokens is None:
+            return
+
+        headers = dict(headers, Accept="text/event-stream")
+        if stream_format == "openai":
+            # 不带include_usage时流式响应不返回用量，限流器、台账和tokens统计都拿不到实际用量
+            payload = dict(payload, stream=True, stream_options={"include_usage": True})
+        else:
+            payload = dict(payload, parameters=dict(payload.get("parameters", {}), incremental_output=True))
+            headers["X-DashScope-SSE"] = "enable"
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+        client = self._get_client(model_name, model_config)
+        # 仅在需要写缓存时保留完整内容
+        parts = [] if cache_key and self.cache.writable else None
+        reservation = self._reservation(model_name, payload, prompt_tokens)
+
+        async for attempt in self._attempts(model_name, model_config, max_retries, reservation):
+            async with attempt:
+                logger.debug("正在调用API（流式）: %s", endpoint, extra={"model": model_name})
+                first_delta = None
+                async with client.stream("POST", endpoint, headers=headers, content=body,
+                                         extensions={"trace": attempt.trace}) as response:
+                    if attempt.throttle(response):
+                        continue
+
+                    response.raise_for_status()
+
+                    usage = {}
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if not data or data == "[DONE]":
+                            continue
+                        event = json.loads(data)
+                        if event.get("usage"):
+                            usage = event["usage"]
+                        delta = _stream_delta(stream_format, event)
+                        if delta:
+                            if first_delta is None:
+                                # 流式请求按首段内容到达的耗时判断是否为慢请求
+                                first_delta = attempt.elapsed
+                                attempt.committed = True
+                            if parts is not None:
+                                parts.append(delta)
+                            yield delta
+
+                attempt.succeed(prompt_tokens, usage, first_delta, stream=True)
+                if parts:
+                    self.cache.put(cache_key, {"content": "".join(parts), "usage": usage})
+                return
+
+
+class _Attempt:
+    """AIClient._attempts产出的一次请求尝试，在async with中发送请求
+
+    进入时等待限流器放行；退出时记录HTTP耗时，请求抛出的异常记入熔断器和错误指标后吞掉，
+    由_attempts决定是否退避重试；流式响应已产出内容时改为抛出StreamInterrupted。
+    取消请求时只释放熔断器的试探名额。
+    """
+
+    def __init__(self, client, model_name, limiter, breaker, stats, trace, number, max_retries, throttled,
+                 reservation=0):
+        self.client = client
+        self.model_name = model_name
+        self.limiter = limiter
+        self.breaker = breaker
+        self.stats = stats
+        self.trace = trace
+        self.number = number
+        self.max_retries = max_retries
+        self.throttled = throttled
+        self.reservation = reservation
+        self.estimated = 0
+        self.started = None
+        # None（未完成）、"success"、"throttled"或"failed"
+        self.outcome = None
+        # 流式响应已产出内容，此后失败不能重试，以免重复产出
+        self.committed = False
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    async def __aenter__(self):
+        try:
+            # 等待限流器放行（请求数/令牌数配额及Retry-After暂停）
+            self.estimated = await self.limiter.acquire(self.reservation)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        self.stats.requests += 1
+        self.client.metrics.inc("requests_total", model=self.model_name)
+        self.started = time.monotonic()
+        return self
+
+    def throttle(self, response):
+        """429：按Retry-After暂停该模型的所有请求后重试，不占用普通重试次数；返回是否应重试"""
+        if response.status_code != 429 or self.throttled >= MAX_THROTTLE_RETRIES:
+            return False
+        self.throttled += 1
+        # 等待时间不超过熔断器的打开时长
+        retry_after = parse_retry_after(response.headers.get("Retry-After"), self.breaker.open_seconds)
+        wait_time = retry_after if retry_after is not None else 2 ** min(self.throttled, 6)
+        self.limiter.block_for(wait_time)
+        self.breaker.release()
+        self.client.metrics.inc("errors_total", model=self.model_name, type="throttled")
+        self.client.metrics.inc("retries_total", model=self.model_name, reason="throttled")
+        logger.warning("模型 %s 触发限流(429)，暂停 %.1f 秒后重试 (%d/%d)", self.model_name, wait_time, self.throttled,
+                       MAX_THROTTLE_RETRIES, extra={"model": self.model_name})
+        self.outcome = "throttled"
+        return True
+
+    def succeed(self, prompt_tokens, usage, first_delta=None, stream=False):
+        """记录成功请求的用量与耗时；流式请求按首段内容到达的耗时first_delta判断是否为慢请求"""
+        if "total_tokens" in usage:
+            logger.debug("本次请求消耗 %s tokens", usage['total_tokens'], extra={"model": self.model_name})
+        elapsed = self.elapsed
+        self.limiter.record_usage(usage.get("total_tokens", 0), self.estimated)
+        self.client._record_usage(self.model_name, prompt_tokens, usage, elapsed, stream=stream)
+        # 流式请求也按完整响应的耗时记录，与普通请求的p95（对冲延迟）可比
+        self.client.get_latency_tracker(self.model_name).record(elapsed)
+        self.breaker.record_success(first_delta if first_delta is not None else elapsed)
+        self.outcome = "success"
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.client.metrics.observe("stage_duration_seconds", self.elapsed, stage="http", model=self.model_name)
+        if exc_type is None:
+            return False
+        if issubclass(exc_type, (asyncio.CancelledError, GeneratorExit)):
+            self.breaker.release()
+            return False
+
+        self.breaker.record_failure()
+        http_error = issubclass(exc_type, httpx.HTTPError)
+        self.client.metrics.inc("errors_total", model=self.model_name, type="http" if http_error else "other")
+        self.outcome = "failed"
+        if self.committed:
+            reason = "中断" if http_error else "解析失败"
+            logger.warning("模型 %s 流式响应%s: %s", self.model_name, reason, exc, extra={"model": self.model_name})
+            raise StreamInterrupted(f"模型 {self.model_name} 流式响应{reason}: {exc}") from exc
+        logger.warning("%s (%d/%d): %s", "请求异常" if http_error else "未知错误", self.number, self.max_retries,
+                       exc, extra={"model": self.model_name})
+        return True
+
+
+def _stream_delta(stream_format, event):
+    """从一条SSE事件中提取新增文本"""
+    if stream_format == "openai":
+        choices = event.get("choices") or []
+        if choices:
+            return (choices[0].get("delta") or {}).get("content") or ""
+        return ""
+    output = event.get("output") or {}
+    choices = output.get("choices") or []
+    if choices:
+        return (choices[0].get("message") or {}).get("content") or ""
+    return output.get("text") or ""
+
+
+def _with_json_format(payload, json_format, schema):
+    """在请求payload中加入JSON输出要求，json_format为None时原样返回"""
+    if json_format == "json_schema":
+        return dict(payload, response_format={
+            "type": "json_schema",
+            "json_schema": {"name": "test_cases", "strict": True, "schema": schema}
+        })
+    if json_format == "json_object":
+        return dict(payload, response_format={"type": "json_object"})
+    if json_format == "dashscope":
+        return dict(payload, parameters=dict(payload.get("parameters", {}), response_format={"type": "json_object"}))
+    return payload
@@ -0,0 +1,115 @@
+import re
+from pdf_text import is_heading
+
+HTTP_METHODS = ("GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS")
+
+# 字段标签 -> 接口字典中的键；请求头、请求参数、返回结果为列表字段，其余为单值字段
+# 标签区分大小写：参数列表中常有path、url、description等小写参数名，不应被当作标签
+FIELD_LABELS = {
+    "描述": ("接口描述", "接口说明", "功能描述", "描述", "说明", "Description"),
+    "方法": ("请求方式", "请求方法", "HTTP方法", "Method", "HTTP Method"),
+    "路径": ("请求URL", "请求地址", "请求路径", "接口地址", "URL", "Path", "Endpoint"),
+    "请求头": ("请求头", "Headers", "Header"),
+    "请求参数": ("请求参数", "请求体", "参数", "Parameters", "Request Body", "Body"),
+    "返回结果": ("返回结果", "返回参数", "返回值", "响应参数", "响应", "Responses", "Response")
+}
+LIST_FIELDS = ("请求头", "请求参数", "返回结果")
+
+# 每个列表字段最多保留的条目数，避免大段返回示例撑大提示
+MAX_FIELD_ITEMS = 20
+
+_LABEL_PATTERN = re.compile(
+    r'^\s*(' + "|".join(sorted((re.escape(label) for labels in FIELD_LABELS.values() for label in labels),
+                              key=len, reverse=True)) + r')\s*[：:]\s*(.*)$'
+)
+_LABEL_FIELDS = {label: field for field, labels in FIELD_LABELS.items() for label in labels}
+# 请求行：大写的方法 + 以/或http(s)://开头的路径，正文中的"POST请求……"不算
+_REQUEST_LINE_PATTERN = re.compile(r'^\s*(' + "|".join(HTTP_METHODS) + r')\s+(/\S*|https?://\S+)')
+_METHOD_PATTERN = re.compile(r'(' + "|".join(HTTP_METHODS) + r')', re.IGNORECASE)
+_ITEM_PATTERN = re.compile(r'^\s*(?:[-*•·]|\d+[.、)）])\s*')
+_HEADING_NUMBER_PATTERN = re.compile(r'^\s*(?:#+\s*)?(?:\d+(?:\.\d+)*(?:[.、．]\s*|\s+)|[一二三四五六七八九十]+[、.．]\s*)?')
+
+
+def _new_endpoint(name=""):
+    return {"名称": name, "描述": "", "方法": "", "路径": "", "请求头": [], "请求参数": [], "返回结果": []}
+
+
+def _is_complete(endpoint):
+    return bool(endpoint and endpoint["方法"] and endpoint["路径"])
+
+
+def iter_endpoints(pages):
+    """从逐页文本中识别API接口，逐个产出接口字典
+
+    接口章节以标题行开始（如"1. 用户注册接口"），章节中需要有请求方式和请求路径：
+    "请求方式：POST" + "请求URL：/api/v1/users"，或"POST /api/v1/users"形式的请求行。
+    "请求头"、"请求参数"、"返回结果"等标签之后的条目归入对应字段。没有请求方式或路径的章节（如概述）跳过。
+    """
+    endpoint = None
+    field = None
+
+    for text in pages:
+        for line in text.split("\n"):
+            stripped = line.strip()
+            if not stripped:
+                continue
+
+            request_line = _REQUEST_LINE_PATTERN.match(stripped)
+            if request_line and _is_complete(endpoint):
+                # 同一章节中的多个请求行各为一个接口
+                yield endpoint
+                endpoint = _new_endpoint()
+            if request_line:
+                endpoint = endpoint or _new_endpoint()
+                endpoint["方法"] = request_line.group(1).upper()
+                endpoint["路径"] = request_line.group(2)
+                field = None
+                continue
+
+            label = _LABEL_PATTERN.match(stripped)
+            if label and endpoint is not None:
+                field = _LABEL_FIELDS[label.group(1)]
+                value = label.group(2).strip()
+                if field in LIST_FIELDS:
+                    if value:
+                        endpoint[field].append(value)
+                    continue
+                if field == "方法":
+                    method = _METHOD_PATTERN.search(value)
+                    value = method.group(1).upper() if method else ""
+                elif field == "路径":
+                    # "请求URL：POST /api/v1/users"这类写法同时给出方法
+                    inline = _REQUEST_LINE_PATTERN.match(value)
+                    if inline:
+                        endpoint["方法"] = endpoint["方法"] or inline.group(1).upper()
+                        value = inline.group(2)
+                endpoint[field] = value
+                field = None
+                continue
+
+            # 参数条目常以"1. name: ..."编号，带冒号的编号行不作为新章节
+            if is_heading(stripped) and not (field and re.search(r'[：:]', stripped)):
+                if _is_complete(endpoint):
+                    yield endpoint
+                endpoint = _new_endpoint(_HEADING_NUMBER_PATTERN.sub("", stripped).strip())
+                field = None
+                continue
+
+            if endpoint is not None and field in LIST_FIELDS:
+                item = _ITEM_PATTERN.sub("", stripped)
+                if len(endpoint[field]) < MAX_FIELD_ITEMS and item:
+                    endpoint[field].append(item)
+
+    if _is_complete(endpoint):
+        yield endpoint
+
+
+def endpoint_requirement(endpoint):
+    """把接口字典整理为一条紧凑的需求文本，作为生成测试点的输入"""
+    name = endpoint["名称"] or f"{endpoint['方法']} {endpoint['路径']}"
+    lines = [f"{name}：{endpoint['描述']}" if endpoint["描述"] else name,
+             f"{endpoint['方法']} {endpoint['路径']}"]
+    for field in LIST_FIELDS:
+        if endpoint[field]:
+            lines.append(f"{field}：{'；'.join(endpoint[field])}")
+    return "\n".join(lines)
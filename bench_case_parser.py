@@ -0,0 +1,235 @@
+import re
+import sys
+import time
+import random
+import argparse
+from case_parser import split_case_blocks, parse_case_block
+
+PRIORITIES = ["高", "中", "低", "High", "Middle", "Low", "Nice To Have"]
+HEADER_FORMATS = [
+    "### 测试用例{index}：{title}",
+    "### 测试用例{index}: {title}",
+    "## 测试用例 {index}：{title}",
+    "**测试用例{index}：{title}**",
+    "测试用例{index}：{title}"
+]
+PREAMBLES = ["", "好的，以下是根据需求生成的测试用例：\n\n", "根据需求分析，设计如下测试用例。\n\n---\n\n"]
+STEP_TEXTS = [
+    "进入充值页面", "输入金额1.5元", "选择版本v2.0.1", "点击\"确定\"按钮", "输入手机号13800000000",
+    "等待3秒后刷新页面", "上传大小为10.5MB的文件", "勾选第2项并提交"
+]
+# 旧解析器按"数字."切分步骤，含小数、版本号的步骤会被误切；以旧解析器为准的对比只使用其余步骤
+LEGACY_STEP_TEXTS = [step for step in STEP_TEXTS if not re.search(r'\d\.', step)]
+FIELD_TEXTS = [
+    "用户已登录系统", "账户余额为100.00元", "系统中存在状态为\"启用\"的记录", "页面提示操作成功",
+    "列表按创建时间倒序展示，每页20条", "数据保存正确，日志记录操作人"
+]
+
+
+def legacy_parse(response):
+    """重构前parse_test_cases/build_test_case中的正则级联解析（仅用于对比）"""
+    if not response:
+        return []
+    response = re.sub(r'^.*?(?:### 测试用例|测试用例1|测试用例：)', '', response, flags=re.DOTALL).strip()
+    case_blocks = re.split(r'###\s+测试用例\d+[:：]', response)
+    if case_blocks and not case_blocks[0].strip():
+        case_blocks = case_blocks[1:]
+
+    cases = []
+    for block in case_blocks:
+        if not block.strip():
+            continue
+        title_match = re.match(r'(.+?)(?:\*\*优先级|\n)', block)
+        priority_match = re.search(r'\*\*优先级\*\*[:：]\s*([高中低]|High|Middle|Low|Nice To Have)', block)
+        precondition_match = re.search(r'\*\*前置条件\*\*[:：]\s*(.+?)(?=\*\*|\Z)', block, re.DOTALL)
+        steps_match = re.search(r'\*\*测试步骤\*\*[:：]\s*(.+?)(?=\*\*预期结果|\Z)', block, re.DOTALL)
+        steps_text = steps_match.group(1).strip() if steps_match else ""
+        expected_match = re.search(r'\*\*预期结果\*\*[:：]\s*(.+?)(?=###|\Z)', block, re.DOTALL)
+        cases.append({
+            "title": title_match.group(1).strip() if title_match else None,
+            "priority": priority_match.group(1).strip() if priority_match else None,
+            "precondition": precondition_match.group(1).strip() if precondition_match else "",
+            "steps": [step.strip() for step in re.findall(r'\d+\.\s*(.+?)(?=\d+\.|$)', steps_text, re.DOTALL)],
+            "expected": expected_match.group(1).strip() if expected_match else ""
+        })
+    return cases
+
+
+def new_parse(response):
+    return [parse_case_block(block) for block in split_case_blocks(response)]
+
+
+def random_case(rng, index, canonical=False, step_texts=STEP_TEXTS):
+    """生成一个用例的文本及其期望的解析结果；canonical为True时只使用提示模板要求的格式"""
+    expected = {
+        "title": f"场景{index}-{rng.choice(['正常流程', '边界值', '异常输入', '权限校验'])}",
+        "priority": rng.choice(PRIORITIES),
+        "precondition": rng.choice(FIELD_TEXTS),
+        "steps": rng.sample(step_texts, rng.randint(1, min(5, len(step_texts)))),
+        "expected": rng.choice(FIELD_TEXTS)
+    }
+    separator = "：" if canonical else rng.choice(["：", ":"])
+    numbering = ". " if canonical else rng.choice([". ", "、", "."])
+    if not canonical and rng.random() < 0.2:
+        steps = " ".join(f"{j}{numbering}{step}" for j, step in enumerate(expected["steps"], 1))
+    else:
+        steps = "\n" + "\n".join(f"{j}{numbering}{step}" for j, step in enumerate(expected["steps"], 1))
+    text = "\n".join([
+        (HEADER_FORMATS[0] if canonical else rng.choice(HEADER_FORMATS)).format(index=index, title=expected["title"]),
+        f"**优先级**{separator}{expected['priority']}",
+        f"**前置条件**{separator}{expected['precondition']}",
+        f"**测试步骤**{separator}{steps}",
+        f"**预期结果**{separator}{expected['expected']}",
+        ""
+    ])
+    return text, expected
+
+
+def random_response(rng, count):
+    cases = [random_case(rng, i) for i in range(1, count + 1)]
+    text = rng.choice(PREAMBLES) + "\n".join(case_text for case_text, _ in cases)
+    return text, [expected for _, expected in cases]
+
+
+def legacy_compatible_response(rng, count):
+    """生成两个解析器都能正确处理的回复：提示模板格式，步骤中没有小数"""
+    cases = [random_case(rng, i, canonical=True, step_texts=LEGACY_STEP_TEXTS)[0] for i in range(1, count + 1)]
+    return rng.choice(PREAMBLES) + "\n".join(cases)
+
+
+def normalize_legacy(cases):
+    """旧解析器去掉开头内容时只去掉了"### 测试用例"，第一个用例的标题会残留编号"1："，对比前去掉"""
+    if cases and cases[0]["title"]:
+        cases[0]["title"] = re.sub(r'^\d+[:：]', '', cases[0]["title"]).strip()
+    return cases
+
+
+def canonical_response(rng, size_kb):
+    """生成约size_kb大小、格式符合提示模板的回复，两个解析器切分出的用例数相同"""
+    texts = [PREAMBLES[1]]
+    size = len(PREAMBLES[1].encode("utf-8"))
+    index = 0
+    while size < size_kb * 1024:
+        index += 1
+        case_text, _ = random_case(rng, index, canonical=True)
+        texts.append(case_text)
+        size += len(case_text.encode("utf-8")) + 1
+    return "\n".join(texts)
+
+
+def mutate(rng, text):
+    """对回复做随机破坏：截断、插入噪声字符、删除或重复行"""
+    kind = rng.randrange(4)
+    if kind == 0:
+        return text[:rng.randrange(len(text) + 1)]
+    if kind == 1:
+        noise = "#*：:.、1234567890\n测试用例优先级 "
+        chars = list(text)
+        for _ in range(rng.randint(1, 20)):
+            chars.insert(rng.randrange(len(chars) + 1), rng.choice(noise))
+        return "".join(chars)
+    lines = text.split("\n")
+    if kind == 2 and lines:
+        del lines[rng.randrange(len(lines))]
+    else:
+        lines.insert(rng.randrange(len(lines) + 1), rng.choice(lines))
+    return "\n".join(lines)
+
+
+def run_fuzz(rng, iterations):
+    """校验新解析器，返回不一致的组数
+
+    两个解析器都能处理的回复以旧解析器的结果为准；旧解析器不支持的格式（标题变体、英文冒号、
+    "、"编号、步骤写在同一行等）用生成时的标准答案校验；随机破坏的回复只要求不抛异常。
+    """
+    legacy_mismatches = 0
+    answer_mismatches = 0
+    for _ in range(iterations):
+        text = legacy_compatible_response(rng, rng.randint(1, 6))
+        if new_parse(text) != normalize_legacy(legacy_parse(text)):
+            legacy_mismatches += 1
+
+        text, expected = random_response(rng, rng.randint(1, 6))
+        if new_parse(text) != expected:
+            answer_mismatches += 1
+        new_parse(mutate(rng, text))
+    print(f"模糊测试: {iterations} 组回复，与旧解析器不一致 {legacy_mismatches} 组，"
+          f"与标准答案不一致 {answer_mismatches} 组")
+    return legacy_mismatches + answer_mismatches
+
+
+def pathological_inputs(size):
+    """对正则回溯不友好的输入：大量未闭合的字段标题、连续数字点号、无换行长文本"""
+    return {
+        "字段标题无内容": "### 测试用例1：标题\n" + "**前置条件**：**" * (size // 10),
+        "连续编号": "### 测试用例1：标题\n**测试步骤**：" + "1.2.3." * (size // 6),
+        "无换行长标题": "### 测试用例1：" + "标" * size,
+        "无用例标题": "好的，" + "测试用例" * (size // 4)
+    }
+
+
+def measure(parse, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parse(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def compare(text, repeat):
+    """交替计时两个解析器，机器负载的波动对两者的影响相同，返回(新, 旧)各自最快一次的耗时"""
+    new_time = legacy_time = float("inf")
+    for _ in range(repeat):
+        new_time = min(new_time, measure(new_parse, text, 1))
+        legacy_time = min(legacy_time, measure(legacy_parse, text, 1))
+    return new_time, legacy_time
+
+
+def run_benchmark(rng, sizes_kb, repeat):
+    """在不同回复大小下比较两个解析器，单位耗时（微秒/KB）基本不变即为线性"""
+    print(f"\n{'大小(KB)':>10} {'用例数':>8} {'新(ms)':>10} {'旧(ms)':>10} {'新(us/KB)':>10} {'旧(us/KB)':>10}")
+    slower = []
+    for size_kb in sizes_kb:
+        text = canonical_response(rng, size_kb)
+        actual_kb = len(text.encode("utf-8")) / 1024
+        new_time, legacy_time = compare(text, repeat)
+        print(f"{actual_kb:>10.0f} {len(new_parse(text)):>8} {new_time * 1000:>10.2f} {legacy_time * 1000:>10.2f} "
+              f"{new_time * 1e6 / actual_kb:>10.1f} {legacy_time * 1e6 / actual_kb:>10.1f}")
+        if new_time > legacy_time:
+            slower.append(size_kb)
+
+    # 病态输入取最大大小及其1/4各测一次，耗时之比接近4即为线性
+    size = max(sizes_kb) * 1024
+    print(f"\n病态输入（{max(sizes_kb) // 4}KB -> {max(sizes_kb)}KB）:")
+    for name, text in pathological_inputs(size).items():
+        quarter = pathological_inputs(size // 4)[name]
+        new_times = [measure(new_parse, quarter, repeat), measure(new_parse, text, repeat)]
+        legacy_times = [measure(legacy_parse, quarter, repeat), measure(legacy_parse, text, repeat)]
+        print(f"  {name}: 新 {new_times[0] * 1000:.2f} -> {new_times[1] * 1000:.2f} ms，"
+              f"旧 {legacy_times[0] * 1000:.2f} -> {legacy_times[1] * 1000:.2f} ms")
+    return slower
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='测试用例解析器的模糊测试与性能对比')
+    parser.add_argument('--iterations', type=int, default=2000, help='模糊测试的回复组数（默认：2000）')
+    parser.add_argument('--sizes', type=str, default='1,4,30,128,512,1024',
+                        help='性能对比的回复大小，单位KB，逗号分隔（默认：1,4,30,128,512,1024）')
+    parser.add_argument('--repeat', type=int, default=5, help='每个大小重复计时次数，取最快一次（默认：5）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子（默认：0）')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    rng = random.Random(args.seed)
+    failures = run_fuzz(rng, args.iterations)
+    slower = run_benchmark(rng, [int(size) for size in args.sizes.split(",")], args.repeat)
+    if slower:
+        print(f"\n以下大小新解析器慢于旧解析器: {slower} KB")
+    sys.exit(1 if failures or slower else 0)
+
+
+if __name__ == "__main__":
+    main()
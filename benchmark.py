@@ -0,0 +1,236 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import contextlib
+import subprocess
+import httpx
+from hedging import LatencyTracker
+from mock_llm_server import OPENAI_PATH, LATENCY_DISTRIBUTIONS
+from json_output import OUTPUT_FORMATS
+from metrics import METRICS
+from structured_log import configure_logging
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCHMARK_TARGETS = ["script", "utils"]
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB），无法获取时返回None"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux单位为KB，macOS为字节
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_server(args):
+    """在子进程中启动模拟服务，返回(进程, 接口地址)"""
+    port = _free_port()
+    command = [
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_llm_server.py"),
+        "--port", str(port),
+        "--latency-ms", str(args.latency_ms),
+        "--latency-dist", args.latency_dist,
+        "--latency-sigma", str(args.latency_sigma),
+        "--error-rate", str(args.error_rate),
+        "--rate-limit-rate", str(args.rate_limit_rate),
+        "--retry-after", str(args.retry_after),
+        "--cases", str(args.cases)
+    ]
+    if args.seed is not None:
+        command += ["--seed", str(args.seed)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("模拟服务启动失败")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return process, f"http://127.0.0.1:{port}{OPENAI_PATH}"
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("等待模拟服务启动超时")
+
+
+def synthetic_requirements(count):
+    """生成count条与read_excel_requirements输出格式一致的需求"""
+    priorities = ["高", "中", "低"]
+    return [
+        {
+            "需求ID": f"REQ{i:05d}",
+            "标题": f"【模块{i % 50}-功能{i}】新增页面",
+            "详细描述": f"功能{i}：支持按名称、状态和创建时间筛选记录，列表分页展示，"
+                       f"支持新增、编辑、删除和导出Excel。名称长度1-50字符且同一园区下唯一，"
+                       f"删除前需二次确认，导出最多10000条。",
+            "优先级": priorities[i % 3],
+            "父需求": "",
+            "需求分类": "功能需求",
+            "迭代": "迭代27",
+            "处理人": ""
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def load_target(target):
+    """导入被测的生成流程，返回(agenerate_test_cases, AIClient, read_excel_requirements)
+
+    需要在设置好AI_BASE_URL等环境变量之后调用，模型配置在导入时读取环境变量。
+    """
+    if target == "utils":
+        from AITestUtils import AITestSuiteUtils
+        utils = AITestSuiteUtils()
+        return utils.agenerate_test_cases, utils.client, utils.read_excel_requirements
+    import generate_testcase
+    return generate_testcase.agenerate_test_cases, generate_testcase.AI_CLIENT, generate_testcase.read_excel_requirements
+
+
+async def run_benchmark(generate, client, requirements, args):
+    """执行一轮生成并收集统计数据"""
+    # 不限窗口大小，保留本轮全部请求的耗时
+    latency = LatencyTracker(window=None)
+    client.latency[args.model] = latency
+
+    started = time.perf_counter()
+    test_cases = await generate(requirements, args.model, concurrency=args.concurrency,
+                                pack_size=args.pack_size, pack_tokens=args.pack_tokens, stream=args.stream,
+                                output_format=args.output_format)
+    elapsed = time.perf_counter() - started
+    await client.aclose()
+
+    covered = {str(case["需求ID"]) for case in test_cases}
+    limiter = client.limiters.get(args.model)
+    peak_rss = peak_rss_mb()
+    percentiles = {f"p{pct}_ms": round(latency.percentile(pct) * 1000, 1) if latency.samples else None
+                   for pct in (50, 95, 99)}
+    return dict({
+        "target": args.target,
+        "requirements": len(requirements),
+        "test_cases": len(test_cases),
+        "failed_requirements": sum(1 for req in requirements if str(req["需求ID"]) not in covered),
+        "elapsed_seconds": round(elapsed, 3),
+        "requirements_per_second": round(len(requirements) / elapsed, 2) if elapsed else None,
+        "http_requests": len(latency.samples),
+        "throttled": limiter.throttled if limiter else 0,
+        "peak_rss_mb": round(peak_rss, 1) if peak_rss is not None else None
+    }, **percentiles)
+
+
+def print_report(result, server_stats=None):
+    print("\n=== 压测结果 ===")
+    print(f"被测流程: {result['target']}")
+    print(f"需求数: {result['requirements']}，生成用例: {result['test_cases']}，"
+          f"失败需求: {result['failed_requirements']}")
+    print(f"耗时: {result['elapsed_seconds']} 秒，吞吐: {result['requirements_per_second']} 条需求/秒")
+    if result["p50_ms"] is not None:
+        print(f"请求延迟: p50 {result['p50_ms']} ms，p95 {result['p95_ms']} ms，p99 {result['p99_ms']} ms"
+              f"（成功请求 {result['http_requests']} 次）")
+    else:
+        print("请求延迟: 无数据（没有成功的请求）")
+    print(f"触发429: {result['throttled']} 次")
+    if result["peak_rss_mb"] is not None:
+        print(f"峰值内存(RSS): {result['peak_rss_mb']} MB")
+    else:
+        print("峰值内存(RSS): 无法获取（请安装psutil）")
+    if server_stats:
+        print(f"模拟服务: 收到请求 {server_stats['requests']} 次，注入500 {server_stats['errors']} 次，"
+              f"注入429 {server_stats['throttled']} 次")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='测试用例生成流程的端到端压测（默认使用本地模拟服务）')
+    parser.add_argument('--target', type=str, default='script', choices=BENCHMARK_TARGETS,
+                        help='被测流程：script为generate_testcase.py，utils为AITestSuiteUtils（默认：script）')
+    parser.add_argument('--requirements', type=int, default=200, help='生成的模拟需求条数（默认：200）')
+    parser.add_argument('--input', type=str, help='使用指定的需求Excel文件代替模拟需求')
+    parser.add_argument('--model', type=str, default='default', help='使用的模型配置（默认：default）')
+    parser.add_argument('--concurrency', type=int, default=32, help='并发请求数（默认：32）')
+    parser.add_argument('--pack-size', type=int, default=1, help='每个请求打包的需求条数（默认：1）')
+    parser.add_argument('--pack-tokens', type=int, default=0, help='打包请求的tokens预算（默认：0）')
+    parser.add_argument('--stream', action='store_true', help='使用流式响应')
+    parser.add_argument('--output-format', type=str, default='markdown', choices=OUTPUT_FORMATS,
+                        help='要求模型输出的格式（默认：markdown）')
+    parser.add_argument('--server-url', type=str, help='使用已启动的服务地址，不再启动模拟服务')
+    parser.add_argument('--latency-ms', type=float, default=500, help='模拟延迟中位数，单位毫秒（默认：500）')
+    parser.add_argument('--latency-dist', type=str, default='lognormal', choices=LATENCY_DISTRIBUTIONS,
+                        help='模拟延迟分布（默认：lognormal）')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='lognormal分布的sigma（默认：0.5）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟500错误的比例（默认：0）')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='模拟429的比例（默认：0）')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='模拟429的Retry-After秒数（默认：1）')
+    parser.add_argument('--cases', type=int, default=3, help='模拟服务每条需求返回的用例数（默认：3）')
+    parser.add_argument('--seed', type=int, help='模拟服务的随机种子')
+    parser.add_argument('--json-out', type=str, help='把结果另存为JSON文件')
+    parser.add_argument('--verbose', action='store_true', help='输出生成流程自身的日志（级别和格式由AI_LOG_LEVEL、AI_LOG_FORMAT指定）')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    # 生成流程的日志输出到stderr，未指定--verbose时只保留错误
+    configure_logging(None if args.verbose else "ERROR")
+
+    process = None
+    base_url = args.server_url
+    if not base_url:
+        process, base_url = start_mock_server(args)
+        print(f"模拟服务已启动: {base_url}")
+    try:
+        # 模型配置在导入时读取环境变量，必须先设置再导入被测流程
+        os.environ["AI_BASE_URL"] = base_url
+        os.environ.setdefault("AI_API_KEY", "mock-key")
+        os.environ.setdefault("MODEL_NAME", "mock-model")
+        generate, client, read_requirements = load_target(args.target)
+
+        requirements = read_requirements(args.input) if args.input else synthetic_requirements(args.requirements)
+        if not requirements:
+            print("错误：无法读取需求数据")
+            return
+        print(f"开始压测: {len(requirements)} 条需求，并发 {args.concurrency}")
+
+        with open(os.devnull, "w", encoding="utf-8") as devnull:
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)
+            with output:
+                result = asyncio.run(run_benchmark(generate, client, requirements, args))
+
+        server_stats = None
+        if process is not None:
+            try:
+                server_stats = httpx.get(base_url.replace(OPENAI_PATH, "/stats"), timeout=5).json()
+            except httpx.HTTPError:
+                pass
+        print_report(result, server_stats)
+
+        if args.json_out:
+            with open(args.json_out, "w", encoding="utf-8") as f:
+                json.dump(dict(result, server=server_stats, metrics=METRICS.summary()), f, ensure_ascii=False, indent=2)
+            print(f"结果已保存到: {args.json_out}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
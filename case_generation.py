@@ -0,0 +1,464 @@
+import time
+import asyncio
+from case_parser import StreamingCaseParser, split_case_blocks, parse_case_block
+from prompt_packing import SECTION_HEADER, estimate_tokens, pack_requirements, split_packed_response
+from token_budget import estimate_messages_tokens
+from metrics import METRICS
+from structured_log import get_logger, request_context
+from json_output import (TEST_CASES_SCHEMA, PACKED_SCHEMA, JSON_FORMAT_TEMPLATE, PACKED_JSON_FORMAT_TEMPLATE,
+                         ParseStats, decode_cases, split_packed_json)
+from near_duplicates import NearDuplicateFinder, restamp_cases
+from requirement_stream import aiter_chunks
+from ai_client import StreamInterrupted
+
+logger = get_logger("case_generation")
+
+# 测试用例输出格式要求，单条与打包提示共用
+CASE_FORMAT_TEMPLATE = """请生成至少3个测试用例，每个测试用例包括：
+1. 测试目标
+2. 前置条件
+3. 详细的测试步骤
+4. 预期结果
+5. 优先级（高/中/低）
+
+请严格按照以下格式输出：
+
+### 测试用例1：[测试目标]
+**优先级**：[高/中/低]
+**前置条件**：[前置条件描述]
+**测试步骤**：
+1. [步骤1]
+2. [步骤2]
+...
+**预期结果**：[预期结果描述]
+
+### 测试用例2：[测试目标]
+...
+"""
+
+# 优先级映射
+PRIORITY_MAP = {
+    "高": "High",
+    "中": "Middle",
+    "低": "Low",
+    "可选": "Nice To Have",
+    "high": "High",
+    "middle": "Middle",
+    "low": "Low",
+    "nice to have": "Nice To Have"
+}
+
+
+class CaseGenerator:
+    """按需求调用模型生成并解析测试用例，generate_testcase.py与AITestSuiteUtils共用这一实现
+
+    client为ai_client.AIClient；default_config提供需求分类、迭代、处理人的默认值；
+    parse_stats为{模型名: json_output.ParseStats}，各模型回复的解析统计记入其中。
+    """
+
+    def __init__(self, client, default_config, parse_stats=None):
+        self.client = client
+        self.default_config = default_config
+        self.parse_stats = parse_stats if parse_stats is not None else {}
+
+    async def agenerate_test_cases(self, requirements, model_name, concurrency=1, pack_size=1, pack_tokens=0,
+                                   stream=False, on_case=None, journal=None, dedup_threshold=0,
+                                   output_format="markdown"):
+        """异步根据需求生成测试用例
+
+        最多同时有concurrency个请求在等待模型响应，结果仍按需求原始顺序汇总，
+        用例编号 TC-{需求ID}-NN 与串行执行完全一致。
+        pack_size大于1或pack_tokens大于0时启用打包模式：每个请求最多包含pack_size条需求
+        （0表示不限条数）且需求部分不超过pack_tokens个tokens，回复中缺失的需求单独重新请求。
+        stream为True时单条需求使用流式响应，每个用例解析完成后立即调用on_case(case)。
+        journal为run_journal.RunJournal时，每完成一条需求即写入日志，日志中已完成的需求
+        不再请求，返回结果从日志按需求顺序重建。
+        dedup_threshold大于0时，标题+详细描述的SimHash相似度达到该值的需求视为近似重复，
+        只为其中第一条调用模型，其余复用其用例并重新编号。
+        output_format为"json"且模型支持JSON输出时，要求模型按json_output中的结构输出JSON，
+        回复无法按JSON解析时回退为Markdown解析；此时不使用流式响应。
+        requirements也可以是逐条产出需求的迭代器（如iter_excel_requirements），此时边读取边请求，
+        第一条需求读到后即开始调用模型。
+        """
+        system_prompt = "你是一位专业的测试工程师，擅长编写详细、全面的测试用例。"
+
+        # 对于DeepSeek模型，可能需要调整提示
+        if model_name.startswith("deepseek"):
+            system_prompt = "你是一位专业的测试工程师，擅长编写详细、全面的测试用例。请严格按照指定格式输出。"
+
+        json_output = output_format == "json" and self.client.json_format(model_name) is not None
+        if output_format == "json" and not json_output:
+            logger.warning("模型 %s 未配置JSON输出，使用Markdown格式", model_name)
+        elif json_output and stream:
+            logger.warning("JSON输出模式不使用流式响应")
+
+        semaphore = asyncio.Semaphore(max(1, concurrency or 1))
+
+        async def single(req):
+            async with semaphore:
+                if stream and not json_output:
+                    return await self.astream_for_requirement(req, model_name, system_prompt, on_case, journal)
+                return await self.agenerate_for_requirement(req, model_name, system_prompt, journal, json_output)
+
+        async def packed(batch):
+            if len(batch) == 1:
+                return [await single(batch[0])]
+            async with semaphore:
+                batch_cases = await self.agenerate_for_batch(batch, model_name, system_prompt, journal, json_output)
+            # 回复中缺失或无法解析的需求回退为单条请求，请求失败时不回退
+            fallback = [i for i, cases in enumerate(batch_cases) if cases is None]
+            retried = await asyncio.gather(*(single(batch[i]) for i in fallback))
+            for i, cases in zip(fallback, retried):
+                batch_cases[i] = cases
+            return batch_cases
+
+        # 需求为列表时一次性调度；为迭代器（如iter_excel_requirements）时在线程中分块读取，
+        # 读到的需求立即开始请求，同时最多保留window个未完成的请求单元，不会一次创建全部任务
+        all_requirements = []
+        generated = {}
+        duplicates = []
+        finder = NearDuplicateFinder(dedup_threshold) if dedup_threshold else None
+        packing = pack_size != 1 or pack_tokens
+        if packing:
+            # 打包后的提示不能超过模型的输入上限
+            overhead = estimate_messages_tokens(
+                self.build_messages(model_name, system_prompt, self.build_packed_prompt([], json_output)))
+            budget = self.client.prompt_budget(model_name) - overhead
+            pack_tokens = min(pack_tokens, budget) if pack_tokens else budget
+        window = max(1, concurrency or 1) * 4
+        running = set()
+        restored = 0
+        leftover = []
+
+        async def run_single(req):
+            generated[id(req)] = await single(req)
+
+        async def run_packed(batch):
+            for req, cases in zip(batch, await packed(batch)):
+                generated[id(req)] = cases
+
+        async def schedule(coro):
+            # 结果写入generated，最终按需求顺序汇总，与完成先后无关
+            while len(running) >= window:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                running.difference_update(done)
+                for task in done:
+                    task.result()
+            running.add(asyncio.ensure_future(coro))
+
+        async for chunk in aiter_chunks(requirements):
+            all_requirements.extend(chunk)
+            # 跳过日志中已完成的需求
+            pending = chunk
+            if journal:
+                pending = [req for req in chunk if not journal.is_done(req["需求ID"])]
+                restored += len(chunk) - len(pending)
+            # 近似重复的需求不单独调用模型
+            if finder:
+                pending, chunk_duplicates = finder.split(pending)
+                duplicates.extend(chunk_duplicates)
+            if not packing:
+                for req in pending:
+                    await schedule(run_single(req))
+                continue
+            # 最后一批可能未满，留到下一块继续装
+            batches = pack_requirements(
+                leftover + pending, pack_size, pack_tokens,
+                size_fn=lambda req: estimate_tokens(self.format_requirement(req))
+            )
+            leftover = batches.pop() if batches else []
+            for batch in batches:
+                await schedule(run_packed(batch))
+        if leftover:
+            await schedule(run_packed(leftover))
+        await asyncio.gather(*running)
+
+        if restored:
+            logger.info("从日志恢复 %d 条已完成的需求，剩余 %d 条", restored, len(all_requirements) - restored)
+        if duplicates:
+            logger.info("发现 %d 条近似重复的需求，将复用相似需求的测试用例", len(duplicates))
+
+        # 近似重复的需求复用相似需求的用例
+        for req, source in duplicates:
+            cases = restamp_cases(generated.get(id(source)) or [], source, req)
+            generated[id(req)] = cases
+            if not cases:
+                logger.warning("需求 %s 相似的需求 %s 未生成测试用例", req['需求ID'], source['需求ID'],
+                               extra={"req_id_source": str(source['需求ID'])})
+            elif journal and journal.is_done(source["需求ID"]):
+                # 相似需求的流式响应中断时同样不写入日志
+                journal.record(req["需求ID"], None, cases)
+
+        if journal:
+            return journal.cases_for(all_requirements)
+
+        all_test_cases = []
+        for req in all_requirements:
+            all_test_cases.extend(generated.get(id(req), []))
+
+        return all_test_cases
+
+    def format_requirement(self, req):
+        """需求在提示中的描述部分"""
+        return f"""需求ID: {req["需求ID"]}
+需求标题: {req["标题"]}
+需求描述: {req["详细描述"]}
+优先级: {req["优先级"]}
+需求分类: {req.get("需求分类", self.default_config["需求分类"])}
+迭代: {req.get("迭代", self.default_config["迭代"])}"""
+
+    def build_prompt(self, req, json_output=False):
+        """构建单条需求的提示信息"""
+        return f"""
+请根据以下需求生成详细的测试用例：
+
+{self.format_requirement(req)}
+
+{JSON_FORMAT_TEMPLATE if json_output else CASE_FORMAT_TEMPLATE}"""
+
+    def build_packed_prompt(self, batch, json_output=False):
+        """构建包含多条需求的提示信息，要求模型按需求ID分节输出"""
+        requirement_text = "\n\n".join(
+            f"【需求{i}】\n{self.format_requirement(req)}" for i, req in enumerate(batch, 1)
+        )
+        if json_output:
+            return f"""
+请根据以下{len(batch)}条需求分别生成详细的测试用例：
+
+{requirement_text}
+
+{PACKED_JSON_FORMAT_TEMPLATE}"""
+        example = "\n\n".join(
+            f"{SECTION_HEADER.format(req_id=req['需求ID'])}\n### 测试用例1：[测试目标]\n..." for req in batch[:2]
+        )
+        return f"""
+请根据以下{len(batch)}条需求分别生成详细的测试用例：
+
+{requirement_text}
+
+对每条需求，{CASE_FORMAT_TEMPLATE}
+请按需求分节输出，每节以单独一行的"{SECTION_HEADER.format(req_id='<需求ID>')}"开头，节内测试用例从1开始编号，例如：
+
+{example}
+"""
+
+    def build_messages(self, model_name, system_prompt, prompt):
+        """构建发送给模型的消息列表"""
+        if model_name == "gemini-pro":
+            # Gemini不支持system角色，将system提示合并到user提示中
+            system_prompt = "你是一位专业的测试工程师，擅长编写详细、全面的测试用例。"
+            return [
+                {"role": "user", "content": f"{system_prompt}\n\n{prompt}"}
+            ]
+        # 其他模型使用标准格式
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+
+    async def agenerate_for_requirement(self, req, model_name, system_prompt, journal=None, json_output=False):
+        """为单条需求调用模型并解析测试用例，期间的日志带上该需求ID"""
+        with request_context(req["需求ID"]):
+            logger.info("处理需求 %s: %s", req['需求ID'], req['标题'][:50], extra={"model": model_name})
+
+            with METRICS.timer("prompt_build", model_name):
+                messages = self.build_messages(model_name, system_prompt, self.build_prompt(req, json_output))
+            response = await self.client.acall(
+                model_name,
+                messages,
+                temperature=0.7,
+                json_schema=TEST_CASES_SCHEMA if json_output else None
+            )
+
+            if not response:
+                logger.warning("需求 %s 未能生成测试用例", req['需求ID'])
+                return []
+
+            parsed_cases = self.parse_requirement_cases(req, response, model_name, json_output)
+            if journal and parsed_cases:
+                journal.record(req["需求ID"], response, parsed_cases)
+            return parsed_cases
+
+    async def astream_for_requirement(self, req, model_name, system_prompt, on_case=None, journal=None):
+        """以流式响应为单条需求生成测试用例，每个用例块闭合后立即解析，期间的日志带上该需求ID
+
+        响应中途中断时返回已闭合的用例，但不写入日志，续跑时该需求会重新生成。
+        """
+        with request_context(req["需求ID"]):
+            logger.info("处理需求 %s（流式）: %s", req['需求ID'], req['标题'][:50], extra={"model": model_name})
+
+            std_priority = PRIORITY_MAP.get(req["优先级"].lower(), "Middle")
+            parser = StreamingCaseParser()
+            parsed_cases = []
+            # 仅在需要写日志时保留完整回复
+            parts = [] if journal else None
+
+            def collect(blocks):
+                for block in blocks:
+                    try:
+                        case = self.build_test_case(len(parsed_cases) + 1, block, req["需求ID"], req["标题"],
+                                                    req.get("父需求", ""), std_priority)
+                    except Exception as e:
+                        logger.warning("解析测试用例 %d 时出错: %s", len(parsed_cases) + 1, e)
+                        continue
+                    parsed_cases.append(case)
+                    if on_case:
+                        on_case(case)
+
+            with METRICS.timer("prompt_build", model_name):
+                messages = self.build_messages(model_name, system_prompt, self.build_prompt(req))
+            # 解析与接收交替进行，累计解析耗时后一次记录
+            parse_seconds = 0.0
+            interrupted = False
+            try:
+                async for delta in self.client.astream(model_name, messages, temperature=0.7):
+                    if parts is not None:
+                        parts.append(delta)
+                    started = time.perf_counter()
+                    collect(parser.feed(delta))
+                    parse_seconds += time.perf_counter() - started
+            except StreamInterrupted:
+                # 最后一个用例块可能不完整，只保留已闭合的用例
+                interrupted = True
+            else:
+                started = time.perf_counter()
+                collect(parser.close())
+                parse_seconds += time.perf_counter() - started
+            METRICS.observe("stage_duration_seconds", parse_seconds, stage="parse", model=model_name)
+            METRICS.observe("cases_per_requirement", len(parsed_cases), model=model_name)
+            self.get_parse_stats(model_name).record(parsed_cases)
+
+            if not parsed_cases:
+                logger.warning("需求 %s 未能生成测试用例", req['需求ID'])
+            elif interrupted:
+                logger.warning("需求 %s 的流式响应中断，保留已生成的 %d 条测试用例，续跑时将重新生成", req['需求ID'],
+                               len(parsed_cases), extra={"cases": len(parsed_cases)})
+            else:
+                logger.info("为需求 %s 生成了 %d 条测试用例", req['需求ID'], len(parsed_cases),
+                            extra={"cases": len(parsed_cases)})
+                if journal:
+                    journal.record(req["需求ID"], "".join(parts), parsed_cases)
+            return parsed_cases
+
+    async def agenerate_for_batch(self, batch, model_name, system_prompt, journal=None, json_output=False):
+        """用一个请求为多条需求生成测试用例
+
+        返回与batch对齐的列表，回复中缺失或未解析出用例的需求对应None，由调用方改为单条请求；
+        请求本身失败（重试用尽或模型已熔断）时各需求对应空列表，不再逐条重新请求。
+        """
+        req_ids = [str(req["需求ID"]) for req in batch]
+        with request_context(",".join(req_ids)):
+            logger.info("打包处理需求 %s", ', '.join(req_ids), extra={"model": model_name})
+
+            with METRICS.timer("prompt_build", model_name):
+                messages = self.build_messages(model_name, system_prompt, self.build_packed_prompt(batch, json_output))
+            response = await self.client.acall(
+                model_name,
+                messages,
+                temperature=0.7,
+                json_schema=PACKED_SCHEMA if json_output else None
+            )
+            if response is None:
+                # 拆成单条请求只会把同样的失败放大为多次请求
+                logger.warning("打包请求失败，需求 %s 未能生成测试用例", ', '.join(req_ids))
+                return [[] for _ in batch]
+
+            # JSON回复按req_id拆分，不是JSON时按Markdown分节拆分
+            sections = split_packed_json(response, req_ids) if json_output else None
+            if sections is None:
+                sections = split_packed_response(response, req_ids)
+            batch_cases = []
+            for req, req_id in zip(batch, req_ids):
+                with request_context(req_id):
+                    cases = (self.parse_requirement_cases(req, sections[req_id], model_name, json_output)
+                             if req_id in sections else [])
+                    if not cases:
+                        logger.warning("打包回复中缺少需求 %s 的测试用例，将单独请求", req_id)
+                    elif journal:
+                        journal.record(req_id, sections[req_id], cases)
+                batch_cases.append(cases or None)
+            return batch_cases
+
+    def get_parse_stats(self, model_name):
+        """获取模型回复的解析统计"""
+        return self.parse_stats.setdefault(model_name, ParseStats())
+
+    def parse_requirement_cases(self, req, response, model_name=None, json_output=False):
+        """解析单条需求对应的模型回复，json_output为True时优先按JSON解析"""
+        # 标准化优先级
+        std_priority = PRIORITY_MAP.get(req["优先级"].lower(), "Middle")
+
+        # 解析测试用例，JSON无法解析时回退为Markdown解析
+        with METRICS.timer("parse", model_name or ""):
+            parsed_cases = None
+            if json_output:
+                parsed_cases = self.parse_json_test_cases(response, req["需求ID"], req["标题"], req.get("父需求", ""),
+                                                          std_priority)
+            json_decoded = parsed_cases is not None
+            if parsed_cases is None:
+                parsed_cases = self.parse_test_cases(response, req["需求ID"], req["标题"], req.get("父需求", ""),
+                                                     std_priority)
+        METRICS.observe("cases_per_requirement", len(parsed_cases), model=model_name or "")
+        if model_name:
+            self.get_parse_stats(model_name).record(parsed_cases, json_output, json_decoded)
+
+        logger.info("为需求 %s 生成了 %d 条测试用例", req['需求ID'], len(parsed_cases), extra={"cases": len(parsed_cases)})
+        return parsed_cases
+
+    def parse_test_cases(self, response, req_id, req_title, parent_req, std_priority):
+        """解析AI生成的测试用例文本"""
+        if not response:
+            return []
+
+        # 单遍切分用例块，第一个用例标题之前的对话式开头被丢弃
+        test_cases = []
+        case_blocks = split_case_blocks(response)
+
+        for i, block in enumerate(case_blocks, 1):
+            try:
+                test_cases.append(self.build_test_case(i, block, req_id, req_title, parent_req, std_priority))
+            except Exception as e:
+                logger.warning("解析测试用例 %d 时出错: %s", i, e)
+
+        return test_cases
+
+    def parse_json_test_cases(self, response, req_id, req_title, parent_req, std_priority):
+        """解析JSON格式的测试用例回复，回复不是预期的JSON时返回None"""
+        case_fields = decode_cases(response)
+        if case_fields is None:
+            return None
+        return [self.build_case_from_fields(i, fields, req_id, req_title, parent_req, std_priority)
+                for i, fields in enumerate(case_fields, 1)]
+
+    def build_test_case(self, i, block, req_id, req_title, parent_req, std_priority):
+        """把单个用例块（不含"### 测试用例N："标题前缀）转换为测试用例字典"""
+        return self.build_case_from_fields(i, parse_case_block(block), req_id, req_title, parent_req, std_priority)
+
+    def build_case_from_fields(self, i, fields, req_id, req_title, parent_req, std_priority):
+        """把用例字段（case_parser.parse_case_block的返回格式）转换为测试用例字典"""
+        title = fields["title"] or f"测试用例{i}"
+
+        # 未给出或无法识别优先级时按"中"处理
+        priority = PRIORITY_MAP.get((fields["priority"] or "中").lower(), std_priority)
+        precondition = fields["precondition"]
+        expected_result = fields["expected"]
+
+        # 格式化步骤
+        formatted_steps = "\n".join([f"{j+1}. {step}" for j, step in enumerate(fields["steps"])])
+
+        # 创建测试用例
+        case_id = f"TC-{req_id}-{i:02d}"
+        test_case = {
+            "用例编号": case_id,
+            "需求ID": req_id,
+            "父需求": parent_req,
+            "需求分类": self.default_config["需求分类"],
+            "标题": f"测试-{req_title}-{title}",
+            "详细描述": f"**前置条件**：\n{precondition}\n\n**测试步骤**：\n{formatted_steps}\n\n**预期结果**：\n{expected_result}",
+            "测试步骤": formatted_steps,
+            "预期结果": expected_result,
+            "优先级": priority,
+            "迭代": self.default_config["迭代"],
+            "处理人": self.default_config["处理人"]
+        }
+        return test_case
@@ -0,0 +1,206 @@
+import re
+
+# 测试用例块的标题行，如"### 测试用例1：登录成功"，也接受"**测试用例1：登录成功**"等变体
+# 按行匹配，re.M下也可对整段文本finditer；[^\S\n]保证匹配不跨行
+CASE_HEADER_PATTERN = re.compile(r'^[^\S\n]*(?:#{1,4}[^\S\n]*)?(?:\*\*[^\S\n]*)?测试用例[^\S\n]*\d*[^\S\n]*[:：]', re.M)
+
+# 用例块内的字段标题，以及结束字段内容的"###"标题
+_FIELD_PATTERN = re.compile(r'\*\*(优先级|前置条件|测试步骤|预期结果)\*\*\s*[:：]|###')
+
+# 字段标题（含"###"）超过该数量的块不再整块切分，改为逐个字段定位，见_locate_fields
+_MAX_FIELD_SPLITS = 8
+
+# 各字段标题的完整模式：先用str.find定位字段名，再在其前两个字符（"**"）处匹配模式
+_FIELD_HEADERS = [(name, re.compile(r'\*\*' + name + r'\*\*\s*[:：]')) for name in ("优先级", "前置条件", "测试步骤", "预期结果")]
+
+# 步骤编号，如"1."、"2、"；排除"1.5"这类小数和"v1.2."这类版本号
+_STEP_PATTERN = re.compile(r'(?<![\d.])(\d+)([.．、])(?!\d)')
+
+_PRIORITY_PATTERN = re.compile(r'[高中低]|High|Middle|Low|Nice To Have')
+
+
+class StreamingCaseParser:
+    """增量切分流式响应中的测试用例块
+
+    每次feed()传入新到达的文本片段，返回其中已经闭合的用例块（遇到下一个
+    "### 测试用例N："标题即视为上一块闭合），close()返回最后一块。返回的块不含
+    标题前缀，可直接交给parse_case_block()解析。
+    解析器只保留当前未闭合的块和不完整的末行，不保存完整响应。
+    """
+
+    def __init__(self):
+        self._pending = ""   # 尚未遇到换行的末行
+        self._block = None   # 当前块的行列表，None表示还未遇到第一个标题
+        self.emitted = 0
+
+    def feed(self, text):
+        """输入文本片段，返回本次闭合的用例块列表"""
+        if not text:
+            return []
+        self._pending += text
+        *lines, self._pending = self._pending.split("\n")
+        closed = []
+        for line in lines:
+            block = self._consume_line(line)
+            if block is not None:
+                closed.append(block)
+        return closed
+
+    def close(self):
+        """输入结束，返回剩余的最后一个用例块（如有）"""
+        closed = []
+        if self._pending:
+            block = self._consume_line(self._pending)
+            self._pending = ""
+            if block is not None:
+                closed.append(block)
+        block = self._finish_block()
+        if block is not None:
+            closed.append(block)
+        return closed
+
+    def _consume_line(self, line):
+        header = CASE_HEADER_PATTERN.match(line) if "测试用例" in line else None
+        if header:
+            block = self._finish_block()
+            self._block = [line[header.end():]]
+            return block
+        if self._block is not None:
+            self._block.append(line)
+        # 第一个标题之前的对话式开头直接丢弃
+        return None
+
+    def _finish_block(self):
+        if self._block is None:
+            return None
+        block = "\n".join(self._block)
+        self._block = None
+        if not block.strip():
+            return None
+        self.emitted += 1
+        return block
+
+
+def _iter_case_headers(text):
+    """按顺序产出text中用例标题行的匹配，结果与CASE_HEADER_PATTERN.finditer(text)相同
+
+    str.find跳到含"测试用例"的行，只在这些行的行首尝试匹配，不必在每个字符位置尝试。
+    """
+    position = text.find("测试用例")
+    while position >= 0:
+        header = CASE_HEADER_PATTERN.match(text, text.rfind("\n", 0, position) + 1)
+        if header:
+            yield header
+        line_end = text.find("\n", position)
+        if line_end < 0:
+            return
+        position = text.find("测试用例", line_end)
+
+
+def split_case_blocks(text):
+    """把完整回复切分为用例块，结果与StreamingCaseParser逐段输入相同
+
+    只在含"测试用例"的行上匹配标题行，第一个用例标题之前的内容丢弃。
+    """
+    if not text:
+        return []
+    headers = list(_iter_case_headers(text))
+    blocks = []
+    for header, following in zip(headers, headers[1:] + [None]):
+        if following is None:
+            block = text[header.end():]
+            if block.endswith("\n"):
+                block = block[:-1]
+        else:
+            # 下一个标题之前的换行不属于本块
+            block = text[header.end():following.start() - 1]
+        if block.strip():
+            blocks.append(block)
+    return blocks
+
+
+def split_steps(text):
+    """把测试步骤文本按编号切分为步骤列表
+
+    编号须连续递增（1. 2. 3.），因此步骤内容中的"1.5元"、"第2.步"等不会被误切。
+    第一个编号之前的文本丢弃。
+    """
+    # split结果为[编号前文本, 编号, 分隔符, 内容, 编号, 分隔符, 内容, ...]
+    parts = _STEP_PATTERN.split(text)
+    numbers = list(map(int, parts[1::3]))
+    if not numbers:
+        return []
+    if numbers == list(range(numbers[0], numbers[0] + len(numbers))):
+        # 常见情况：编号全部连续，每段内容即一步
+        return [step for step in map(str.strip, parts[3::3]) if step]
+
+    steps = []
+    expected = None
+    for i in range(1, len(parts), 3):
+        number = int(parts[i])
+        if expected is None or number == expected:
+            steps.append([parts[i + 2]])
+            expected = number + 1
+        else:
+            # 不连续的编号属于上一步的内容
+            steps[-1] += parts[i:i + 3]
+    steps = ["".join(pieces).strip() for pieces in steps]
+    return [step for step in steps if step]
+
+
+def _find_header(text, name, pattern):
+    """返回字段标题pattern在text中的第一个匹配
+
+    按字段名查找而不是按"**"开头查找：回复中"**"很常见，字段名中的汉字则很少出现，str.find能快速跳过。
+    """
+    position = text.find(name, 2)
+    while position >= 0:
+        match = pattern.match(text, position - 2)
+        if match:
+            return match
+        position = text.find(name, position + 1)
+    return None
+
+
+def _locate_fields(block):
+    """逐个字段定位第一次出现的标题及其后的下一个字段标题，不切分整个块，返回(字段内容, 标题)
+
+    字段标题重复了成千上万次的块也只需几次扫描。
+    """
+    fields = {}
+    for name, pattern in _FIELD_HEADERS:
+        header = _find_header(block, name, pattern)
+        if header:
+            following = _FIELD_PATTERN.search(block, header.end())
+            fields[name] = block[header.end():following.start() if following else len(block)]
+
+    # 标题为块的第一行（遇到字段标题提前结束）
+    title = block.partition("\n")[0]
+    first_field = _FIELD_PATTERN.search(title)
+    return fields, title[:first_field.start()] if first_field else title
+
+
+def parse_case_block(block):
+    """解析一个用例块，返回标题、优先级、前置条件、步骤列表和预期结果
+
+    字段内容为该字段标题到下一个字段标题（或"###"）之间的文本；同一字段出现多次时取第一次。
+    未找到的字段为空字符串，未识别的优先级为None。
+    """
+    # 常见情况：块中只有几个字段标题，一次split即可；
+    # split结果为[标题部分, 字段名, 内容, 字段名, 内容, ...]，"###"对应的字段名为None
+    parts = _FIELD_PATTERN.split(block, _MAX_FIELD_SPLITS)
+    if len(parts) <= 2 * _MAX_FIELD_SPLITS:
+        # 倒序写入，同一字段出现多次时保留第一次
+        fields = dict(zip(parts[-2:0:-2], parts[-1:0:-2]))
+        title = parts[0].partition("\n")[0]
+    else:
+        fields, title = _locate_fields(block)
+    priority = _PRIORITY_PATTERN.match(fields.get("优先级", "").strip())
+
+    return {
+        "title": title.strip().strip("*").strip(),
+        "priority": priority.group(0) if priority else None,
+        "precondition": fields.get("前置条件", "").strip(),
+        "steps": split_steps(fields.get("测试步骤", "")),
+        "expected": fields.get("预期结果", "").strip()
+    }
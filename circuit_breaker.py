@@ -0,0 +1,95 @@
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# 熔断器默认参数，可在模型配置的"circuit_breaker"字段中覆盖
+DEFAULT_BREAKER_OPTIONS = {
+    "window": 20,             # 统计最近多少次请求
+    "min_calls": 5,           # 至少多少次请求后才计算错误率
+    "failure_rate": 0.5,      # 错误率（含慢请求）达到该值时熔断
+    "slow_call_seconds": 30,  # 耗时超过该值的成功请求也计为异常
+    "open_seconds": 30        # 熔断后多久进入半开状态试探
+}
+
+
+class CircuitBreaker:
+    """单个模型的熔断器（关闭/打开/半开）
+
+    关闭：正常放行，按最近window次请求的错误率与慢请求率判断是否熔断；
+    打开：直接拒绝请求，open_seconds秒后进入半开；
+    半开：只放行一个试探请求，成功则恢复关闭，失败则重新打开。
+    """
+
+    def __init__(self, **options):
+        options = dict(DEFAULT_BREAKER_OPTIONS, **options)
+        self.window = options["window"]
+        self.min_calls = options["min_calls"]
+        self.failure_rate = options["failure_rate"]
+        self.slow_call_seconds = options["slow_call_seconds"]
+        self.open_seconds = options["open_seconds"]
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=self.window)  # True表示失败或慢请求
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._probing = False
+
+    def allow(self):
+        """是否允许发出请求"""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self._probing = False
+        if self.state == HALF_OPEN:
+            if self._probing:
+                self.rejected += 1
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self, seconds):
+        if self.state == HALF_OPEN:
+            self._close()
+            return
+        self._record(seconds > self.slow_call_seconds)
+
+    def record_failure(self):
+        if self.state == HALF_OPEN:
+            self._open()
+            return
+        self._record(True)
+
+    def release(self):
+        """放弃已放行的请求（如被取消），不计入统计"""
+        self._probing = False
+
+    def _record(self, bad):
+        self.outcomes.append(bad)
+        if self.state == CLOSED and len(self.outcomes) >= self.min_calls:
+            if sum(self.outcomes) / len(self.outcomes) >= self.failure_rate:
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        self._probing = False
+
+    def _close(self):
+        self.state = CLOSED
+        self.outcomes.clear()
+        self._probing = False
+
+    def to_dict(self):
+        return {
+            "state": self.state,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "recent_failures": sum(self.outcomes),
+            "recent_calls": len(self.outcomes)
+        }
@@ -1,12 +1,20 @@
 import time
 import os
-import re
-import json
 import pandas as pd
-import requests
 import argparse
 from openpyxl.styles import Alignment, Font, PatternFill, Border, Side
 from dotenv import load_dotenv
+from ai_client import AIClient, run_sync
+from case_generation import CaseGenerator
+from metrics import METRICS
+from structured_log import LOG_FORMATS, LOG_LEVELS, configure_logging, get_logger, set_run_id
+from json_output import OUTPUT_FORMATS, report_parse_stats
+from requirement_stream import stream_excel_requirements
+from response_cache import ResponseCache, CACHE_MODES, DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_MB
+from run_journal import RunJournal, new_run_id, DEFAULT_JOURNAL_DIR
+from usage_ledger import UsageLedger, DEFAULT_LEDGER_PATH
+from incremental import (find_latest_manifest, load_manifest, write_manifest, manifest_path,
+                         diff_requirements, merge_cases)
 
 # 加载环境变量
 load_dotenv()
@@ -25,12 +33,15 @@ QIANWEN_API_KEY = os.getenv("QIANWEN_API_KEY")
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
 # 通用模型配置
 MODEL_CONFIGS = {
     "default": {
         "api_key_env": "AI_API_KEY",
         "endpoint": API_ENDPOINT,
+        "stream_format": "openai",  # 流式响应(SSE)格式
+        "json_format": "json_object",  # JSON输出方式，见ai_client.JSON_FORMATS
         "headers": lambda key: {
             "Authorization": f"Bearer {key}",
             "Content-Type": "application/json; charset=utf-8"
@@ -49,6 +60,8 @@ if QIANWEN_API_KEY:
     MODEL_CONFIGS["qianwen"] = {
         "api_key_env": "QIANWEN_API_KEY",
         "endpoint": "https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation",
+        "stream_format": "dashscope",  # 流式响应(SSE)格式
+        "json_format": "dashscope",  # JSON输出方式，见ai_client.JSON_FORMATS
         "headers": lambda key: {
             "Authorization": f"Bearer {key}",
             "Content-Type": "application/json; charset=utf-8"
@@ -71,6 +84,8 @@ if GEMINI_API_KEY:
     MODEL_CONFIGS["mygemini"] = {
         "api_key_env": "GEMINI_API_KEY",
         "endpoint": os.getenv("GEMINI_BASE_URL"),  # 从环境变量获取GEMINI_BASE_URL
+        "stream_format": "openai",  # 流式响应(SSE)格式
+        "json_format": "json_schema",  # JSON输出方式，见ai_client.JSON_FORMATS
         "headers": lambda key: {
             "Authorization": f"Bearer {key}",
             "Content-Type": "application/json"
@@ -88,6 +103,7 @@ if OPENROUTER_API_KEY:
     MODEL_CONFIGS["myopenrouter"] = {
         "api_key_env": "OPENROUTER_API_KEY",
         "endpoint": os.getenv("OPENROUTER_BASE_URL"), 
+        "stream_format": "openai",  # 流式响应(SSE)格式
         "headers": lambda key: {
             "Authorization": f"Bearer {key}",
             "Content-Type": "application/json"
@@ -103,6 +119,14 @@ if OPENROUTER_API_KEY:
 # 修改默认模型
 DEFAULT_MODEL = "default"
 
+# 异步调用引擎，复用上面的模型配置
+AI_CLIENT = AIClient(MODEL_CONFIGS, DEFAULT_MODEL)
+
+# 各模型回复的解析统计
+PARSE_STATS = {}
+
+logger = get_logger("generate_testcase")
+
 # 默认配置
 DEFAULT_CONFIG = {
     "需求分类": "测试需求",
@@ -110,17 +134,8 @@ DEFAULT_CONFIG = {
     "处理人": ""
 }
 
-# 优先级映射
-PRIORITY_MAP = {
-    "高": "High",
-    "中": "Middle",
-    "低": "Low",
-    "可选": "Nice To Have",
-    "high": "High",
-    "middle": "Middle",
-    "low": "Low",
-    "nice to have": "Nice To Have"
-}
+# 测试用例生成与解析流程，与AITestSuiteUtils共用同一实现
+GENERATOR = CaseGenerator(AI_CLIENT, DEFAULT_CONFIG, PARSE_STATS)
 
 def parse_arguments():
     """解析命令行参数"""
@@ -129,8 +144,33 @@ def parse_arguments():
     parser.add_argument('--model', type=str, default=DEFAULT_MODEL, help='使用的AI模型')
     parser.add_argument('--output-dir', type=str, default='./测试用例', help='测试用例输出目录')
     parser.add_argument('--report-dir', type=str, default='./测试报告', help='测试报告输出目录')
+    parser.add_argument('--concurrency', type=int, default=1, help='并发请求模型的需求数（默认：1，即串行）')
+    parser.add_argument('--pack-size', type=int, default=1, help='每个请求打包的需求条数（默认：1，不打包；0表示不限条数）')
+    parser.add_argument('--pack-tokens', type=int, default=0, help='打包请求中需求部分的tokens预算（默认：0，不限制）')
+    parser.add_argument('--stream', action='store_true', help='使用流式响应，每个用例生成完毕立即解析输出')
+    parser.add_argument('--output-format', type=str, default='markdown', choices=OUTPUT_FORMATS,
+                        help='要求模型输出的格式（默认：markdown）；json仅对配置了json_format的模型生效')
+    parser.add_argument('--hedge-model', type=str, help='对冲备用模型：请求超过主模型p95耗时仍未返回时向该模型发送相同请求')
+    parser.add_argument('--failover-models', type=str, help='故障切换模型列表（逗号分隔，按顺序尝试）：主模型失败或熔断时切换')
+    parser.add_argument('--cache-mode', type=str, default='off', choices=CACHE_MODES, help='响应缓存模式（默认：off）')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR, help='响应缓存目录')
+    parser.add_argument('--cache-max-mb', type=float, default=DEFAULT_CACHE_MAX_MB, help='响应缓存容量上限（MB）')
+    parser.add_argument('--dedup-threshold', type=float, default=0, help='近似重复需求的相似度阈值（0~1，默认：0不去重，建议0.9）')
+    parser.add_argument('--incremental', action='store_true', help='增量模式：对比上次输出的清单，只为新增或修改的需求生成测试用例')
+    parser.add_argument('--resume', type=str, metavar='RUN_ID', help='从指定运行ID的日志续跑，跳过已完成的需求')
+    parser.add_argument('--journal-dir', type=str, default=DEFAULT_JOURNAL_DIR, help='运行日志目录')
+    parser.add_argument('--metrics-textfile', type=str, help='运行结束后把指标写入该Prometheus textfile（供node_exporter采集）')
+    parser.add_argument('--metrics-json', type=str, help='运行结束后把指标摘要写入该JSON文件')
+    parser.add_argument('--ledger', type=str, default=DEFAULT_LEDGER_PATH,
+                        help=f'模型调用台账（SQLite）路径，记录每次调用的tokens、耗时和费用（默认：{DEFAULT_LEDGER_PATH}）')
+    parser.add_argument('--no-ledger', action='store_true', help='不记录模型调用台账')
+    parser.add_argument('--log-level', type=str.upper, choices=LOG_LEVELS,
+                        help='日志级别（默认：环境变量AI_LOG_LEVEL或INFO；DEBUG输出每次API调用）')
+    parser.add_argument('--log-format', type=str, choices=LOG_FORMATS,
+                        help='日志格式（默认：环境变量AI_LOG_FORMAT或json，每行一条JSON）')
     return parser.parse_args()
 
+@METRICS.timer("excel_read")
 def read_excel_requirements(file_path):
     """读取Excel需求文档"""
     try:
@@ -141,7 +181,7 @@ def read_excel_requirements(file_path):
         missing_columns = [col for col in required_columns if col not in df.columns]
         
         if missing_columns:
-            print(f"错误：Excel文件缺少必要的列: {', '.join(missing_columns)}")
+            logger.error("Excel文件缺少必要的列: %s", ', '.join(missing_columns))
             return None
         
         # 如果没有需求ID列，添加自动生成的ID
@@ -172,99 +212,32 @@ def read_excel_requirements(file_path):
         requirements = df.to_dict('records')
         return requirements
     except Exception as e:
-        print(f"读取Excel文件失败: {str(e)}")
+        logger.error("读取Excel文件失败: %s", e)
         return None
 
+def iter_excel_requirements(file_path, collect=None):
+    """以只读模式逐行读取Excel需求文档，逐条产出与read_excel_requirements格式相同的需求
+
+    适用于很大的需求表：不整表载入内存，可直接传给generate_test_cases边读边生成；
+    collect不为None时读到的需求同时追加到该列表。
+    """
+    return stream_excel_requirements(file_path, DEFAULT_CONFIG, collect)
+
 def call_ai_model(model_name, messages, max_retries=3, temperature=0.3):
-    """调用AI模型生成内容"""
-    if model_name not in MODEL_CONFIGS:
-        print(f"错误：不支持的模型 '{model_name}'，将使用默认模型 '{DEFAULT_MODEL}'")
-        model_name = DEFAULT_MODEL
-    
-    model_config = MODEL_CONFIGS[model_name]
-    api_key = os.getenv(model_config["api_key_env"])
-    
-    if not api_key:
-        print(f"错误：未设置 {model_config['api_key_env']} 环境变量")
-        return None
-    
-    headers = model_config["headers"](api_key)
-    endpoint = model_config["endpoint"]
-    
-    if not endpoint:
-        print(f"错误：未设置API端点，请在.env文件中配置AI_BASE_URL或AI_API_ENDPOINT")
-        return None
-    
-    total_tokens = 0
-    
-    for attempt in range(max_retries):
-        try:
-            payload = model_config["payload"](messages, temperature)
-            
-            # 将payload转换为JSON字符串，确保正确处理中文
-            json_data_str = json.dumps(payload, ensure_ascii=False)
-            
-            # 准备请求参数
-            request_kwargs = {
-                "headers": headers,
-                "data": json_data_str.encode('utf-8'),
-                "timeout": 60
-            }
-            
-            # 如果有URL参数，添加到请求中
-            if "url_params" in model_config:
-                url_params = model_config["url_params"](api_key)
-                endpoint = f"{endpoint}?{'&'.join([f'{k}={v}' for k, v in url_params.items()])}"
-            
-            # 发送请求
-            print(f"正在调用API: {endpoint}")
-            response = requests.post(endpoint, **request_kwargs)
-            
-            # 检查响应状态
-            response.raise_for_status()
-            
-            # 解析响应
-            json_data = response.json()
-            
-            # 使用模型特定的解析器提取内容
-            content = model_config["response_parser"](json_data)
-            
-            if not content:
-                print(f"警告：模型 {model_name} 返回的内容为空")
-                
-            if "usage" in json_data and "total_tokens" in json_data["usage"]:
-                tokens = json_data["usage"]["total_tokens"]
-                total_tokens += tokens
-                print(f"本次请求消耗 {tokens} tokens，累计 {total_tokens} tokens")
-            
-            return content
-        except requests.exceptions.RequestException as e:
-            print(f"请求异常 ({attempt + 1}/{max_retries}): {str(e)}")
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt  # 指数退避
-                print(f"等待 {wait_time} 秒后重试...")
-                time.sleep(wait_time)
-            else:
-                print("达到最大重试次数，放弃请求")
-                return None
-        except Exception as e:
-            print(f"未知错误 ({attempt + 1}/{max_retries}): {str(e)}")
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                print(f"等待 {wait_time} 秒后重试...")
-                time.sleep(wait_time)
-            else:
-                print("达到最大重试次数，放弃请求")
-                return None
-    
-    return None
+    """调用AI模型生成内容（acall_ai_model的同步封装）"""
+    return run_sync(acall_ai_model(model_name, messages, max_retries, temperature))
+
+async def acall_ai_model(model_name, messages, max_retries=3, temperature=0.3, json_schema=None):
+    """异步调用AI模型生成内容，json_schema不为None时要求模型按该结构输出JSON"""
+    return await AI_CLIENT.acall(model_name, messages, max_retries=max_retries, temperature=temperature,
+                                 json_schema=json_schema)
 
 def call_qianwen_model(prompt, text, max_retries=4):
-    """调用通义千问模型"""
-    headers = {
-        "Authorization": f"Bearer {QIANWEN_API_KEY}",
-        "Content-Type": "application/json; charset=utf-8"
-    }
+    """调用通义千问模型（acall_qianwen_model的同步封装）"""
+    return run_sync(acall_qianwen_model(prompt, text, max_retries))
+
+async def acall_qianwen_model(prompt, text, max_retries=4):
+    """异步调用通义千问模型"""
     system_prompt = """请严格按以下格式生成测试用例：
 ### 测试用例[编号]：[测试目标]
 **优先级**：[高/中/低]
@@ -273,224 +246,51 @@ def call_qianwen_model(prompt, text, max_retries=4):
 2. [步骤描述]
 **预期结果**：[预期结果描述]"""
 
-    for attempt in range(max_retries):
-        try:
-            request_data = {
-                "model": "qwen-max",
-                "input": {
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": f"{prompt}\n相关文本：{text}"}
-                    ]
-                },
-                "parameters": {
-                    "temperature": 0.3,
-                    "result_format": "message"
+    content = await AI_CLIENT.acall(
+        "qianwen",
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"{prompt}\n相关文本：{text}"}
+        ],
+        max_retries=max_retries,
+        temperature=0.3
+    )
+    
+    if content is None:
+        logger.error("API请求失败超过最大重试次数")
+        return None
+    
+    return {
+        "choices": [
+            {
+                "message": {
+                    "content": content
                 }
             }
-            
-            # 使用json.dumps确保正确编码
-            json_data_str = json.dumps(request_data, ensure_ascii=False)
-            
-            # 使用data参数而不是json参数，并明确指定编码
-            response = requests.post(
-                "https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation",
-                headers=headers,
-                data=json_data_str.encode('utf-8'),
-                timeout=50
-            )
-            
-            response.raise_for_status()
-            json_data = response.json()
-            
-            # 通义千问API返回格式处理
-            content = ""
-            if "output" in json_data and "message" in json_data["output"]:
-                content = json_data["output"]["message"]["content"]
-            
-            return {
-                "choices": [
-                    {
-                        "message": {
-                            "content": content
-                        }
-                    }
-                ]
-            }
-        except Exception as e:
-            print(f"API请求异常（{str(e)}），重试中 ({attempt + 1}/{max_retries})...")
-            time.sleep(5)
-    
-    print("API请求失败超过最大重试次数")
-    return None
+        ]
+    }
 
-def generate_test_cases(requirements, model_name):
-    """根据需求生成测试用例"""
-    all_test_cases = []
-    system_prompt = "你是一位专业的测试工程师，擅长编写详细、全面的测试用例。"
-    
-    # 对于DeepSeek模型，可能需要调整提示
-    if model_name.startswith("deepseek"):
-        system_prompt = "你是一位专业的测试工程师，擅长编写详细、全面的测试用例。请严格按照指定格式输出。"
-    
-    for req in requirements:
-        req_id = req["需求ID"]
-        req_title = req["标题"]
-        req_desc = req["详细描述"]
-        priority = req["优先级"]
-        parent_req = req.get("父需求", "")
-        req_category = req.get("需求分类", DEFAULT_CONFIG["需求分类"])
-        iteration = req.get("迭代", DEFAULT_CONFIG["迭代"])
-        assignee = req.get("处理人", DEFAULT_CONFIG["处理人"])
-        
-        print(f"\n处理需求 {req_id}: {req_title[:50]}...")
-        
-        # 标准化优先级
-        std_priority = PRIORITY_MAP.get(priority.lower(), "Middle")
-        
-        # 构建提示信息
-        prompt = f"""
-请根据以下需求生成详细的测试用例：
-
-需求ID: {req_id}
-需求标题: {req_title}
-需求描述: {req_desc}
-优先级: {priority}
-需求分类: {req_category}
-迭代: {iteration}
-
-请生成至少3个测试用例，每个测试用例包括：
-1. 测试目标
-2. 前置条件
-3. 详细的测试步骤
-4. 预期结果
-5. 优先级（高/中/低）
-
-请严格按照以下格式输出：
-
-### 测试用例1：[测试目标]
-**优先级**：[高/中/低]
-**前置条件**：[前置条件描述]
-**测试步骤**：
-1. [步骤1]
-2. [步骤2]
-...
-**预期结果**：[预期结果描述]
-
-### 测试用例2：[测试目标]
-...
-"""
-        
-        # 调用AI模型
-        if model_name == "gemini-pro":
-            # Gemini不支持system角色，将system提示合并到user提示中
-            system_prompt = "你是一位专业的测试工程师，擅长编写详细、全面的测试用例。"
-            user_prompt = f"{system_prompt}\n\n{prompt}"
-            
-            response = call_ai_model(
-                model_name,
-                [
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7
-            )
-        else:
-            # 其他模型使用标准格式
-            response = call_ai_model(
-                model_name,
-                [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7
-            )
-        
-        if not response:
-            print(f"警告：需求 {req_id} 未能生成测试用例")
-            continue
-            
-        # 解析测试用例
-        parsed_cases = parse_test_cases(response, req_id,req_title, parent_req, std_priority)
-        all_test_cases.extend(parsed_cases)
-        
-        print(f"为需求 {req_id} 生成了 {len(parsed_cases)} 条测试用例")
-    
-    return all_test_cases
+def generate_test_cases(requirements, model_name, **options):
+    """根据需求生成测试用例（agenerate_test_cases的同步封装，参数相同）"""
+    return run_sync(agenerate_test_cases(requirements, model_name, **options))
 
-def parse_test_cases(response, req_id,req_title, parent_req, std_priority):
-    """解析AI生成的测试用例文本"""
-    if not response:
-        return []
+async def agenerate_test_cases(requirements, model_name, **options):
+    """异步根据需求生成测试用例，参数见case_generation.CaseGenerator.agenerate_test_cases"""
+    return await GENERATOR.agenerate_test_cases(requirements, model_name, **options)
 
-    # 预处理：去除AI对话式的开头
-    response = re.sub(r'^.*?(?:### 测试用例|测试用例1|测试用例：)', '', response, flags=re.DOTALL).strip()
+def get_parse_stats(model_name):
+    """获取模型回复的解析统计"""
+    return GENERATOR.get_parse_stats(model_name)
 
-    test_cases = []
-    case_blocks = re.split(r'###\s+测试用例\d+[:：]', response)
-    
-    # 移除第一个空块（如果存在）
-    if case_blocks and not case_blocks[0].strip():
-        case_blocks = case_blocks[1:]
-    
-    for i, block in enumerate(case_blocks, 1):
-        if not block.strip():
-            continue
-        
-        try:
-            # 提取测试目标
-            title_match = re.match(r'(.+?)(?:\*\*优先级|\n)', block)
-            title = title_match.group(1).strip() if title_match else f"测试用例{i}"
-            
-            # 提取优先级
-            priority_match = re.search(r'\*\*优先级\*\*[:：]\s*([高中低]|High|Middle|Low|Nice To Have)', block)
-            raw_priority = priority_match.group(1).strip() if priority_match else "中"
-            priority = PRIORITY_MAP.get(raw_priority.lower(), std_priority)
-            
-            # 提取前置条件
-            precondition_match = re.search(r'\*\*前置条件\*\*[:：]\s*(.+?)(?=\*\*|\Z)', block, re.DOTALL)
-            precondition = precondition_match.group(1).strip() if precondition_match else ""
-            
-            # 提取测试步骤
-            steps_match = re.search(r'\*\*测试步骤\*\*[:：]\s*(.+?)(?=\*\*预期结果|\Z)', block, re.DOTALL)
-            steps_text = steps_match.group(1).strip() if steps_match else ""
-            
-            # 格式化步骤
-            steps = []
-            for step in re.findall(r'\d+\.\s*(.+?)(?=\d+\.|$)', steps_text, re.DOTALL):
-                steps.append(step.strip())
-            
-            formatted_steps = "\n".join([f"{j+1}. {step}" for j, step in enumerate(steps)])
-            
-            # 提取预期结果
-            expected_match = re.search(r'\*\*预期结果\*\*[:：]\s*(.+?)(?=###|\Z)', block, re.DOTALL)
-            expected_result = expected_match.group(1).strip() if expected_match else ""
-            
-            # 创建测试用例
-            case_id = f"TC-{req_id}-{i:02d}"
-            test_case = {
-                "用例编号": case_id,
-                "需求ID": req_id,
-                "父需求": parent_req,
-                "需求分类": DEFAULT_CONFIG["需求分类"],
-                "标题": f"测试-{req_title}-{title}",
-                "详细描述": f"**前置条件**：\n{precondition}\n\n**测试步骤**：\n{formatted_steps}\n\n**预期结果**：\n{expected_result}",
-                "测试步骤": formatted_steps,
-                "预期结果": expected_result,
-                "优先级": priority,
-                "迭代": DEFAULT_CONFIG["迭代"],
-                "处理人": DEFAULT_CONFIG["处理人"]
-            }
-            
-            test_cases.append(test_case)
-        except Exception as e:
-            print(f"解析测试用例 {i} 时出错: {str(e)}")
-    
-    return test_cases
+def parse_test_cases(response, req_id, req_title, parent_req, std_priority):
+    """解析AI生成的测试用例文本"""
+    return GENERATOR.parse_test_cases(response, req_id, req_title, parent_req, std_priority)
 
+@METRICS.timer("export")
 def export_to_excel(test_cases, output_file):
     """导出测试用例到Excel"""
     if not test_cases:
-        print("错误：没有测试用例可导出")
+        logger.error("没有测试用例可导出")
         return False
     
     try:
@@ -554,16 +354,17 @@ def export_to_excel(test_cases, output_file):
                     cell.alignment = Alignment(wrap_text=True, vertical='top')
                     cell.border = border
         
-        print(f"成功导出 {len(test_cases)} 条测试用例到 {output_file}")
+        logger.info("成功导出 %d 条测试用例到 %s", len(test_cases), output_file)
         return True
     except Exception as e:
-        print(f"导出Excel失败: {str(e)}")
+        logger.error("导出Excel失败: %s", e)
         return False
 
+@METRICS.timer("report")
 def generate_test_report(test_cases, output_file):
     """生成测试报告"""
     if not test_cases:
-        print("错误：没有测试用例可生成报告")
+        logger.error("没有测试用例可生成报告")
         return False
     
     try:
@@ -721,10 +522,10 @@ def generate_test_report(test_cases, output_file):
                     cell.alignment = Alignment(wrap_text=True, vertical='top')
                     cell.border = border
         
-        print(f"成功生成测试报告: {output_file}")
+        logger.info("成功生成测试报告: %s", output_file)
         return True
     except Exception as e:
-        print(f"生成测试报告失败: {str(e)}")
+        logger.error("生成测试报告失败: %s", e)
         return False
 
 def get_available_models():
@@ -745,7 +546,7 @@ def generate_sample_requirements():
         from generate_sample_requirements import generate_sample_requirements as generate_sample
         return generate_sample()
     except ImportError as e:
-        print(f"无法导入generate_sample_requirements模块: {str(e)}")
+        logger.warning("无法导入generate_sample_requirements模块: %s", e)
         # 如果导入失败，使用内置的示例生成函数
         try:
             # 示例需求数据
@@ -772,34 +573,54 @@ def generate_sample_requirements():
             output_file = "./需求文档/sample_requirements.xlsx"
             df.to_excel(output_file, index=False)
             
-            print(f"已生成示例需求文件: {output_file}")
+            logger.info("已生成示例需求文件: %s", output_file)
             return output_file
         except Exception as e:
-            print(f"生成示例需求文件失败: {str(e)}")
+            logger.error("生成示例需求文件失败: %s", e)
             return None
     except Exception as e:
-        print(f"生成示例需求文件失败: {str(e)}")
+        logger.error("生成示例需求文件失败: %s", e)
         return None
 
+def export_metrics(args, run_started, requirements, test_cases, **meta):
+    """记录本次运行的吞吐，并按命令行参数导出Prometheus textfile和JSON摘要"""
+    METRICS.record_run(run_started, len(requirements), len(test_cases), model=meta.get("model", ""))
+    if args.metrics_textfile:
+        METRICS.write_textfile(args.metrics_textfile)
+        logger.info("指标已写入: %s", args.metrics_textfile)
+    if args.metrics_json:
+        METRICS.write_json(args.metrics_json, **meta)
+        logger.info("运行摘要已写入: %s", args.metrics_json)
+
+def print_streamed_case(case):
+    """流式模式下每解析出一个用例立即输出"""
+    print(f"  + {case['用例编号']} {case['标题']}")
+
 def main():
     """主函数"""
     print("=== AITestSuite - 智能测试用例生成器 ===")
     
+    # 解析命令行参数
+    args = parse_arguments()
+    run_started = time.perf_counter()
+    configure_logging(args.log_level, args.log_format)
+    
     # 检查API端点配置
     if not (AI_BASE_URL or AI_API_ENDPOINT):
-        print("错误：未配置API端点，请在.env文件中设置AI_BASE_URL或AI_API_ENDPOINT")
+        logger.error("未配置API端点，请在.env文件中设置AI_BASE_URL或AI_API_ENDPOINT")
         return
     
-    # 解析命令行参数
-    args = parse_arguments()
-    
     # 检查可用模型
     available_models = get_available_models()
     if not available_models:
-        print("错误：未找到任何可用的AI模型API密钥，请在.env文件中配置")
+        logger.error("未找到任何可用的AI模型API密钥，请在.env文件中配置")
         return
     
-    print(f"可用模型: {', '.join(available_models)}")
+    logger.info("可用模型: %s", ', '.join(available_models))
+    
+    # 启用响应缓存
+    if args.cache_mode != "off":
+        AI_CLIENT.cache = ResponseCache(args.cache_dir, args.cache_max_mb, args.cache_mode)
     
     # 获取输入文件
     input_file = args.input
@@ -810,12 +631,12 @@ def main():
     
     # 如果文件不存在且是默认文件，尝试生成示例文件
     if not os.path.exists(input_file) and input_file == "需求文档/sample_requirements.xlsx":
-        print(f"文件 {input_file} 不存在，将生成示例需求文件")
+        logger.warning("文件 %s 不存在，将生成示例需求文件", input_file)
         input_file = generate_sample_requirements()
         if not input_file:
             return
     elif not os.path.exists(input_file):
-        print(f"错误：文件 {input_file} 不存在")
+        logger.error("文件 %s 不存在", input_file)
         return
     
     # 选择模型
@@ -826,52 +647,124 @@ def main():
             model_name = DEFAULT_MODEL
     
     if model_name not in MODEL_CONFIGS:
-        print(f"错误：不支持的模型 '{model_name}'，将使用默认模型 '{DEFAULT_MODEL}'")
+        logger.error("不支持的模型 '%s'，将使用默认模型 '%s'", model_name, DEFAULT_MODEL)
         model_name = DEFAULT_MODEL
     
     if model_name not in available_models:
-        print(f"错误：模型 '{model_name}' 的API密钥未配置")
+        logger.error("模型 '%s' 的API密钥未配置", model_name)
         return
     
+    # 启用对冲请求
+    if args.hedge_model:
+        if args.hedge_model not in available_models:
+            logger.error("对冲模型 '%s' 的API密钥未配置", args.hedge_model)
+            return
+        AI_CLIENT.hedge_to[model_name] = args.hedge_model
+    
+    # 配置故障切换链，跳过未配置API密钥的模型
+    if args.failover_models:
+        for name in [m.strip() for m in args.failover_models.split(",") if m.strip()]:
+            if name in available_models:
+                AI_CLIENT.failover_models.append(name)
+            else:
+                logger.warning("故障切换模型 '%s' 不可用，已忽略", name)
+    
     # 设置输出目录
     test_cases_dir = args.output_dir
     test_report_dir = args.report_dir
     os.makedirs(test_cases_dir, exist_ok=True)
     os.makedirs(test_report_dir, exist_ok=True)
     
-    # 生成时间戳
-    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    # 打开运行日志，续跑时沿用原运行ID作为输出文件时间戳
+    if args.resume and not os.path.exists(os.path.join(args.journal_dir, f"{args.resume}.jsonl")):
+        logger.error("未找到运行 %s 的日志", args.resume)
+        return
+    timestamp = args.resume or new_run_id()
+    set_run_id(timestamp)
+    journal = RunJournal(timestamp, args.journal_dir)
+    if journal.meta and (journal.meta.get("input") != input_file or journal.meta.get("model") != model_name):
+        logger.warning("续跑参数与原运行不一致（原输入文件 %s，原模型 %s）", journal.meta.get('input'), journal.meta.get('model'))
+    journal.start(input=input_file, model=model_name)
+    if not args.no_ledger:
+        AI_CLIENT.ledger = UsageLedger(args.ledger, input_file=input_file)
+    print(f"运行ID: {timestamp}（中断后可使用 --resume {timestamp} 继续）")
     
     # 设置输出文件
     test_cases_file = f"{test_cases_dir}/TestCases_{model_name}_{timestamp}.xlsx"
     test_report_file = f"{test_report_dir}/TestReport_{model_name}_{timestamp}.xlsx"
     
-    # 读取需求
-    print(f"\n读取需求文件: {input_file}")
-    requirements = read_excel_requirements(input_file)
+    # 读取需求：默认以只读模式逐行读取，边读边生成；增量模式需要完整需求列表与清单对比，
+    # 两种模式使用同一读取方式，保证空单元格的取值与清单中的指纹一致
+    logger.info("读取需求文件: %s", input_file)
+    reused = {}
+    if not args.incremental:
+        requirements = []
+        to_generate = iter_excel_requirements(input_file, collect=requirements)
+    else:
+        requirements = list(iter_excel_requirements(input_file))
+        if not requirements:
+            logger.error("无法读取需求数据")
+            return
+        logger.info("成功读取 %d 条需求", len(requirements))
+        
+        # 增量模式：与同一模型上次输出的清单对比，只为新增或修改的需求调用模型
+        to_generate = requirements
+        previous = find_latest_manifest(f"{test_cases_dir}/TestCases_{model_name}_*.xlsx")
+        manifest = load_manifest(previous) if previous else None
+        if manifest:
+            to_generate, reused, deleted = diff_requirements(requirements, manifest)
+            logger.info("增量模式：对比 %s，新增或修改 %d 条，未改动 %d 条，已删除 %d 条",
+                        previous, len(to_generate), len(reused), len(deleted))
+        else:
+            logger.info("增量模式：未找到上次输出的清单，将为全部需求生成测试用例")
     
+    # 生成测试用例
+    logger.info("使用模型 %s 生成测试用例...", model_name)
+    generated_cases = generate_test_cases(to_generate, model_name, concurrency=args.concurrency,
+                                          pack_size=args.pack_size, pack_tokens=args.pack_tokens,
+                                          stream=args.stream, on_case=print_streamed_case if args.stream else None,
+                                          journal=journal, dedup_threshold=args.dedup_threshold,
+                                          output_format=args.output_format)
+    journal.close()
+    if AI_CLIENT.ledger:
+        AI_CLIENT.ledger.close()
+        logger.info("本次 %d 次模型调用已记入台账 %s", AI_CLIENT.ledger.recorded, args.ledger)
     if not requirements:
-        print("错误：无法读取需求数据")
+        logger.error("无法读取需求数据")
         return
-    
-    print(f"成功读取 {len(requirements)} 条需求")
-    
-    # 生成测试用例
-    print(f"\n使用模型 {model_name} 生成测试用例...")
-    all_test_cases = generate_test_cases(requirements, model_name)
+    if not args.incremental:
+        logger.info("成功读取 %d 条需求", len(requirements))
+    all_test_cases = merge_cases(requirements, generated_cases, reused) if reused else generated_cases
     
     # 检查是否生成了测试用例
     if not all_test_cases:
-        print("错误：未生成任何测试用例")
+        logger.error("未生成任何测试用例")
+        export_metrics(args, run_started, requirements, all_test_cases, run_id=timestamp, model=model_name,
+                       input=input_file)
         return
     
     # 导出测试用例
-    print(f"\n导出测试用例到: {test_cases_file}")
+    logger.info("导出测试用例到: %s", test_cases_file)
     if export_to_excel(all_test_cases, test_cases_file):
+        # 保存清单，供下次增量运行对比
+        write_manifest(manifest_path(test_cases_file), requirements, all_test_cases,
+                       input=input_file, model=model_name)
+        
         # 生成测试报告
-        print(f"\n生成测试报告: {test_report_file}")
+        logger.info("生成测试报告: %s", test_report_file)
         generate_test_report(all_test_cases, test_report_file)
     
+    # 连接池复用、对冲及缓存命中统计
+    AI_CLIENT.report_pool_stats()
+    AI_CLIENT.report_hedge_stats()
+    AI_CLIENT.report_breaker_states()
+    AI_CLIENT.report_token_stats()
+    report_parse_stats(PARSE_STATS)
+    if AI_CLIENT.cache:
+        AI_CLIENT.cache.report()
+    export_metrics(args, run_started, requirements, all_test_cases, run_id=timestamp, model=model_name,
+                   input=input_file)
+    
     print("\n处理完成！")
     print(f"- 测试用例文件: {test_cases_file}")
     print(f"- 测试报告文件: {test_report_file}")
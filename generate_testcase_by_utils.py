@@ -1,7 +1,21 @@
 from AITestUtils import AITestSuiteUtils
+from response_cache import ResponseCache, CACHE_MODES, DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_MB
+from run_journal import RunJournal, new_run_id, DEFAULT_JOURNAL_DIR
+from usage_ledger import UsageLedger, DEFAULT_LEDGER_PATH
+from incremental import load_manifest, write_manifest, manifest_path, diff_requirements, merge_cases
+from json_output import OUTPUT_FORMATS
+from metrics import METRICS
+from structured_log import LOG_FORMATS, LOG_LEVELS, configure_logging, get_logger, set_run_id
 import argparse
+import time
 import os
 
+logger = get_logger("generate_testcase_by_utils")
+
+def print_streamed_case(case):
+    """流式模式下每解析出一个用例立即输出"""
+    print(f"  + {case['用例编号']} {case['标题']}")
+
 def main():
     # 解析命令行参数
     parser = argparse.ArgumentParser(description='AI测试用例生成器')
@@ -13,47 +27,153 @@ def main():
                         help='测试用例输出目录（默认：./测试用例）')
     parser.add_argument('--report-dir', type=str, default="./测试报告", 
                         help='测试报告输出目录（默认：./测试报告）')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='并发请求模型的需求数（默认：1，即串行）')
+    parser.add_argument('--pack-size', type=int, default=1,
+                        help='每个请求打包的需求条数（默认：1，不打包；0表示不限条数）')
+    parser.add_argument('--pack-tokens', type=int, default=0,
+                        help='打包请求中需求部分的tokens预算（默认：0，不限制）')
+    parser.add_argument('--stream', action='store_true',
+                        help='使用流式响应，每个用例生成完毕立即解析输出')
+    parser.add_argument('--output-format', type=str, default="markdown", choices=OUTPUT_FORMATS,
+                        help='要求模型输出的格式（默认：markdown）；json仅对配置了json_format的模型生效')
+    parser.add_argument('--hedge-model', type=str,
+                        help='对冲备用模型：请求超过主模型p95耗时仍未返回时向该模型发送相同请求')
+    parser.add_argument('--failover-models', type=str,
+                        help='故障切换模型列表（逗号分隔，按顺序尝试）：主模型失败或熔断时切换')
+    parser.add_argument('--cache-mode', type=str, default="off", choices=CACHE_MODES,
+                        help='响应缓存模式（默认：off，可选：read、write、readwrite）')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR,
+                        help=f'响应缓存目录（默认：{DEFAULT_CACHE_DIR}）')
+    parser.add_argument('--cache-max-mb', type=float, default=DEFAULT_CACHE_MAX_MB,
+                        help=f'响应缓存容量上限，单位MB（默认：{DEFAULT_CACHE_MAX_MB}）')
+    parser.add_argument('--dedup-threshold', type=float, default=0,
+                        help='近似重复需求的相似度阈值（0~1，默认：0不去重，建议0.9）')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量模式：对比上次输出的清单，只为新增或修改的需求生成测试用例')
+    parser.add_argument('--resume', type=str, metavar='RUN_ID',
+                        help='从指定运行ID的日志续跑，跳过已完成的需求')
+    parser.add_argument('--journal-dir', type=str, default=DEFAULT_JOURNAL_DIR,
+                        help=f'运行日志目录（默认：{DEFAULT_JOURNAL_DIR}）')
+    parser.add_argument('--metrics-textfile', type=str,
+                        help='运行结束后把指标写入该Prometheus textfile（供node_exporter采集）')
+    parser.add_argument('--metrics-json', type=str,
+                        help='运行结束后把指标摘要写入该JSON文件')
+    parser.add_argument('--ledger', type=str, default=DEFAULT_LEDGER_PATH,
+                        help=f'模型调用台账（SQLite）路径，记录每次调用的tokens、耗时和费用（默认：{DEFAULT_LEDGER_PATH}）')
+    parser.add_argument('--no-ledger', action='store_true', help='不记录模型调用台账')
+    parser.add_argument('--log-level', type=str.upper, choices=LOG_LEVELS,
+                        help='日志级别（默认：环境变量AI_LOG_LEVEL或INFO；DEBUG输出每次API调用）')
+    parser.add_argument('--log-format', type=str, choices=LOG_FORMATS,
+                        help='日志格式（默认：环境变量AI_LOG_FORMAT或json，每行一条JSON）')
     args = parser.parse_args()
+    run_started = time.perf_counter()
+    configure_logging(args.log_level, args.log_format)
 
     # 初始化工具类
     utils = AITestSuiteUtils()
+    if args.hedge_model:
+        utils.client.hedge_to[args.model] = args.hedge_model
+    if args.failover_models:
+        utils.client.failover_models = [m.strip() for m in args.failover_models.split(",") if m.strip()]
+    if args.cache_mode != "off":
+        utils.client.cache = ResponseCache(args.cache_dir, args.cache_max_mb, args.cache_mode)
 
     # 如果文件不存在且是默认文件，尝试生成示例文件
     if not os.path.exists(args.input) and args.input == "./需求文档/sample_requirements.xlsx":
-        print(f"文件 {args.input} 不存在，将生成示例需求文件")
+        logger.warning("文件 %s 不存在，将生成示例需求文件", args.input)
         args.input = utils.generate_sample_requirements()
         if not args.input:
-            print("生成示例需求文件失败")
+            logger.error("生成示例需求文件失败")
             return
     elif not os.path.exists(args.input):
-        print(f"错误：文件 {args.input} 不存在")
+        logger.error("文件 %s 不存在", args.input)
         return
 
-    # 读取需求文件
-    requirements = utils.read_excel_requirements(args.input)
-    if not requirements:
-        print("读取需求文件失败")
+    # 读取需求文件：默认以只读模式逐行读取，边读边生成；增量模式需要完整需求列表与清单对比，
+    # 两种模式使用同一读取方式，保证空单元格的取值与清单中的指纹一致
+    output_file = f"{args.output_dir}/测试用例.xlsx"
+    reused = {}
+    if not args.incremental:
+        requirements = []
+        to_generate = utils.iter_excel_requirements(args.input, collect=requirements)
+    else:
+        requirements = list(utils.iter_excel_requirements(args.input))
+        if not requirements:
+            logger.error("读取需求文件失败")
+            return
+
+        # 增量模式：与上次输出的清单对比，只为新增或修改的需求调用模型
+        to_generate = requirements
+        manifest = load_manifest(manifest_path(output_file)) if os.path.exists(manifest_path(output_file)) else None
+        if manifest:
+            to_generate, reused, deleted = diff_requirements(requirements, manifest)
+            logger.info("增量模式：新增或修改 %d 条，未改动 %d 条，已删除 %d 条", len(to_generate), len(reused), len(deleted))
+        else:
+            logger.info("增量模式：未找到上次输出的清单，将为全部需求生成测试用例")
+
+    # 打开运行日志
+    if args.resume and not os.path.exists(os.path.join(args.journal_dir, f"{args.resume}.jsonl")):
+        logger.error("未找到运行 %s 的日志", args.resume)
         return
+    run_id = args.resume or new_run_id()
+    set_run_id(run_id)
+    journal = RunJournal(run_id, args.journal_dir)
+    journal.start(input=args.input, model=args.model)
+    if not args.no_ledger:
+        utils.client.ledger = UsageLedger(args.ledger, input_file=args.input)
+    print(f"运行ID: {run_id}（中断后可使用 --resume {run_id} 继续）")
 
     # 生成测试用例
-    test_cases = utils.generate_test_cases(requirements, args.model)
+    test_cases = utils.generate_test_cases(to_generate, args.model, concurrency=args.concurrency,
+                                         pack_size=args.pack_size, pack_tokens=args.pack_tokens,
+                                         stream=args.stream, on_case=print_streamed_case if args.stream else None,
+                                         journal=journal, dedup_threshold=args.dedup_threshold,
+                                         output_format=args.output_format)
+    journal.close()
+    if utils.client.ledger:
+        utils.client.ledger.close()
+        logger.info("本次 %d 次模型调用已记入台账 %s", utils.client.ledger.recorded, args.ledger)
+    if not requirements:
+        logger.error("读取需求文件失败")
+        return
+    if reused:
+        test_cases = merge_cases(requirements, test_cases, reused)
     if not test_cases:
-        print("生成测试用例失败")
+        logger.error("生成测试用例失败")
         return
 
     # 导出测试用例
-    output_file = f"{args.output_dir}/测试用例.xlsx"
     if utils.export_to_excel(test_cases, output_file):
         print(f"测试用例已成功导出到: {output_file}")
+        write_manifest(manifest_path(output_file), requirements, test_cases, input=args.input, model=args.model)
     else:
-        print("导出测试用例失败")
+        logger.error("导出测试用例失败")
 
     # 生成测试报告
     report_file = f"{args.report_dir}/测试报告.xlsx"
     if utils.generate_test_report(test_cases, report_file):
         print(f"测试报告已成功导出到: {report_file}")
     else:
-        print("导出测试报告失败")
+        logger.error("导出测试报告失败")
+
+    # 连接池复用、对冲及缓存命中统计
+    utils.client.report_pool_stats()
+    utils.client.report_hedge_stats()
+    utils.client.report_breaker_states()
+    utils.client.report_token_stats()
+    utils.report_parse_stats()
+    if utils.client.cache:
+        utils.client.cache.report()
+
+    # 导出本次运行的指标
+    METRICS.record_run(run_started, len(requirements), len(test_cases), model=args.model)
+    if args.metrics_textfile:
+        METRICS.write_textfile(args.metrics_textfile)
+        logger.info("指标已写入: %s", args.metrics_textfile)
+    if args.metrics_json:
+        METRICS.write_json(args.metrics_json, run_id=run_id, model=args.model, input=args.input)
+        logger.info("运行摘要已写入: %s", args.metrics_json)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
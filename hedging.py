@@ -0,0 +1,53 @@
+import math
+from collections import deque
+
+# 样本数不足时不对冲，避免用少量样本估出的p95误触发
+MIN_HEDGE_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+
+class LatencyTracker:
+    """记录模型最近一批成功请求的耗时，用于估算p95"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, pct):
+        """返回最近样本的pct分位耗时（秒），没有样本时返回None"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def hedge_delay(self, min_samples=MIN_HEDGE_SAMPLES):
+        """发起对冲请求前的等待时间（p95），样本不足时返回None"""
+        if len(self.samples) < min_samples:
+            return None
+        return self.percentile(95)
+
+
+class HedgeStats:
+    """单个模型的对冲统计"""
+
+    def __init__(self):
+        self.calls = 0
+        self.hedged = 0
+        self.primary_wins = 0
+        self.hedge_wins = 0
+
+    @property
+    def hedge_rate(self):
+        return self.hedged / self.calls if self.calls else 0.0
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedge_rate, 4),
+            "primary_wins": self.primary_wins,
+            "hedge_wins": self.hedge_wins
+        }
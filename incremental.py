@@ -0,0 +1,95 @@
+import os
+import glob
+import json
+import time
+import hashlib
+from run_journal import json_default
+from structured_log import get_logger
+
+logger = get_logger("incremental")
+
+# 影响生成结果的需求字段，任一字段变化即视为需求已修改
+FINGERPRINT_FIELDS = ["需求ID", "标题", "详细描述", "优先级", "需求分类", "迭代", "父需求"]
+
+
+def fingerprint(req):
+    """需求行的指纹（相关字段的SHA-256）"""
+    fields = {field: req.get(field) for field in FINGERPRINT_FIELDS}
+    text = json.dumps(fields, ensure_ascii=False, sort_keys=True, default=json_default)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def manifest_path(output_file):
+    """测试用例文件对应的清单路径，如 TestCases_x.xlsx -> TestCases_x.manifest.json"""
+    return os.path.splitext(output_file)[0] + ".manifest.json"
+
+
+def find_latest_manifest(pattern):
+    """返回匹配pattern的测试用例文件中最新一份的清单路径，没有时返回None"""
+    candidates = [manifest_path(path) for path in glob.glob(pattern)]
+    candidates = [path for path in candidates if os.path.exists(path)]
+    return max(candidates, key=os.path.getmtime) if candidates else None
+
+
+def load_manifest(path):
+    """读取清单，文件不存在或已损坏时返回None"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning("无法读取清单 %s: %s", path, e)
+        return None
+
+
+def write_manifest(path, requirements, test_cases, **meta):
+    """保存本次输出对应的清单：每条需求的指纹及其测试用例"""
+    cases_by_req = {}
+    for case in test_cases:
+        cases_by_req.setdefault(str(case["需求ID"]), []).append(case)
+
+    manifest = dict(meta, created_at=time.time(), requirements={
+        str(req["需求ID"]): {
+            "fingerprint": fingerprint(req),
+            "cases": cases_by_req.get(str(req["需求ID"]), [])
+        }
+        for req in requirements
+    })
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, default=json_default)
+    os.replace(tmp_path, path)
+
+
+def diff_requirements(requirements, manifest):
+    """与上次运行的清单比较
+
+    返回(changed, reused, deleted)：changed为新增或修改、需要重新生成的需求；
+    reused为 需求ID -> 上次的测试用例（未改动的需求）；deleted为已删除的需求ID列表。
+    上次未生成出用例的需求也会重新生成。
+    """
+    previous = manifest.get("requirements", {})
+    changed = []
+    reused = {}
+    for req in requirements:
+        req_id = str(req["需求ID"])
+        entry = previous.get(req_id)
+        if entry and entry["fingerprint"] == fingerprint(req) and entry["cases"]:
+            reused[req_id] = entry["cases"]
+        else:
+            changed.append(req)
+    current_ids = {str(req["需求ID"]) for req in requirements}
+    deleted = [req_id for req_id in previous if req_id not in current_ids]
+    return changed, reused, deleted
+
+
+def merge_cases(requirements, generated_cases, reused):
+    """按需求顺序合并新生成的用例与复用的用例，已删除需求的用例自然被丢弃"""
+    generated = {}
+    for case in generated_cases:
+        generated.setdefault(str(case["需求ID"]), []).append(case)
+
+    merged = []
+    for req in requirements:
+        req_id = str(req["需求ID"])
+        merged.extend(generated.get(req_id) or reused.get(req_id, []))
+    return merged
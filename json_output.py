@@ -0,0 +1,191 @@
+import re
+import json
+from case_parser import split_steps
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库json
+    orjson = None
+
+OUTPUT_FORMATS = ["markdown", "json"]
+
+# 单个测试用例的JSON结构，字段与case_parser.parse_case_block的返回值一致
+CASE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "priority": {"type": "string", "enum": ["高", "中", "低"]},
+        "precondition": {"type": "string"},
+        "steps": {"type": "array", "items": {"type": "string"}},
+        "expected": {"type": "string"}
+    },
+    "required": ["title", "priority", "precondition", "steps", "expected"],
+    "additionalProperties": False
+}
+
+TEST_CASES_SCHEMA = {
+    "type": "object",
+    "properties": {"test_cases": {"type": "array", "items": CASE_SCHEMA}},
+    "required": ["test_cases"],
+    "additionalProperties": False
+}
+
+# 打包请求：每条需求一项
+PACKED_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "requirements": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"req_id": {"type": "string"}, "test_cases": TEST_CASES_SCHEMA["properties"]["test_cases"]},
+                "required": ["req_id", "test_cases"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["requirements"],
+    "additionalProperties": False
+}
+
+JSON_FORMAT_TEMPLATE = """请生成至少3个测试用例，只输出一个JSON对象，不要输出JSON以外的任何内容，格式如下：
+{"test_cases": [{"title": "测试目标", "priority": "高/中/低", "precondition": "前置条件描述", "steps": ["步骤1", "步骤2"], "expected": "预期结果描述"}]}
+steps中的每一项是一个测试步骤，不要带编号。
+"""
+
+PACKED_JSON_FORMAT_TEMPLATE = """对每条需求生成至少3个测试用例，只输出一个JSON对象，不要输出JSON以外的任何内容，每条需求一项，格式如下：
+{"requirements": [{"req_id": "需求ID", "test_cases": [{"title": "测试目标", "priority": "高/中/低", "precondition": "前置条件描述", "steps": ["步骤1", "步骤2"], "expected": "预期结果描述"}]}]}
+steps中的每一项是一个测试步骤，不要带编号。
+"""
+
+_CODE_FENCE_PATTERN = re.compile(r'^```(?:json)?\s*|\s*```$')
+_STEP_NUMBER_PATTERN = re.compile(r'^\d+[.．、]\s*')
+
+
+def loads(text):
+    """解析JSON文本，安装了orjson时使用orjson"""
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+def _load_object(text):
+    """解析模型回复中的JSON，兼容```json代码块包裹；无法解析时返回None"""
+    if not text:
+        return None
+    text = _CODE_FENCE_PATTERN.sub("", text.strip())
+    try:
+        return loads(text)
+    except ValueError:
+        pass
+    # 个别模型会在JSON前后附加说明文字
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end <= start:
+        return None
+    try:
+        return loads(text[start:end + 1])
+    except ValueError:
+        return None
+
+
+def _text(value):
+    if isinstance(value, list):
+        return "\n".join(str(item).strip() for item in value if str(item).strip())
+    return str(value).strip() if value is not None else ""
+
+
+def normalize_case(item):
+    """把JSON中的一个用例转换为parse_case_block格式的字段字典，结构不符时返回None"""
+    if not isinstance(item, dict):
+        return None
+    steps = item.get("steps") or []
+    if isinstance(steps, str):
+        steps = split_steps(steps) or [steps.strip()]
+    # 去掉模型自行添加的步骤编号，导出时统一重新编号
+    steps = [_STEP_NUMBER_PATTERN.sub("", str(step).strip()) for step in steps]
+    fields = {
+        "title": _text(item.get("title")),
+        "priority": _text(item.get("priority")) or None,
+        "precondition": _text(item.get("precondition")),
+        "steps": [step for step in steps if step],
+        "expected": _text(item.get("expected"))
+    }
+    if not fields["title"] and not fields["steps"]:
+        return None
+    return fields
+
+
+def decode_cases(text):
+    """解析单条需求的JSON回复，返回字段字典列表；回复不是预期的JSON时返回None"""
+    data = _load_object(text)
+    if isinstance(data, dict):
+        data = data.get("test_cases")
+    if not isinstance(data, list):
+        return None
+    cases = [normalize_case(item) for item in data]
+    return [case for case in cases if case is not None]
+
+
+def split_packed_json(text, req_ids):
+    """把打包请求的JSON回复按需求ID拆分，返回 需求ID -> 该需求的JSON文本
+
+    与prompt_packing.split_packed_response的返回值一致，回复不是预期的JSON时返回None。
+    """
+    data = _load_object(text)
+    if not isinstance(data, dict) or not isinstance(data.get("requirements"), list):
+        return None
+    wanted = set(req_ids)
+    sections = {}
+    for item in data["requirements"]:
+        if not isinstance(item, dict):
+            continue
+        req_id = str(item.get("req_id", "")).strip()
+        if req_id in wanted and req_id not in sections:
+            sections[req_id] = json.dumps({"test_cases": item.get("test_cases") or []}, ensure_ascii=False)
+    return sections
+
+
+class ParseStats:
+    """单个模型回复的解析统计"""
+
+    def __init__(self):
+        self.replies = 0
+        self.parsed = 0          # 解析出至少一个用例的回复
+        self.json_replies = 0    # 以JSON格式请求的回复
+        self.json_decoded = 0    # 按JSON成功解析的回复
+        self.fallbacks = 0       # JSON解析失败后由Markdown解析器解析出用例的回复
+        self.cases = 0
+
+    def record(self, cases, json_requested=False, json_decoded=False):
+        self.replies += 1
+        self.cases += len(cases)
+        if cases:
+            self.parsed += 1
+        if json_requested:
+            self.json_replies += 1
+            if json_decoded:
+                self.json_decoded += 1
+            elif cases:
+                self.fallbacks += 1
+
+    @property
+    def success_rate(self):
+        return self.parsed / self.replies if self.replies else 0.0
+
+    def to_dict(self):
+        return {
+            "replies": self.replies,
+            "parsed": self.parsed,
+            "success_rate": round(self.success_rate, 4),
+            "json_replies": self.json_replies,
+            "json_decoded": self.json_decoded,
+            "markdown_fallbacks": self.fallbacks,
+            "cases": self.cases
+        }
+
+
+def report_parse_stats(parse_stats):
+    """打印各模型回复的解析成功率"""
+    for name, stats in parse_stats.items():
+        json_text = (f"，JSON解析 {stats.json_decoded}/{stats.json_replies} 条，回退Markdown {stats.fallbacks} 条"
+                     if stats.json_replies else "")
+        print(f"模型 {name} 解析：回复 {stats.replies} 条，解析成功 {stats.parsed} 条"
+              f"（{stats.success_rate * 100:.1f}%）{json_text}，用例 {stats.cases} 条")
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+METRIC_PREFIX = "aitestsuite_"
+
+# 耗时直方图的桶上限（秒）
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# 每条需求用例数直方图的桶上限
+CASES_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+
+# 指标名称 -> (类型, 说明, 直方图桶)
+METRIC_DEFINITIONS = {
+    # stage为excel_read/pdf_read/prompt_build/http/parse/export/report，http为单次HTTP请求
+    "stage_duration_seconds": ("histogram", "各阶段耗时（秒）", SECONDS_BUCKETS),
+    "requests_total": ("counter", "发出的HTTP请求数", None),
+    "retries_total": ("counter", "重试次数，reason为throttled（429）或error", None),
+    "errors_total": ("counter", "请求错误数，type为http/other/throttled/circuit_open/context_overflow", None),
+    "tokens_total": ("counter", "tokens用量，kind为prompt/completion/total/estimated_prompt", None),
+    "cache_hits_total": ("counter", "响应缓存命中次数", None),
+    "cases_per_requirement": ("histogram", "每条需求解析出的测试用例数", CASES_BUCKETS),
+    "run_duration_seconds": ("gauge", "本次运行总耗时（秒）", None),
+    "run_requirements": ("gauge", "本次运行的需求条数", None),
+    "run_test_cases": ("gauge", "本次运行输出的测试用例数", None),
+    "run_requirements_per_second": ("gauge", "本次运行的吞吐（条需求/秒）", None),
+    "run_finished_timestamp_seconds": ("gauge", "本次运行结束时间（Unix时间戳）", None)
+}
+
+
+class Histogram:
+    """固定桶的直方图，与Prometheus histogram语义一致（桶上限含等于）"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个为+Inf桶
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """按桶内线性插值估算分位数（同PromQL的histogram_quantile），没有数据时返回None
+
+        结果是估算值，并限制在实际观测到的最小值和最大值之间。
+        """
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= target:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                # 样本较少时插值可能超出实际观测值的范围
+                estimate = lower + (upper - lower) * (target - cumulative) / count
+                return min(max(estimate, self.min), self.max)
+            cumulative += count
+        return self.max
+
+    def to_dict(self):
+        def rounded(value):
+            return round(value, 6) if value is not None else None
+        return {
+            "count": self.count,
+            "sum": rounded(self.sum),
+            "mean": rounded(self.sum / self.count) if self.count else None,
+            "min": rounded(self.min),
+            "max": rounded(self.max),
+            "p50": rounded(self.quantile(0.5)),
+            "p95": rounded(self.quantile(0.95)),
+            "p99": rounded(self.quantile(0.99))
+        }
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """进程内指标注册表：计数器、仪表和直方图，按标签区分序列
+
+    指标名称须在METRIC_DEFINITIONS中定义；各方法线程安全，可在事件循环线程和主线程中同时调用。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}  # (名称, 排序后的标签元组) -> 数值或Histogram
+
+    def _key(self, name, labels):
+        if name not in METRIC_DEFINITIONS:
+            raise KeyError(f"未定义的指标: {name}")
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._series[key] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._series.get(key)
+            if histogram is None:
+                histogram = self._series[key] = Histogram(METRIC_DEFINITIONS[name][2])
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, stage, model=""):
+        """记录with块的耗时到stage_duration_seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_duration_seconds", time.perf_counter() - started, stage=stage, model=model)
+
+    def value(self, name, **labels):
+        """返回计数器或仪表的当前值，不存在时返回0"""
+        with self._lock:
+            return self._series.get(self._key(name, labels), 0)
+
+    def to_prometheus(self):
+        """按Prometheus文本格式输出全部指标"""
+        with self._lock:
+            series = sorted(self._series.items(), key=lambda item: item[0])
+            lines = []
+            current = None
+            for (name, labels), value in series:
+                metric_type, help_text, _ = METRIC_DEFINITIONS[name]
+                full_name = METRIC_PREFIX + name
+                if name != current:
+                    current = name
+                    lines.append(f"# HELP {full_name} {help_text}")
+                    lines.append(f"# TYPE {full_name} {metric_type}")
+                if metric_type != "histogram":
+                    lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for upper, count in zip(value.buckets + (float("inf"),), value.counts):
+                    cumulative += count
+                    lines.append(f"{full_name}_bucket{_format_labels(labels, ('le', _format_value(upper)))} {cumulative}")
+                lines.append(f"{full_name}_sum{_format_labels(labels)} {_format_value(value.sum)}")
+                lines.append(f"{full_name}_count{_format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """按指标名称汇总的字典：直方图给出count/sum/mean/min/max及p50/p95/p99估算值"""
+        with self._lock:
+            metrics = {}
+            for (name, labels), value in sorted(self._series.items(), key=lambda item: item[0]):
+                metric_type = METRIC_DEFINITIONS[name][0]
+                entry = metrics.setdefault(name, {"type": metric_type, "series": []})
+                data = value.to_dict() if metric_type == "histogram" else {"value": value}
+                entry["series"].append(dict({"labels": dict(labels)}, **data))
+        return metrics
+
+    def write_textfile(self, path):
+        """写入Prometheus textfile（供node_exporter的textfile collector采集），先写临时文件再替换"""
+        _atomic_write(path, self.to_prometheus())
+
+    def write_json(self, path, **meta):
+        """写入JSON格式的运行摘要，meta中的字段（运行ID、模型等）写在顶层"""
+        summary = dict(meta, metrics=self.summary())
+        _atomic_write(path, json.dumps(summary, ensure_ascii=False, indent=2))
+
+    def record_run(self, started, requirements, test_cases, **labels):
+        """记录本次运行的总耗时、需求数、用例数和吞吐"""
+        elapsed = time.perf_counter() - started
+        self.set("run_duration_seconds", round(elapsed, 3), **labels)
+        self.set("run_requirements", requirements, **labels)
+        self.set("run_test_cases", test_cases, **labels)
+        self.set("run_requirements_per_second", round(requirements / elapsed, 3) if elapsed else 0, **labels)
+        self.set("run_finished_timestamp_seconds", int(time.time()), **labels)
+
+
+def _atomic_write(path, text):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+# 进程内共享的指标注册表
+METRICS = MetricsRegistry()
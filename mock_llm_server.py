@@ -0,0 +1,253 @@
+import re
+import json
+import time
+import random
+import asyncio
+import argparse
+from aiohttp import web
+from prompt_packing import SECTION_HEADER, estimate_tokens
+
+OPENAI_PATH = "/v1/chat/completions"
+DASHSCOPE_PATH = "/api/v1/services/aigc/text-generation/generation"
+
+LATENCY_DISTRIBUTIONS = ["fixed", "uniform", "lognormal"]
+
+CANNED_CASE_TEMPLATE = """### 测试用例{index}：{title}
+**优先级**：{priority}
+**前置条件**：用户已登录系统，并具有相应操作权限
+**测试步骤**：
+1. 进入对应功能页面
+2. 按测试目标输入测试数据，金额输入1.5元
+3. 点击提交按钮
+**预期结果**：系统正确处理请求，页面提示操作成功，数据保存正确
+"""
+
+CANNED_TITLES = ["正常流程验证", "必填项为空校验", "边界值校验", "权限控制校验", "异常输入处理"]
+CANNED_PRIORITIES = ["高", "中", "低"]
+
+
+def canned_case_items(count):
+    """生成count个JSON输出模式的测试用例（json_output.CASE_SCHEMA结构）"""
+    return [
+        {
+            "title": CANNED_TITLES[(i - 1) % len(CANNED_TITLES)],
+            "priority": CANNED_PRIORITIES[(i - 1) % len(CANNED_PRIORITIES)],
+            "precondition": "用户已登录系统，并具有相应操作权限",
+            "steps": ["进入对应功能页面", "按测试目标输入测试数据，金额输入1.5元", "点击提交按钮"],
+            "expected": "系统正确处理请求，页面提示操作成功，数据保存正确"
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def canned_cases(count):
+    """生成count个格式固定的测试用例文本"""
+    return "\n".join(
+        CANNED_CASE_TEMPLATE.format(
+            index=i,
+            title=CANNED_TITLES[(i - 1) % len(CANNED_TITLES)],
+            priority=CANNED_PRIORITIES[(i - 1) % len(CANNED_PRIORITIES)]
+        )
+        for i in range(1, count + 1)
+    )
+
+
+class MockConfig:
+    """模拟服务的延迟分布与故障注入参数"""
+
+    def __init__(self, latency_ms=500, latency_dist="lognormal", latency_sigma=0.5, error_rate=0.0,
+                 rate_limit_rate=0.0, retry_after=1.0, cases=3, canned_text=None, chunk_chars=24,
+                 seed=None):
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.cases = cases
+        self.canned_text = canned_text
+        self.chunk_chars = chunk_chars
+        self.random = random.Random(seed)
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0}
+
+    def sample_latency(self):
+        """按配置的分布抽取一次响应延迟（秒）；lognormal以latency_ms为中位数"""
+        base = self.latency_ms / 1000
+        if self.latency_dist == "fixed":
+            return base
+        if self.latency_dist == "uniform":
+            return self.random.uniform(0, 2 * base)
+        return self.random.lognormvariate(0, self.latency_sigma) * base
+
+    def reply_for(self, prompt, json_output=False):
+        """根据提示生成回复：打包提示按需求ID分节，其余返回固定用例
+
+        json_output为True（请求中带response_format）时返回JSON；自定义回复文本原样返回。
+        """
+        if json_output:
+            return self.canned_text or self._json_reply(prompt)
+        cases = self.canned_text or canned_cases(self.cases)
+        if "按需求分节输出" in prompt:
+            req_ids = re.findall(r'【需求\d+】\n需求ID: (.+)', prompt)
+            return "\n\n".join(f"{SECTION_HEADER.format(req_id=req_id.strip())}\n{cases}" for req_id in req_ids)
+        return f"好的，以下是根据需求生成的测试用例：\n\n{cases}"
+
+    def _json_reply(self, prompt):
+        cases = canned_case_items(self.cases)
+        req_ids = re.findall(r'【需求\d+】\n需求ID: (.+)', prompt)
+        if req_ids:
+            data = {"requirements": [{"req_id": req_id.strip(), "test_cases": cases} for req_id in req_ids]}
+        else:
+            data = {"test_cases": cases}
+        return json.dumps(data, ensure_ascii=False)
+
+
+async def _inject_fault(config):
+    """按配置注入429或500错误，返回错误响应；正常时模拟延迟并返回None"""
+    config.stats["requests"] += 1
+    if config.random.random() < config.rate_limit_rate:
+        config.stats["throttled"] += 1
+        return web.json_response({"error": {"message": "Rate limit exceeded", "type": "rate_limit"}},
+                                 status=429, headers={"Retry-After": str(config.retry_after)})
+    await asyncio.sleep(config.sample_latency())
+    if config.random.random() < config.error_rate:
+        config.stats["errors"] += 1
+        return web.json_response({"error": {"message": "Injected server error", "type": "server_error"}},
+                                 status=500)
+    return None
+
+
+def _usage(messages, content, openai_style=True):
+    prompt_tokens = sum(estimate_tokens(m.get("content", "")) for m in messages)
+    completion_tokens = estimate_tokens(content)
+    if openai_style:
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+    return {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def _chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+async def _send_sse(request, events):
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    for event in events:
+        await response.write(f"data: {event}\n\n".encode("utf-8"))
+        await asyncio.sleep(0)
+    await response.write_eof()
+    return response
+
+
+async def handle_openai(request):
+    config = request.app["config"]
+    body = await request.json()
+    fault = await _inject_fault(config)
+    if fault is not None:
+        return fault
+
+    messages = body.get("messages", [])
+    content = config.reply_for(messages[-1]["content"] if messages else "", bool(body.get("response_format")))
+    usage = _usage(messages, content)
+    created = int(time.time())
+
+    if not body.get("stream"):
+        return web.json_response({
+            "id": f"mock-{created}",
+            "object": "chat.completion",
+            "created": created,
+            "model": body.get("model") or "mock",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage
+        })
+
+    events = [json.dumps({"choices": [{"index": 0, "delta": {"content": chunk}}]}, ensure_ascii=False)
+              for chunk in _chunks(content, config.chunk_chars)]
+    events.append(json.dumps({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+    # 与OpenAI一致：请求带stream_options.include_usage时才在最后单独发送一条用量事件
+    if (body.get("stream_options") or {}).get("include_usage"):
+        events.append(json.dumps({"choices": [], "usage": usage}))
+    events.append("[DONE]")
+    return await _send_sse(request, events)
+
+
+async def handle_dashscope(request):
+    config = request.app["config"]
+    body = await request.json()
+    fault = await _inject_fault(config)
+    if fault is not None:
+        return fault
+
+    messages = (body.get("input") or {}).get("messages", [])
+    json_output = bool((body.get("parameters") or {}).get("response_format"))
+    content = config.reply_for(messages[-1]["content"] if messages else "", json_output)
+    usage = _usage(messages, content, openai_style=False)
+    message = {"role": "assistant", "content": content}
+
+    if request.headers.get("X-DashScope-SSE", "").lower() != "enable":
+        # 同时提供output.choices（官方格式）和output.message（仓库中部分解析器使用的格式）
+        return web.json_response({
+            "output": {"choices": [{"message": message, "finish_reason": "stop"}], "message": message},
+            "usage": usage,
+            "request_id": f"mock-{int(time.time() * 1000)}"
+        })
+
+    events = [json.dumps({"output": {"choices": [{"message": {"role": "assistant", "content": chunk},
+                                                  "finish_reason": "null"}]}}, ensure_ascii=False)
+              for chunk in _chunks(content, config.chunk_chars)]
+    events.append(json.dumps({"output": {"choices": [{"message": {"role": "assistant", "content": ""},
+                                                      "finish_reason": "stop"}]}, "usage": usage}))
+    return await _send_sse(request, events)
+
+
+async def handle_stats(request):
+    return web.json_response(request.app["config"].stats)
+
+
+def create_app(config):
+    """创建模拟服务的aiohttp应用"""
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app["config"] = config
+    app.router.add_post(OPENAI_PATH, handle_openai)
+    app.router.add_post(DASHSCOPE_PATH, handle_dashscope)
+    app.router.add_get("/stats", handle_stats)
+    return app
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='本地模拟大模型服务（OpenAI/DashScope兼容）')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='监听地址（默认：127.0.0.1）')
+    parser.add_argument('--port', type=int, default=8800, help='监听端口（默认：8800）')
+    parser.add_argument('--latency-ms', type=float, default=500, help='响应延迟的中位数，单位毫秒（默认：500）')
+    parser.add_argument('--latency-dist', type=str, default='lognormal', choices=LATENCY_DISTRIBUTIONS,
+                        help='延迟分布（默认：lognormal）')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='lognormal分布的sigma，越大长尾越明显（默认：0.5）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回500错误的比例（默认：0）')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='返回429的比例（默认：0）')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='429响应的Retry-After秒数（默认：1）')
+    parser.add_argument('--cases', type=int, default=3, help='每条需求返回的测试用例数（默认：3）')
+    parser.add_argument('--canned-file', type=str, help='自定义回复文本文件，替代内置的测试用例模板')
+    parser.add_argument('--seed', type=int, help='随机种子，便于复现')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    canned_text = None
+    if args.canned_file:
+        with open(args.canned_file, encoding="utf-8") as f:
+            canned_text = f.read()
+    config = MockConfig(
+        latency_ms=args.latency_ms, latency_dist=args.latency_dist, latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+        cases=args.cases, canned_text=canned_text, seed=args.seed
+    )
+    print(f"模拟服务已启动: http://{args.host}:{args.port}{OPENAI_PATH}（OpenAI）、"
+          f"http://{args.host}:{args.port}{DASHSCOPE_PATH}（DashScope）")
+    web.run_app(create_app(config), host=args.host, port=args.port, print=None, backlog=1024)
+
+
+if __name__ == "__main__":
+    main()
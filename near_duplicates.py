@@ -0,0 +1,122 @@
+import re
+import hashlib
+from collections import Counter
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+DEFAULT_DEDUP_THRESHOLD = 0.9
+
+_NOISE_PATTERN = re.compile(r'[\s\W_]+')
+
+
+def requirement_text(req):
+    """参与相似度计算的需求文本：标题 + 详细描述"""
+    return f"{req.get('标题', '')}\n{req.get('详细描述', '')}"
+
+
+def simhash(text, shingle_size=SHINGLE_SIZE):
+    """计算文本的64位SimHash：去掉空白和标点后按字符n-gram加权"""
+    text = _NOISE_PATTERN.sub("", str(text).lower())
+    if len(text) <= shingle_size:
+        shingles = Counter([text])
+    else:
+        shingles = Counter(text[i:i + shingle_size] for i in range(len(text) - shingle_size + 1))
+
+    weights = [0] * SIMHASH_BITS
+    for shingle, count in shingles.items():
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += count if value >> bit & 1 else -count
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def similarity(a, b):
+    """两个SimHash的相似度（1 - 汉明距离/64）"""
+    return 1 - bin(a ^ b).count("1") / SIMHASH_BITS
+
+
+class SimHashIndex:
+    """SimHash近邻索引
+
+    相似度阈值对应最大汉明距离k，把64位分成k+1段：距离不超过k的两个指纹至少有一段
+    完全相同（抽屉原理），因此只需比较至少一段相同的候选，不必两两比较。
+    """
+
+    def __init__(self, threshold=DEFAULT_DEDUP_THRESHOLD):
+        self.threshold = threshold
+        self.max_distance = int((1 - threshold) * SIMHASH_BITS)
+        bands = self.max_distance + 1
+        step = -(-SIMHASH_BITS // bands)
+        self._bands = [(start, min(step, SIMHASH_BITS - start)) for start in range(0, SIMHASH_BITS, step)]
+        self._tables = [{} for _ in self._bands]
+        self._hashes = {}
+
+    def _keys(self, value):
+        return [value >> start & ((1 << width) - 1) for start, width in self._bands]
+
+    def add(self, key, value):
+        self._hashes[key] = value
+        for table, band in zip(self._tables, self._keys(value)):
+            table.setdefault(band, []).append(key)
+
+    def query(self, value):
+        """返回最相似且达到阈值的已索引键，没有时返回None"""
+        best, best_distance = None, self.max_distance + 1
+        seen = set()
+        for table, band in zip(self._tables, self._keys(value)):
+            for key in table.get(band, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                distance = bin(self._hashes[key] ^ value).count("1")
+                if distance < best_distance:
+                    best, best_distance = key, distance
+        return best
+
+
+class NearDuplicateFinder:
+    """增量识别近似重复的需求：需求可以分批传入，后一批中的需求也会与前面各批比较"""
+
+    def __init__(self, threshold=DEFAULT_DEDUP_THRESHOLD):
+        self.index = SimHashIndex(threshold)
+        self._unique = []
+
+    def split(self, requirements):
+        """返回本批的(unique, duplicates)，含义同find_near_duplicates"""
+        unique = []
+        duplicates = []
+        for req in requirements:
+            value = simhash(requirement_text(req))
+            match = self.index.query(value)
+            if match is None:
+                self.index.add(len(self._unique), value)
+                self._unique.append(req)
+                unique.append(req)
+            else:
+                duplicates.append((req, self._unique[match]))
+        return unique, duplicates
+
+
+def find_near_duplicates(requirements, threshold=DEFAULT_DEDUP_THRESHOLD):
+    """找出近似重复的需求
+
+    返回(unique, duplicates)：unique为需要调用模型的需求，duplicates为
+    [(重复需求, 与之相似的首条需求)]，后者的用例可复用到前者。
+    """
+    return NearDuplicateFinder(threshold).split(requirements)
+
+
+def restamp_cases(cases, source_req, target_req):
+    """把为source_req生成的用例复制给target_req，重新编号并替换需求相关字段"""
+    source_prefix = f"测试-{source_req['标题']}-"
+    target_prefix = f"测试-{target_req['标题']}-"
+    restamped = []
+    for i, case in enumerate(cases, 1):
+        case = dict(case)
+        case["用例编号"] = f"TC-{target_req['需求ID']}-{i:02d}"
+        case["需求ID"] = target_req["需求ID"]
+        case["父需求"] = target_req.get("父需求", "")
+        if case.get("标题", "").startswith(source_prefix):
+            case["标题"] = target_prefix + case["标题"][len(source_prefix):]
+        restamped.append(case)
+    return restamped
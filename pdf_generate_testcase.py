@@ -1,177 +1,289 @@
-import time  # 补充缺失的time模块
-import PyPDF2
-import requests
+import asyncio
+import json
+import logging
 from dotenv import load_dotenv
 import os
 import re
 import pandas as pd
 from openpyxl.styles import Alignment
+from ai_client import AIClient, run_sync
+from prompt_packing import estimate_tokens
+from token_budget import estimate_messages_tokens, split_text
+from run_journal import new_run_id
+from usage_ledger import UsageLedger
+from pdf_text import DEFAULT_PAGE_CACHE_DIR, extract_pages, iter_pages, iter_chunks, page_pool
+from pdf_requirements import format_requirement_list, merge_requirements, split_requirement_list
+from requirement_stream import aiter_chunks
+from api_endpoints import endpoint_requirement, iter_endpoints
+from structured_log import configure_logging, get_logger, request_context, set_run_id
 # 加载 通义千问 API 密钥（需提前设置环境变量或使用 .env 文件）
 load_dotenv()
 AI_API_KEY = os.getenv("AI_API_KEY")
 AI_API_ENDPOINT = os.getenv("AI_API_ENDPOINT")
 MODEL_NAME = os.getenv("MODEL_NAME")
 
-def extract_text_from_pdf(pdf_path):
-    """提取 PDF 文本内容"""
-    text = ""
-    with open(pdf_path, 'rb') as file:
-        reader = PyPDF2.PdfReader(file)
-        for page in reader.pages:
-            text += page.extract_text()
-    return text
+logger = get_logger("pdf_generate_testcase")
 
-def call_qianwen_model(prompt, text, max_retries=4):
-    """调用 通义千问 模型（增强重试机制）"""
-    headers = {
-        "Authorization": f"Bearer {AI_API_KEY}",
-        "Content-Type": "application/json; charset=utf-8"  # 明确指定UTF-8编码
+def extract_text_from_pdf(pdf_path, workers=None, cache_dir=DEFAULT_PAGE_CACHE_DIR):
+    """提取 PDF 文本内容（按页并行提取，页面文本缓存在cache_dir，为None时不缓存）"""
+    return "".join(extract_pages(pdf_path, workers, cache_dir))
+
+def _parse_qianwen_response(json_data):
+    """从通义千问响应中提取生成内容"""
+    # 响应结构仅在DEBUG级别输出，其他级别下不做格式化
+    if logger.isEnabledFor(logging.DEBUG):
+        preview = json.dumps(json_data, ensure_ascii=False, indent=2)
+        logger.debug("响应结构: %s", preview[:500] + "..." if len(preview) > 500 else preview)
+    
+    # 通义千问API返回格式与DeepSeek不同，需要调整
+    # 根据实际响应结构提取内容
+    content = ""
+    if "output" in json_data:
+        if "text" in json_data["output"]:
+            content = json_data["output"]["text"]
+        elif "message" in json_data["output"] and "content" in json_data["output"]["message"]:
+            content = json_data["output"]["message"]["content"]
+        elif "choices" in json_data and len(json_data["choices"]) > 0:
+            if "message" in json_data["choices"][0]:
+                content = json_data["choices"][0]["message"]["content"]
+            elif "text" in json_data["choices"][0]:
+                content = json_data["choices"][0]["text"]
+    
+    if not content:
+        logger.warning("无法从响应中提取内容，使用原始响应文本")
+        content = json.dumps(json_data, ensure_ascii=False)
+    return content
+
+# 通义千问模型配置，格式与AITestUtils中的MODEL_CONFIGS一致
+MODEL_CONFIGS = {
+    "qianwen": {
+        "api_key_env": "AI_API_KEY",
+        "endpoint": AI_API_ENDPOINT,
+        "stream_format": "dashscope",  # 流式响应(SSE)格式
+        "timeout": 50,
+        "headers": lambda key: {
+            "Authorization": f"Bearer {key}",
+            "Content-Type": "application/json; charset=utf-8"  # 明确指定UTF-8编码
+        },
+        "payload": lambda messages, temperature: {
+            "model": f"{MODEL_NAME}",  # 使用通义千问最新模型
+            "input": {"messages": messages},
+            "parameters": {
+                "temperature": temperature,  # 降低随机性
+                "result_format": "message"  # 返回格式为消息
+            }
+        },
+        "response_parser": _parse_qianwen_response
     }
-    # 严格格式要求的系统提示
-    system_prompt = """请严格按以下格式生成测试用例：
+}
+
+AI_CLIENT = AIClient(MODEL_CONFIGS, "qianwen", timeout=50)
+
+def call_qianwen_model(prompt, text, max_retries=4):
+    """调用 通义千问 模型（acall_qianwen_model的同步封装）"""
+    return run_sync(acall_qianwen_model(prompt, text, max_retries))
+
+# 严格格式要求的系统提示
+SYSTEM_PROMPT = """请严格按以下格式生成测试用例：
 ### 测试用例[编号]：[测试目标]
 **优先级**：[高/中/低]
 **测试步骤**：
 1. [步骤描述]
 2. [步骤描述]
 **预期结果**：[预期结果描述]"""
-    for attempt in range(max_retries):
-        try:
-            # 构建请求数据
-            request_data = {
-                "model": f"{MODEL_NAME}",  # 使用通义千问最新模型
-                "input": {
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": f"{prompt}\n相关文本：{text}"}
-                    ]
-                },
-                "parameters": {
-                    "temperature": 0.3,  # 降低随机性
-                    "result_format": "message"  # 返回格式为消息
+
+EXTRACT_PROMPT = "请从以下文档中提取所有明确的需求（用编号列表表示）："
+
+TEST_POINT_PROMPT = "为以下需求生成测试点，每个测试点需包含：测试目标、输入条件、预期输出："
+CASE_PROMPT = "将以下测试点转换为详细的测试用例（步骤、预期结果、优先级）："
+
+# 需求提取方式：auto先从API文档中识别接口，识别不到时由模型提取；api只识别接口；model只由模型提取
+EXTRACT_MODES = ["auto", "api", "model"]
+
+# 需求提取的文本块tokens上限：块越小可并发的请求越多，单次回复也越不容易被截断
+EXTRACT_CHUNK_TOKENS = 6000
+# 相邻文本块重叠的tokens数，避免跨块的需求被截断
+EXTRACT_OVERLAP_TOKENS = 300
+# 同时提取需求的文本块数，以及同时生成测试用例的需求数
+EXTRACT_CONCURRENCY = 4
+
+def build_messages(prompt, text):
+    """构建发送给通义千问的消息列表"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"{prompt}\n相关文本：{text}"}
+    ]
+
+async def acall_qianwen_model(prompt, text, max_retries=4):
+    """异步调用 通义千问 模型（增强重试机制）"""
+    content, usage = await AI_CLIENT.acall(
+        "qianwen",
+        build_messages(prompt, text),
+        max_retries=max_retries,
+        temperature=0.3,  # 降低随机性
+        include_usage=True
+    )
+    if content is None:
+        raise Exception("API请求失败超过最大重试次数")
+    
+    return {
+        "choices": [
+            {
+                "message": {
+                    "content": content
                 }
             }
-            
-            # 使用json.dumps确保正确编码
-            import json
-            json_data_str = json.dumps(request_data, ensure_ascii=False)
-            
-            # 使用data参数而不是json参数，并明确指定编码
-            response = requests.post(
-                AI_API_ENDPOINT,
-                headers=headers,
-                data=json_data_str.encode('utf-8'),
-                timeout=50
-            )
-            
-            response.raise_for_status()
-            json_data = response.json()
-            print(f"\n=== API调试信息 ===")
-            print("API响应状态码：", response.status_code)
-            print("API响应内容：", response.text[:200] + "..." if len(response.text) > 200 else response.text)
-            print(f"请求耗时：{response.elapsed.total_seconds():.2f}s")
-            
-            # 打印完整的响应结构，帮助调试
-            print("响应结构:", json.dumps(json_data, ensure_ascii=False, indent=2)[:500] + "..." if len(json.dumps(json_data, ensure_ascii=False, indent=2)) > 500 else json.dumps(json_data, ensure_ascii=False, indent=2))
-            
-            # 通义千问API返回格式与DeepSeek不同，需要调整
-            # 根据实际响应结构提取内容
-            content = ""
-            if "output" in json_data:
-                if "text" in json_data["output"]:
-                    content = json_data["output"]["text"]
-                elif "message" in json_data["output"] and "content" in json_data["output"]["message"]:
-                    content = json_data["output"]["message"]["content"]
-                elif "choices" in json_data and len(json_data["choices"]) > 0:
-                    if "message" in json_data["choices"][0]:
-                        content = json_data["choices"][0]["message"]["content"]
-                    elif "text" in json_data["choices"][0]:
-                        content = json_data["choices"][0]["text"]
-            
-            if not content:
-                print("警告：无法从响应中提取内容，使用原始响应文本")
-                content = response.text
-            
-            return {
-                "choices": [
-                    {
-                        "message": {
-                            "content": content
-                        }
-                    }
-                ],
-                "usage": json_data.get("usage", {})
-            }
-        except requests.exceptions.Timeout:
-            print(f"请求超时，重试中 ({attempt + 1}/{max_retries})...")
-            time.sleep(5)
-        except KeyError as e:
-            print(f"API响应格式错误（找不到键：{str(e)}），重试中 ({attempt + 1}/{max_retries})...")
-            print(f"响应内容: {response.text[:300]}...")
-            time.sleep(5)
+        ],
+        "usage": usage
+    }
+
+def text_budget(prompt):
+    """扣除提示本身后，一次请求中相关文本可用的tokens数"""
+    budget = AI_CLIENT.prompt_budget("qianwen") - estimate_messages_tokens(build_messages(prompt, ""))
+    if budget <= 0:
+        raise Exception("提示本身已超过模型输入上限")
+    return budget
+
+async def acall_qianwen_chunked(prompt, text, max_retries=4):
+    """文本超过模型输入上限时按段落切分，逐段调用后拼接各段生成的内容"""
+    budget = text_budget(prompt)
+    chunks = split_text(text, budget)
+    if len(chunks) > 1:
+        logger.info("文本约 %d tokens，超过模型输入上限 %d tokens，分 %d 段处理", estimate_tokens(text), budget, len(chunks))
+    contents = []
+    for chunk in chunks:
+        response = await acall_qianwen_model(prompt, chunk, max_retries)
+        contents.append(response['choices'][0]['message']['content'])
+    return "\n\n".join(contents)
+
+async def aextract_requirements(pdf_path, concurrency=EXTRACT_CONCURRENCY, pool=None):
+    """map-reduce提取需求，返回合并去重后的需求条目列表
+
+    PDF文本按章节标题切分为相互重叠、不超过EXTRACT_CHUNK_TOKENS的文本块，最多concurrency个块同时请求模型
+    提取需求（map），各块的需求按文档顺序合并并去掉近似重复的条目（reduce）。文本块边读边发，不等整份文档读完。
+    pool为提取页面文本的进程池，见pdf_text.iter_pages。
+    """
+    max_tokens = min(text_budget(EXTRACT_PROMPT), EXTRACT_CHUNK_TOKENS)
+    chunks = iter_chunks(iter_pages(pdf_path, pool=pool), max_tokens, EXTRACT_OVERLAP_TOKENS)
+    results = {}
+
+    async def extract(index, chunk):
+        logger.debug("第 %d 块PDF文本:\n%s", index, chunk)
+        for _ in range(3):
+            try:
+                response = await acall_qianwen_model(EXTRACT_PROMPT, chunk)
+                results[index] = split_requirement_list(response['choices'][0]['message']['content'])
+                return
+            except Exception as e:
+                logger.warning("第 %d 块需求提取失败，重试中... (%s)", index, e)
+                await asyncio.sleep(5)
+        results[index] = []
+
+    pending = set()
+    chunk_count = char_count = 0
+    async for group in aiter_chunks(chunks, concurrency):
+        for chunk in group:
+            # 同时进行的请求不超过concurrency个
+            while len(pending) >= concurrency:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            chunk_count += 1
+            char_count += len(chunk)
+            pending.add(asyncio.create_task(extract(chunk_count, chunk)))
+    if pending:
+        await asyncio.gather(*pending)
+
+    item_lists = [results[index] for index in range(1, chunk_count + 1)]
+    requirements = merge_requirements(item_lists)
+    logger.info("读取PDF文本 %d 字，分 %d 块提取需求 %d 条，合并去重后 %d 条", char_count, chunk_count,
+                sum(len(items) for items in item_lists), len(requirements), extra={"pdf": pdf_path})
+    return requirements
+
+def renumber_test_cases(cases, req_id):
+    """按用例在回复中的顺序重新编号为TC-{需求ID}-NN，与Excel流程的编号规则一致"""
+    for i, case in enumerate(cases, 1):
+        case["用例编号"] = f"TC-{req_id}-{i:02d}"
+    return cases
+
+async def agenerate_for_requirement(req_id, requirement):
+    """单条需求：生成测试点 -> 生成测试用例 -> 解析并重新编号，失败时返回空列表"""
+    with request_context(req_id):
+        test_points = None
+        for _ in range(3):
+            try:
+                test_points = await acall_qianwen_chunked(TEST_POINT_PROMPT, requirement)
+                break
+            except Exception as e:
+                logger.warning("测试点生成失败，重试中... (%s)", e)
+                await asyncio.sleep(5)
+        if test_points is None:
+            logger.error("测试点生成失败，跳过该需求")
+            return []
+        logger.debug("生成的测试点:\n%s", test_points)
+
+        try:
+            content = await acall_qianwen_chunked(CASE_PROMPT, test_points)
         except Exception as e:
-            print(f"API请求异常（{str(e)}），重试中 ({attempt + 1}/{max_retries})...")
-            print(f"异常类型: {type(e).__name__}")
-            # 如果是编码错误，尝试打印部分请求内容进行调试
-            if isinstance(e, UnicodeEncodeError):
-                print(f"编码错误位置: {e.start}-{e.end}, 对象: {e.object[max(0, e.start-10):min(len(e.object), e.end+10)]}")
-            time.sleep(5)
-    raise Exception("API请求失败超过最大重试次数")
-
-def generate_test_cases(pdf_path, output_excel="./PDF生成测试用例/TestCase_Report_v4.xlsx"):
-    """主流程：解析 PDF -> 生成测试用例 -> 返回结构化数据"""
+            logger.error("测试用例生成失败: %s", e)
+            return []
+        logger.debug("生成的测试用例:\n%s", content)
+        cases = parse_test_cases(content)
+        if not cases:
+            logger.warning("未能从回复中解析出测试用例")
+        return renumber_test_cases(cases, req_id)
+
+async def agenerate_test_cases(pdf_path, concurrency=EXTRACT_CONCURRENCY, extract_mode="auto", pool=None):
+    """主流程（异步）：提取需求后，每条需求各自并发生成测试点和测试用例
+
+    extract_mode为api时从API文档中识别接口，每个接口作为一条需求，不调用模型提取需求，识别到的接口边读边处理；
+    model时按map-reduce由模型提取需求；auto先识别接口，一个都没有时再由模型提取。
+    最多concurrency条需求同时处理，已有concurrency条在处理时暂停读取接口；输出按需求顺序排列，编号不受完成先后影响。
+    pool为提取页面文本的进程池，见pdf_text.iter_pages。
+    """
+    if extract_mode not in EXTRACT_MODES:
+        raise ValueError(f"不支持的需求提取方式 '{extract_mode}'，可选：{', '.join(EXTRACT_MODES)}")
+    concurrency = max(1, concurrency or 1)
+    requirements = []
+    tasks = []
+    pending = set()
+
+    async def submit(requirement):
+        nonlocal pending
+        # 同时进行的需求不超过concurrency条，与aextract_requirements提取需求时相同
+        while len(pending) >= concurrency:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        requirements.append(requirement)
+        tasks.append(asyncio.create_task(agenerate_for_requirement(f"REQ{len(requirements):03d}", requirement)))
+        pending.add(tasks[-1])
+
+    if extract_mode != "model":
+        async for endpoints in aiter_chunks(iter_endpoints(iter_pages(pdf_path, pool=pool)), concurrency):
+            for endpoint in endpoints:
+                await submit(endpoint_requirement(endpoint))
+        if requirements:
+            logger.info("识别出 %d 个API接口，按接口生成测试用例，不再由模型提取需求", len(requirements),
+                        extra={"pdf": pdf_path})
+        elif extract_mode == "auto":
+            logger.info("未识别出API接口，由模型提取需求", extra={"pdf": pdf_path})
+        else:
+            logger.warning("未识别出API接口", extra={"pdf": pdf_path})
+    if not requirements and extract_mode != "api":
+        for requirement in await aextract_requirements(pdf_path, concurrency, pool):
+            await submit(requirement)
+    logger.debug("提取的需求:\n%s", format_requirement_list(requirements))
+
+    results = await asyncio.gather(*tasks)
+    test_cases = [case for cases in results for case in cases]
+    logger.info("%d 条需求生成测试用例 %d 条", len(requirements), len(test_cases))
+    return test_cases
+
+def generate_test_cases(pdf_path, output_excel="./PDF生成测试用例/TestCase_Report_v4.xlsx", concurrency=EXTRACT_CONCURRENCY,
+                        extract_mode="auto"):
+    """主流程：解析 PDF -> 提取需求 -> 逐条需求生成测试用例 -> 返回结构化数据"""
     # 确保目录存在
     os.makedirs("./PDF生成测试用例", exist_ok=True)
-    
-    # 1. 提取 PDF 文本
-    text = extract_text_from_pdf(pdf_path)
-    print("读取的pdf文本是----------------------------------\n", text)
-    
-    # 2. 提取需求（添加重试机制）
-    requirements = ""
-    for _ in range(3):
-        try:
-            requirements = call_qianwen_model(
-                "请从以下文档中提取所有明确的需求（用编号列表表示）：",
-                text
-            )['choices'][0]['message']['content']
-            break
-        except Exception as e:
-            print(f"需求提取失败，重试中... ({str(e)})")
-            time.sleep(5)
-    print("提取的需求是----------------------------------\n", requirements)
-    
-    # 3. 生成测试点（添加类型检查）
-    test_points = ""
-    for _ in range(3):
-        try:
-            response = call_qianwen_model(
-                "为以下需求生成测试点，每个测试点需包含：测试目标、输入条件、预期输出：",
-                requirements
-            )
-            if 'choices' in response and len(response['choices']) > 0:
-                test_points = response['choices'][0]['message']['content']
-                break
-        except KeyError:
-            print("响应格式异常，正在重试...")
-            time.sleep(5)
-    print("生成的测试点是---------------------------------\n", test_points)
-    
-    # 4. 生成测试用例（最终必须返回数据）
-    test_cases0 = ""
-    try:
-        response = call_qianwen_model(
-            "将以下测试点转换为详细的测试用例（步骤、预期结果、优先级）：",
-            test_points
-        )
-        test_cases0 = response['choices'][0]['message']['content']
-    except Exception as e:
-        print(f"测试用例生成失败: {str(e)}")
-        return []
-    print("生成的测试用例是--------------------------------\n", test_cases0)
-    
-    # 5. 解析并返回结构化数据
-    return parse_test_cases(test_cases0)  # 直接返回结构化数据
+    # 进程池在进入事件循环前创建，页面文本在asyncio.to_thread的工作线程中读取
+    with page_pool() as pool:
+        return run_sync(agenerate_test_cases(pdf_path, concurrency, extract_mode, pool))
 
 def parse_test_cases(text):
     """
@@ -212,7 +324,7 @@ def parse_test_cases(text):
                     "优先级": priority
                 })
         except Exception as e:
-            print(f"解析用例{case_num_str}时出错：{str(e)}")
+            logger.warning("解析用例%s时出错：%s", case_num_str, e)
             continue
     return test_cases
 
@@ -247,13 +359,19 @@ def export_to_excel(data, filename):
                 cell.alignment = Alignment(wrap_text=True, vertical='top')
 
 if __name__ == "__main__":
+    # 日志级别和格式由环境变量AI_LOG_LEVEL、AI_LOG_FORMAT指定
+    configure_logging()
+    set_run_id(new_run_id())
     # 检查API密钥
     if not AI_API_KEY:
-        print("错误：未设置AI_API_KEY环境变量，请在.env文件中添加或设置环境变量")
+        logger.error("未设置AI_API_KEY环境变量，请在.env文件中添加或设置环境变量")
         exit(1)
         
-    # 生成结构化数据
-    test_case_data = generate_test_cases("./需求文档/API文档示例.pdf")
+    # 生成结构化数据，每次模型调用记入台账（默认./.usage/ledger.db）
+    pdf_path = "./需求文档/API文档示例.pdf"
+    AI_CLIENT.ledger = UsageLedger(input_file=pdf_path)
+    test_case_data = generate_test_cases(pdf_path)
+    AI_CLIENT.ledger.close()
     # 检查有效数据
     if test_case_data and len(test_case_data) > 0:
         # 添加文件存在性检查
@@ -263,4 +381,5 @@ if __name__ == "__main__":
         export_to_excel(test_case_data, output_file)
         print(f"成功生成 {len(test_case_data)} 条用例")
     else:
-        print("错误：未生成有效测试用例数据")
\ No newline at end of file
+        logger.error("未生成有效测试用例数据")
+    AI_CLIENT.report_token_stats()
\ No newline at end of file
@@ -0,0 +1,50 @@
+import re
+from near_duplicates import NearDuplicateFinder
+
+# 合并各文本块提取出的需求时，相似度达到该阈值视为同一条需求
+MERGE_THRESHOLD = 0.85
+
+# 编号列表项：1. / 1、/ 1) / (1) / （1） / - / * / •
+_ITEM_PATTERN = re.compile(r'^\s*(?:\d+(?:\.\d+)*[.、．)）]|[（(]\d+[）)]|[-*•·])\s*(.+)$')
+
+
+def split_requirement_list(text):
+    """把模型返回的编号列表拆成需求条目列表
+
+    每个编号或项目符号开头的行为一条需求，其后缩进的续行并入该条；列表前后的说明文字和标题忽略。
+    """
+    items = []
+    continuing = False
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        match = _ITEM_PATTERN.match(line)
+        if match:
+            items.append(match.group(1).replace("**", "").strip())
+            continuing = True
+        elif continuing and line[:1].isspace():
+            items[-1] += " " + line.replace("**", "").strip()
+        else:
+            continuing = False
+    return [item for item in items if item]
+
+
+def merge_requirements(item_lists, threshold=MERGE_THRESHOLD):
+    """按文本块顺序合并各块的需求条目，去掉近似重复的条目
+
+    相邻文本块的重叠部分常被重复提取，表述略有差异；重复的条目保留首次出现的位置，文字取较详细（较长）的一条。
+    """
+    finder = NearDuplicateFinder(threshold)
+    merged = []
+    for items in item_lists:
+        unique, duplicates = finder.split([{"标题": item} for item in items])
+        merged.extend(unique)
+        for duplicate, first in duplicates:
+            if len(duplicate["标题"]) > len(first["标题"]):
+                first["标题"] = duplicate["标题"]
+    return [req["标题"] for req in merged]
+
+
+def format_requirement_list(items):
+    """重新编号为"1. xxx"形式的需求列表文本"""
+    return "\n".join(f"{i}. {item}" for i, item in enumerate(items, 1))
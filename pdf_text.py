@@ -0,0 +1,297 @@
+import os
+import re
+import json
+import gzip
+import math
+import time
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import PyPDF2
+from metrics import METRICS
+from prompt_packing import estimate_tokens
+from token_budget import split_text
+from structured_log import get_logger
+
+logger = get_logger("pdf_text")
+
+# 默认页面文本缓存目录
+DEFAULT_PAGE_CACHE_DIR = "./.cache/pdf_pages"
+
+# 窗口内未缓存的页数不超过该值时在当前进程中提取，避免启动进程池的开销
+SERIAL_PAGE_LIMIT = 8
+
+# 章节标题：Markdown标题、第X章/节、中文序号、（一）、1. / 1.2 等编号
+_HEADING_PATTERN = re.compile(
+    r'^(?:#{1,6}\s*\S|第[一二三四五六七八九十百零\d]+[章节篇部分]|[一二三四五六七八九十]+[、.．]'
+    r'|[（(][一二三四五六七八九十]+[）)]|\d+(?:\.\d+)*(?:[.、．]\s*|\s+)[^\d\s])'
+)
+_SENTENCE_ENDINGS = ("。", "；", ";", "，", ",", "：", ":")
+HEADING_MAX_CHARS = 40
+
+# 逐页读取时每个窗口的页数，窗口内未缓存的页面分给各工作进程并行提取
+PAGE_WINDOW = 32
+
+
+def file_digest(pdf_path):
+    """计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _update_resources(digest, resources, seen):
+    """把资源字典中的字体（含ToUnicode映射）和Form XObject写入摘要
+
+    Form XObject的内容流同样会被提取出文本，递归写入其内容流、变换矩阵和自身的资源；
+    seen记录已写入的XObject，避免引用成环时无限递归。
+    """
+    if resources is None:
+        return
+    resources = resources.get_object()
+    fonts = resources.get("/Font")
+    if fonts is not None:
+        fonts = fonts.get_object()
+        for name in sorted(fonts):
+            font = fonts[name].get_object()
+            digest.update(f"{name} {font.get('/BaseFont')} {font.get('/Encoding')}".encode())
+            to_unicode = font.get("/ToUnicode")
+            if to_unicode is not None:
+                digest.update(to_unicode.get_object().get_data())
+    xobjects = resources.get("/XObject")
+    if xobjects is not None:
+        xobjects = xobjects.get_object()
+        for name in sorted(xobjects):
+            reference = xobjects[name]
+            xobject = reference.get_object()
+            if xobject.get("/Subtype") != "/Form":
+                continue
+            key = (reference.idnum, reference.generation) if hasattr(reference, "idnum") else id(xobject)
+            digest.update(f"{name} {key in seen} {xobject.get('/Matrix')}".encode())
+            if key in seen:
+                continue
+            seen.add(key)
+            digest.update(xobject.get_data())
+            _update_resources(digest, xobject.get("/Resources"), seen)
+
+
+def page_fingerprint(page):
+    """页面内容流、所用字体（含ToUnicode映射）及Form XObject（递归）的哈希，决定页面提取出的文本
+
+    PDF局部修改后未改动页面的指纹不变，可以直接复用缓存。
+    """
+    digest = hashlib.sha256(f"PyPDF2 {PyPDF2.__version__}".encode())
+    contents = page.get_contents()
+    if contents is not None:
+        digest.update(contents.get_data())
+    _update_resources(digest, page.get("/Resources"), set())
+    return digest.hexdigest()
+
+
+# 工作进程中已打开的PDF：(路径, PdfReader)，同一进程处理后续页面块时不再重新解析
+_worker_reader = None
+
+
+def _extract_pages(pdf_path, indices):
+    """工作进程中提取指定页的文本"""
+    global _worker_reader
+    if _worker_reader is None or _worker_reader[0] != pdf_path:
+        _worker_reader = (pdf_path, PyPDF2.PdfReader(pdf_path))
+    reader = _worker_reader[1]
+    return [reader.pages[index].extract_text() for index in indices]
+
+
+def page_pool(workers=None):
+    """创建提取页面文本的进程池（workers默认为CPU核数）
+
+    使用spawn方式启动工作进程：调用方通常已运行事件循环线程和asyncio.to_thread工作线程，
+    在多线程进程中fork可能复制被其他线程持有的锁而死锁。
+    """
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                               mp_context=multiprocessing.get_context("spawn"))
+
+
+class PageTextCache:
+    """PDF页面文本的磁盘缓存
+
+    两级缓存：文档级条目以文件内容哈希为键，记录每页的指纹，文件未改动时无需解析PDF即可读出全部页面；
+    页面级条目以页面指纹为键，PDF局部修改后只有指纹变化的页面需要重新提取。条目gzip压缩存储。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_PAGE_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, kind, key):
+        return os.path.join(self.cache_dir, kind, key[:2], f"{key}.json.gz")
+
+    def _read(self, kind, key):
+        try:
+            with gzip.open(self._path(kind, key), "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, kind, key, value):
+        path = self._path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(gzip.compress(json.dumps(value, ensure_ascii=False).encode('utf-8')))
+        os.replace(tmp_path, path)
+
+    def get_fingerprints(self, file_hash):
+        """返回文档各页的指纹列表，文档未缓存时返回None"""
+        return self._read("documents", file_hash)
+
+    def put_document(self, file_hash, fingerprints):
+        self._write("documents", file_hash, fingerprints)
+
+    def get_page(self, fingerprint):
+        return self._read("pages", fingerprint)
+
+    def put_page(self, fingerprint, text):
+        self._write("pages", fingerprint, text)
+
+
+def iter_pages(pdf_path, workers=None, cache_dir=DEFAULT_PAGE_CACHE_DIR, window=PAGE_WINDOW, pool=None):
+    """逐页产出PDF文本，内存中最多保留两个窗口（正在产出的窗口和预取的下一窗口）的页面
+
+    每个窗口中未缓存的页面分块交给进程池并行提取（workers默认为CPU核数），产出当前窗口时下一窗口已在提取；
+    未缓存的页面较少时在当前进程中提取。cache_dir为None时不使用缓存。
+    pool为调用方用page_pool创建的进程池，在事件循环等线程启动前创建并由调用方关闭；为None时需要时自行创建。
+    """
+    cache = PageTextCache(cache_dir) if cache_dir else None
+    file_hash = file_digest(pdf_path) if cache else None
+    # 文档已缓存时直接使用记录的页面指纹，只有页面条目缺失时才解析PDF
+    known = cache.get_fingerprints(file_hash) if cache else None
+    reader = PyPDF2.PdfReader(pdf_path) if known is None else None
+    page_count = len(known) if known is not None else len(reader.pages)
+    workers = workers or os.cpu_count() or 1
+    owns_pool = pool is None
+    fingerprints = []
+    cached = 0
+
+    def fingerprint(index):
+        if known is not None:
+            return known[index]
+        try:
+            return page_fingerprint(reader.pages[index])
+        except Exception as e:
+            # 结构异常的页面退化为按文件哈希和页码缓存
+            logger.debug("计算第 %d 页指纹失败，按页码缓存: %s", index + 1, e)
+            return hashlib.sha256(f"{file_hash}:{index}".encode()).hexdigest()
+
+    def submit(start):
+        """查缓存并开始提取从start起一个窗口的页面"""
+        nonlocal reader, pool, cached
+        entries = []
+        for index in range(start, min(start + window, page_count)):
+            key = fingerprint(index) if cache else None
+            entries.append([key, cache.get_page(key) if cache else None])
+        missing = [start + offset for offset, (_, text) in enumerate(entries) if text is None]
+        cached += len(entries) - len(missing)
+        jobs = []
+        if missing and (len(missing) <= SERIAL_PAGE_LIMIT or workers == 1):
+            reader = reader or PyPDF2.PdfReader(pdf_path)
+            for index in missing:
+                entries[index - start][1] = reader.pages[index].extract_text()
+        elif missing:
+            pool = pool or page_pool(workers)
+            size = math.ceil(len(missing) / workers)
+            for offset in range(0, len(missing), size):
+                chunk = missing[offset:offset + size]
+                jobs.append((chunk, pool.submit(_extract_pages, pdf_path, chunk)))
+        return start, entries, missing, jobs
+
+    def resolve(start, entries, missing, jobs):
+        for chunk, future in jobs:
+            for index, text in zip(chunk, future.result()):
+                entries[index - start][1] = text
+        if cache:
+            for index in missing:
+                cache.put_page(*entries[index - start])
+        return entries
+
+    read_seconds = 0.0
+    started = time.perf_counter()
+    try:
+        current = submit(0) if page_count else None
+        while current:
+            following = current[0] + window
+            upcoming = submit(following) if following < page_count else None
+            for key, text in resolve(*current):
+                fingerprints.append(key)
+                # 只统计读取耗时，不含调用方处理已产出页面的时间
+                read_seconds += time.perf_counter() - started
+                yield text
+                started = time.perf_counter()
+            current = upcoming
+        if cache and known is None:
+            cache.put_document(file_hash, fingerprints)
+        logger.info("提取PDF文本 %d 页，其中 %d 页来自缓存", page_count, cached, extra={"pdf": pdf_path})
+    finally:
+        if pool and owns_pool:
+            pool.shutdown(cancel_futures=True)
+        read_seconds += time.perf_counter() - started
+        METRICS.observe("stage_duration_seconds", read_seconds, stage="pdf_read", model="")
+
+
+def extract_pages(pdf_path, workers=None, cache_dir=DEFAULT_PAGE_CACHE_DIR, pool=None):
+    """按页提取PDF文本，返回各页文本的列表"""
+    return list(iter_pages(pdf_path, workers, cache_dir, pool=pool))
+
+
+def is_heading(line):
+    """判断一行是否像章节标题：Markdown标题、"第X章"、"一、"、"（一）"或"1."/"1.2"等编号开头的短行"""
+    line = line.strip()
+    return (0 < len(line) <= HEADING_MAX_CHARS and not line.endswith(_SENTENCE_ENDINGS)
+            and _HEADING_PATTERN.match(line) is not None)
+
+
+def iter_chunks(pages, max_tokens, overlap_tokens=0):
+    """把逐页文本切分为估算不超过max_tokens的文本块，逐块产出
+
+    优先在章节标题处断开，使一个章节尽量完整地落在同一块中；章节超过上限时按split_text切分。
+    overlap_tokens大于0时，每块开头重复上一块末尾不超过该tokens数的若干行，避免跨块的内容被截断。
+    页面之间按换行连接；内存中只保留正在处理的章节和文本块。
+    """
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    chunk, chunk_tokens = [], 0
+
+    def tail(lines):
+        """上一块末尾用作重叠的行"""
+        kept, size = [], 0
+        for line in reversed(lines):
+            size += estimate_tokens(line) + 1
+            if size > overlap_tokens:
+                break
+            kept.append(line)
+        return kept[::-1]
+
+    def add(section):
+        nonlocal chunk, chunk_tokens
+        # 每段不超过扣除重叠部分后的上限，接在重叠行之后也不会超过max_tokens
+        for piece in split_text(section, max_tokens - overlap_tokens):
+            lines = piece.split("\n")
+            size = sum(estimate_tokens(line) + 1 for line in lines)
+            if chunk and chunk_tokens + size > max_tokens:
+                yield "\n".join(chunk)
+                chunk = tail(chunk) if overlap_tokens else []
+                chunk_tokens = sum(estimate_tokens(line) + 1 for line in chunk)
+            chunk.extend(lines)
+            chunk_tokens += size
+
+    section, section_tokens = [], 0
+    for text in pages:
+        for line in text.split("\n"):
+            if section and (is_heading(line) or section_tokens > max_tokens):
+                yield from add("\n".join(section))
+                section, section_tokens = [], 0
+            section.append(line)
+            section_tokens += estimate_tokens(line) + 1
+    if section:
+        yield from add("\n".join(section))
+    if "".join(chunk).strip():
+        yield "\n".join(chunk)
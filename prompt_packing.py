@@ -0,0 +1,56 @@
+import re
+
+# 打包提示中每条需求输出分节的标题格式
+SECTION_HEADER = "## 需求ID: {req_id}"
+
+_SECTION_PATTERN = re.compile(r'^\s*#{1,3}\s*需求ID\s*[:：]\s*(.+?)\s*$', re.MULTILINE)
+
+
+def estimate_tokens(text):
+    """粗略估算文本的tokens数：中日韩字符按1个计，其余字符按4个字符1个计"""
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if '⺀' <= ch <= '鿿' or '豈' <= ch <= '﫿')
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def pack_requirements(requirements, max_items=1, max_tokens=0, size_fn=estimate_tokens):
+    """把需求按条数上限和tokens预算贪心分批
+
+    max_items为0表示不限条数，max_tokens为0表示不限tokens；单条需求超过预算时独占一批。
+    size_fn接收单条需求，返回其在提示中占用的tokens数。
+    """
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for req in requirements:
+        tokens = size_fn(req) if max_tokens else 0
+        full = (max_items and len(batch) >= max_items) or \
+               (max_tokens and batch and batch_tokens + tokens > max_tokens)
+        if full:
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(req)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def split_packed_response(text, req_ids):
+    """按"## 需求ID: xxx"分节拆分打包响应，返回 需求ID -> 该节文本
+
+    只保留req_ids中的需求；同一ID出现多次时合并各节内容，缺失的ID不会出现在结果中。
+    """
+    wanted = {str(req_id) for req_id in req_ids}
+    sections = {}
+    matches = list(_SECTION_PATTERN.finditer(text or ""))
+    for idx, match in enumerate(matches):
+        req_id = match.group(1).strip().strip('*`[]【】')
+        if req_id not in wanted:
+            continue
+        end = matches[idx + 1].start() if idx + 1 < len(matches) else len(text)
+        body = text[match.end():end].strip()
+        if body:
+            sections[req_id] = f"{sections[req_id]}\n\n{body}" if req_id in sections else body
+    return sections
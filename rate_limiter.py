@@ -0,0 +1,112 @@
+import math
+import time
+import asyncio
+from email.utils import parsedate_to_datetime
+
+
+class TokenBucket:
+    """按分钟配额匀速补充的令牌桶
+
+    允许预支：reserve()会立即扣减令牌并返回需要等待的秒数，因此并发请求按到达顺序
+    排队，吞吐量稳定在配额上限，而不是集中放行后再一起等待。
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        """扣减amount个令牌，返回令牌余额恢复为非负前需要等待的秒数"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= amount
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, delta):
+        """按实际用量修正余额（delta为正表示多扣）"""
+        self._refill(time.monotonic())
+        self.tokens -= delta
+
+
+class RateLimiter:
+    """单个模型的请求数/令牌数限流器
+
+    rpm、tpm为0表示不限制；收到429时通过block_for()让该模型的所有请求统一暂停，
+    避免并发请求在配额耗尽后连续触发429。
+    """
+
+    def __init__(self, rpm=0, tpm=0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.request_bucket = TokenBucket(rpm) if rpm > 0 else None
+        self.token_bucket = TokenBucket(tpm) if tpm > 0 else None
+        self.blocked_until = 0.0
+        self.avg_tokens = 0.0  # 近期每次请求消耗tokens的滑动平均，用于请求前预估
+        self.throttled = 0
+        self.waited_seconds = 0.0
+
+    async def acquire(self, estimated_tokens=0):
+        """等待直到允许发出下一个请求，返回本次预扣的tokens数
+
+        按近期实际用量的滑动平均预扣tokens；尚无实际用量（如第一批并发请求）时按estimated_tokens
+        （请求前估算的输入tokens加输出上限）预扣，避免首批请求绕过TPM限制。
+        """
+        while True:
+            delay = self.blocked_until - time.monotonic()
+            if delay <= 0:
+                break
+            self.waited_seconds += delay
+            await asyncio.sleep(delay)
+
+        estimated = int(self.avg_tokens) or int(estimated_tokens)
+        wait = 0.0
+        if self.request_bucket:
+            wait = max(wait, self.request_bucket.reserve(1))
+        if self.token_bucket and estimated:
+            wait = max(wait, self.token_bucket.reserve(estimated))
+        if wait > 0:
+            self.waited_seconds += wait
+            await asyncio.sleep(wait)
+        return estimated
+
+    def record_usage(self, total_tokens, estimated):
+        """用响应中的usage.total_tokens修正令牌桶，并更新预估值"""
+        if not total_tokens:
+            return
+        if self.token_bucket:
+            self.token_bucket.adjust(total_tokens - estimated)
+        self.avg_tokens = total_tokens if not self.avg_tokens else 0.8 * self.avg_tokens + 0.2 * total_tokens
+
+    def block_for(self, seconds):
+        """在seconds秒内暂停该模型的所有请求"""
+        self.throttled += 1
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+def parse_retry_after(value, max_seconds=None):
+    """解析Retry-After响应头（秒数或HTTP日期），无法解析时返回None
+
+    "inf"、"nan"等非有限值视为无法解析；max_seconds不为None时等待时间不超过该值，
+    避免异常的响应头让模型长时间暂停。
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        seconds = retry_at.timestamp() - time.time()
+    if not math.isfinite(seconds):
+        return None
+    seconds = max(0.0, seconds)
+    return min(seconds, float(max_seconds)) if max_seconds is not None else seconds
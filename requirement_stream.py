@@ -0,0 +1,94 @@
+import time
+import asyncio
+import itertools
+from openpyxl import load_workbook
+from metrics import METRICS
+from structured_log import get_logger
+
+logger = get_logger("requirement_stream")
+
+REQUIRED_COLUMNS = ["标题", "详细描述"]
+
+# 迭代器形式的需求每次在线程中读取的条数：块越小第一条需求越早开始请求
+READ_CHUNK_ROWS = 64
+
+
+def requirement_defaults(default_config):
+    """需求表缺少某列（或单元格为空）时使用的默认值，与read_excel_requirements一致"""
+    return {
+        "优先级": "中",
+        "父需求": "",
+        "需求分类": default_config["需求分类"],
+        "迭代": default_config["迭代"],
+        "处理人": default_config["处理人"]
+    }
+
+
+def stream_excel_requirements(file_path, default_config, collect=None):
+    """以openpyxl只读模式逐行读取Excel需求文档（第一个工作表），逐条产出需求字典
+
+    不把整张表载入内存，调用方可以边读边处理。字段与read_excel_requirements相同：缺少需求ID时
+    按行号生成REQ001、REQ002…，优先级、父需求、需求分类、迭代、处理人缺失或为空时取默认值，
+    其余空单元格为空字符串；全空的行跳过。collect不为None时每条需求同时追加到该列表。
+    文件无法读取或缺少必要的列时记录错误并停止产出。
+    """
+    defaults = requirement_defaults(default_config)
+    read_seconds = 0.0
+    started = time.perf_counter()
+    try:
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+    except Exception as e:
+        logger.error("读取Excel文件失败: %s", e)
+        return
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        columns = [str(name) if name is not None else None for name in header]
+        missing_columns = [col for col in REQUIRED_COLUMNS if col not in columns]
+        if missing_columns:
+            logger.error("Excel文件缺少必要的列: %s", ', '.join(missing_columns))
+            return
+
+        count = 0
+        for values in rows:
+            if all(value is None for value in values):
+                continue
+            req = {name: ("" if value is None else value) for name, value in zip(columns, values) if name}
+            count += 1
+            if req.get("需求ID") in (None, ""):
+                req["需求ID"] = f"REQ{count:03d}"
+            for key, value in defaults.items():
+                if req.get(key) in (None, ""):
+                    req[key] = value
+            if collect is not None:
+                collect.append(req)
+            # 只统计读取耗时，不含调用方处理已产出需求的时间
+            read_seconds += time.perf_counter() - started
+            started = None
+            yield req
+            started = time.perf_counter()
+    except Exception as e:
+        logger.error("读取Excel文件失败: %s", e)
+    finally:
+        workbook.close()
+        if started is not None:
+            read_seconds += time.perf_counter() - started
+        METRICS.observe("stage_duration_seconds", read_seconds, stage="excel_read", model="")
+
+
+async def aiter_chunks(requirements, size=READ_CHUNK_ROWS):
+    """按块异步产出需求列表
+
+    列表或元组整体作为一块；其他可迭代对象（如stream_excel_requirements）在线程中每次读取size条，
+    读取期间事件循环继续处理已经发出的请求。
+    """
+    if isinstance(requirements, (list, tuple)):
+        if requirements:
+            yield list(requirements)
+        return
+    iterator = iter(requirements)
+    while True:
+        chunk = await asyncio.to_thread(lambda: list(itertools.islice(iterator, size)))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,151 @@
+import os
+import json
+import gzip
+import hashlib
+import threading
+
+CACHE_MODES = ("off", "read", "write", "readwrite")
+
+# 默认缓存目录与容量上限
+DEFAULT_CACHE_DIR = "./.cache/responses"
+DEFAULT_CACHE_MAX_MB = 512
+
+
+class ResponseCache:
+    """按内容寻址的模型响应磁盘缓存
+
+    缓存键为模型名称、实际请求payload（消息与temperature）及端点的SHA-256，
+    每条响应gzip压缩后单独存为一个文件；总大小超过上限时按最近访问时间淘汰（LRU）。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_mb=DEFAULT_CACHE_MAX_MB, mode="readwrite"):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"不支持的缓存模式 '{mode}'，可选：{', '.join(CACHE_MODES)}")
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._index = None  # 路径 -> [大小, 最近访问时间]
+        self._total_bytes = 0
+
+    @property
+    def readable(self):
+        return self.mode in ("read", "readwrite")
+
+    @property
+    def writable(self):
+        return self.mode in ("write", "readwrite")
+
+    @staticmethod
+    def make_key(model_name, endpoint, payload):
+        """根据模型名称、端点和payload计算缓存键"""
+        raw = json.dumps(
+            {"model": model_name, "endpoint": endpoint, "payload": payload},
+            ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json.gz")
+
+    def _load_index(self):
+        """首次使用时扫描缓存目录，建立大小与访问时间索引"""
+        if self._index is not None:
+            return
+        self._index = {}
+        self._total_bytes = 0
+        if not os.path.isdir(self.cache_dir):
+            return
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json.gz"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                self._index[path] = [st.st_size, st.st_mtime]
+                self._total_bytes += st.st_size
+
+    def get(self, key):
+        """读取缓存，未命中返回None"""
+        if not self.readable:
+            return None
+        path = self._path(key)
+        with self._lock:
+            self._load_index()
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+            # 更新访问时间，作为LRU淘汰依据
+            try:
+                os.utime(path, None)
+                if path in self._index:
+                    self._index[path][1] = os.stat(path).st_mtime
+            except OSError:
+                pass
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """写入缓存，并在超过容量上限时淘汰最久未访问的条目"""
+        if not self.writable:
+            return
+        path = self._path(key)
+        data = gzip.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+        with self._lock:
+            self._load_index()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            old = self._index.get(path)
+            if old:
+                self._total_bytes -= old[0]
+            st = os.stat(path)
+            self._index[path] = [st.st_size, st.st_mtime]
+            self._total_bytes += st.st_size
+            self.writes += 1
+            self._evict()
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        for path, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            del self._index[path]
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def get_stats(self):
+        """返回缓存命中统计"""
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions
+        }
+
+    def report(self):
+        """打印缓存命中统计"""
+        stats = self.get_stats()
+        print(f"响应缓存（{stats['mode']}）：命中 {stats['hits']} 次，未命中 {stats['misses']} 次，"
+              f"命中率 {stats['hit_rate'] * 100:.1f}%，写入 {stats['writes']} 条，淘汰 {stats['evictions']} 条")
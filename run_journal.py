@@ -0,0 +1,108 @@
+import os
+import json
+import time
+from structured_log import get_logger
+
+logger = get_logger("run_journal")
+
+DEFAULT_JOURNAL_DIR = "./.journal"
+
+
+def new_run_id():
+    """生成运行ID（时间戳），同时用作输出文件名中的时间戳"""
+    return time.strftime("%Y%m%d_%H%M%S")
+
+
+def json_default(value):
+    """json.dumps的default参数：把pandas读出的numpy标量等转换为原生类型"""
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+class RunJournal:
+    """生成过程的追加式日志，用于中断后续跑
+
+    每完成一条需求追加一行JSON（原始回复及解析出的用例），写入后立即fsync，
+    进程崩溃最多丢失正在写入的一行；--resume时跳过日志中已完成的需求，
+    最终导出从日志重建。
+    """
+
+    def __init__(self, run_id, journal_dir=DEFAULT_JOURNAL_DIR):
+        self.run_id = run_id
+        self.path = os.path.join(journal_dir, f"{run_id}.jsonl")
+        self.meta = {}
+        self.entries = {}  # 需求ID -> 日志记录
+        os.makedirs(journal_dir, exist_ok=True)
+        self._load()
+        self._file = open(self.path, "a", encoding="utf-8")
+        # 上次崩溃时可能留下不完整的末行，先补换行避免与新记录粘连
+        if self._file.tell() and not self._ends_with_newline():
+            self._file.write("\n")
+
+    @property
+    def exists(self):
+        return bool(self.meta or self.entries)
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        skipped = 0
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    skipped += 1
+                    continue
+                if record.get("type") == "run":
+                    self.meta = record
+                elif record.get("type") == "requirement":
+                    self.entries[record["req_id"]] = record
+        if skipped:
+            logger.warning("日志 %s 中有 %d 行不完整，已忽略", self.path, skipped)
+
+    def _append(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False, default=json_default) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def start(self, **meta):
+        """记录本次运行的参数（续跑时不重复记录）"""
+        if not self.meta:
+            self.meta = dict(type="run", run_id=self.run_id, started_at=time.time(), **meta)
+            self._append(self.meta)
+
+    def is_done(self, req_id):
+        return str(req_id) in self.entries
+
+    def record(self, req_id, response, cases):
+        """记录一条已完成需求的原始回复和解析结果"""
+        entry = {
+            "type": "requirement",
+            "req_id": str(req_id),
+            "response": response,
+            "cases": cases,
+            "finished_at": time.time()
+        }
+        self._append(entry)
+        self.entries[entry["req_id"]] = entry
+
+    def cases_for(self, requirements):
+        """按需求顺序从日志重建全部测试用例"""
+        all_cases = []
+        for req in requirements:
+            entry = self.entries.get(str(req["需求ID"]))
+            if entry:
+                all_cases.extend(entry["cases"])
+        return all_cases
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,109 @@
+import os
+import sys
+import json
+import logging
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# 所有模块的日志记录器都挂在该名称下，configure_logging只配置这一棵子树
+ROOT_LOGGER = "aitestsuite"
+
+LOG_FORMATS = ["json", "text"]
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+
+# 运行ID和需求ID随asyncio任务自动传递，并发处理的需求各自带上自己的需求ID
+RUN_ID = contextvars.ContextVar("run_id", default=None)
+REQ_ID = contextvars.ContextVar("req_id", default=None)
+
+# LogRecord自带的属性，其余属性视为通过extra传入的结构化字段
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "run_id", "req_id"}
+
+
+def get_logger(name):
+    """返回挂在aitestsuite下的日志记录器，name一般为模块名"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def set_run_id(run_id):
+    """设置当前运行ID，之后的日志（包括后台事件循环中执行的请求）都带上该ID"""
+    RUN_ID.set(str(run_id) if run_id is not None else None)
+
+
+@contextmanager
+def request_context(req_id):
+    """在with块内的日志中带上需求ID"""
+    token = REQ_ID.set(str(req_id) if req_id is not None else None)
+    try:
+        yield
+    finally:
+        REQ_ID.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """把上下文中的运行ID和需求ID写入日志记录"""
+
+    def filter(self, record):
+        record.run_id = RUN_ID.get()
+        record.req_id = REQ_ID.get()
+        return True
+
+
+def _extra_fields(record):
+    return {key: value for key, value in vars(record).items()
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_")}
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON：时间、级别、记录器、消息、运行ID、需求ID及extra字段"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "run_id": getattr(record, "run_id", None),
+            "req_id": getattr(record, "req_id", None)
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """便于终端阅读的单行文本格式，extra字段以key=value附在消息之后"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(message)s", datefmt="%H:%M:%S")
+
+    def format(self, record):
+        text = super().format(record)
+        context = " ".join(f"{key}={value}" for key, value in
+                           [("run_id", getattr(record, "run_id", None)), ("req_id", getattr(record, "req_id", None))]
+                           + list(_extra_fields(record).items()) if value is not None)
+        return f"{text} [{context}]" if context else text
+
+
+def configure_logging(level=None, fmt=None, stream=None):
+    """配置日志级别和格式，输出到stderr（标准输出留给命令行的结果信息）
+
+    未指定时分别读取环境变量AI_LOG_LEVEL（默认INFO）和AI_LOG_FORMAT（默认json）。可重复调用，后一次覆盖前一次。
+    """
+    level = (level or os.getenv("AI_LOG_LEVEL") or "INFO").upper()
+    fmt = (fmt or os.getenv("AI_LOG_FORMAT") or "json").lower()
+    if fmt not in LOG_FORMATS:
+        raise ValueError(f"不支持的日志格式: {fmt}，可选：{', '.join(LOG_FORMATS)}")
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    handler.addFilter(ContextFilter())
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    for old in list(logger.handlers):
+        logger.removeHandler(old)
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
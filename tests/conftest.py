@@ -0,0 +1,42 @@
+import os
+import sys
+import httpx
+import pytest
+
+# 被测模块都在仓库根目录下，直接以模块名导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_client import AIClient
+
+
+def _model_config(name, overrides):
+    config = {
+        "api_key_env": "TEST_API_KEY",
+        "endpoint": f"http://{name}.test/v1/chat/completions",
+        "stream_format": "openai",
+        "headers": lambda key: {"Authorization": f"Bearer {key}"},
+        "payload": lambda messages, temperature: {"model": name, "messages": messages, "temperature": temperature},
+        "response_parser": lambda data: data["choices"][0]["message"]["content"]
+    }
+    config.update(overrides)
+    return config
+
+
+@pytest.fixture
+def make_client(monkeypatch):
+    """构造请求发往httpx.MockTransport的AIClient
+
+    handler(request)返回httpx.Response，按request.url.host（即模型名）区分模型；
+    configs为{模型名: 覆盖的配置项}，第一个模型为默认模型。
+    """
+    monkeypatch.setenv("TEST_API_KEY", "test-key")
+
+    def make(handler, configs=None):
+        configs = configs or {"primary": {}}
+        client = AIClient({name: _model_config(name, overrides) for name, overrides in configs.items()},
+                          next(iter(configs)))
+        transport = httpx.MockTransport(handler)
+        client._get_client = lambda model_name, model_config: httpx.AsyncClient(transport=transport)
+        return client
+
+    return make
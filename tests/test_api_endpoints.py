@@ -0,0 +1,81 @@
+from api_endpoints import MAX_FIELD_ITEMS, endpoint_requirement, iter_endpoints
+
+API_DOC = """接口文档
+一、概述
+本文档描述用户服务的接口，所有接口返回JSON。
+1. 用户注册接口
+接口描述：注册新用户
+请求方式：POST
+请求URL：/api/v1/users
+请求头：Content-Type: application/json
+请求参数：
+1. phone: 手机号，必填
+2. password: 密码，必填
+返回结果：
+- code: 状态码
+- data: 用户信息
+"""
+
+SECOND_PAGE = """2. 查询用户
+GET /api/v1/users/{id}
+POST /api/v1/users/{id}/disable
+3. 修改密码
+请求URL：PUT https://example.com/api/v1/password
+参数：
+- old_password
+- new_password
+"""
+
+
+def test_labelled_endpoint():
+    endpoints = list(iter_endpoints([API_DOC]))
+    assert endpoints == [{
+        "名称": "用户注册接口",
+        "描述": "注册新用户",
+        "方法": "POST",
+        "路径": "/api/v1/users",
+        "请求头": ["Content-Type: application/json"],
+        "请求参数": ["phone: 手机号，必填", "password: 密码，必填"],
+        "返回结果": ["code: 状态码", "data: 用户信息"]
+    }]
+
+
+def test_request_lines_across_pages():
+    endpoints = list(iter_endpoints([API_DOC, SECOND_PAGE]))
+    assert [(endpoint["方法"], endpoint["路径"]) for endpoint in endpoints] == [
+        ("POST", "/api/v1/users"),
+        ("GET", "/api/v1/users/{id}"),
+        ("POST", "/api/v1/users/{id}/disable"),
+        ("PUT", "https://example.com/api/v1/password"),
+    ]
+    # 同一章节中的第二个请求行没有单独的标题
+    assert [endpoint["名称"] for endpoint in endpoints] == ["用户注册接口", "查询用户", "", "修改密码"]
+    assert endpoints[3]["请求参数"] == ["old_password", "new_password"]
+
+
+def test_sections_without_method_or_path_are_skipped():
+    text = "1. 概述\n请求方式：POST\n2. 附录\n请求URL：/api/v1/unused\n正文中的POST请求说明"
+    assert list(iter_endpoints([text])) == []
+
+
+def test_lowercase_parameter_names_are_not_labels():
+    text = "1. 上传文件\n请求方式：post\n请求URL：/api/files\n请求参数：\npath: 文件路径\ndescription: 说明"
+    endpoint = next(iter_endpoints([text]))
+    assert endpoint["方法"] == "POST"
+    assert endpoint["请求参数"] == ["path: 文件路径", "description: 说明"]
+
+
+def test_list_fields_are_capped():
+    text = "1. 批量接口\nGET /api/batch\n返回结果：\n" + "\n".join(f"- field{i}" for i in range(50))
+    assert len(next(iter_endpoints([text]))["返回结果"]) == MAX_FIELD_ITEMS
+
+
+def test_endpoint_requirement():
+    endpoint = next(iter_endpoints([API_DOC]))
+    assert endpoint_requirement(endpoint) == (
+        "用户注册接口：注册新用户\n"
+        "POST /api/v1/users\n"
+        "请求头：Content-Type: application/json\n"
+        "请求参数：phone: 手机号，必填；password: 密码，必填\n"
+        "返回结果：code: 状态码；data: 用户信息"
+    )
@@ -0,0 +1,51 @@
+import re
+import json
+import random
+import asyncio
+import httpx
+from case_generation import CaseGenerator
+
+DEFAULT_CONFIG = {"需求分类": "功能", "迭代": "迭代1", "处理人": "测试"}
+
+
+def requirement(req_id):
+    return {"需求ID": req_id, "标题": f"需求{req_id}", "详细描述": "描述", "优先级": "高"}
+
+
+def delayed_handler(seed, completed):
+    """按提示中的需求ID回复两个用例，每个响应随机延迟，完成顺序记入completed"""
+    rng = random.Random(seed)
+
+    async def handler(request):
+        prompt = json.loads(request.content)["messages"][-1]["content"]
+        req_id = re.search(r"需求ID: (\S+)", prompt).group(1)
+        await asyncio.sleep(rng.uniform(0, 0.03))
+        completed.append(req_id)
+        content = "\n".join(f"### 测试用例{i}：{req_id}-用例{i}\n**优先级**：高\n**测试步骤**：\n1. 操作\n"
+                            f"**预期结果**：成功" for i in (1, 2))
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    return handler
+
+
+def test_output_is_deterministic_when_responses_finish_out_of_order(make_client):
+    requirements = [requirement(f"R{i}") for i in range(1, 13)]
+    expected_ids = [f"TC-R{i}-{n:02d}" for i in range(1, 13) for n in (1, 2)]
+    expected_titles = [f"测试-需求R{i}-R{i}-用例{n}" for i in range(1, 13) for n in (1, 2)]
+
+    for seed in range(3):
+        completed = []
+        generator = CaseGenerator(make_client(delayed_handler(seed, completed)), DEFAULT_CONFIG)
+        cases = asyncio.run(generator.agenerate_test_cases(requirements, "primary", concurrency=4))
+
+        assert completed != [req["需求ID"] for req in requirements]
+        assert [case["用例编号"] for case in cases] == expected_ids
+        assert [case["标题"] for case in cases] == expected_titles
+
+
+def test_iterator_input_keeps_requirement_order(make_client):
+    completed = []
+    generator = CaseGenerator(make_client(delayed_handler(42, completed)), DEFAULT_CONFIG)
+    cases = asyncio.run(generator.agenerate_test_cases(iter([requirement(f"R{i}") for i in range(1, 7)]),
+                                                       "primary", concurrency=3))
+    assert [case["用例编号"] for case in cases] == [f"TC-R{i}-{n:02d}" for i in range(1, 7) for n in (1, 2)]
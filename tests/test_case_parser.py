@@ -0,0 +1,88 @@
+import random
+from case_parser import StreamingCaseParser, parse_case_block, split_case_blocks, split_steps
+
+RESPONSE = """好的，以下是测试用例：
+
+### 测试用例1：充值成功
+**优先级**：高
+**前置条件**：用户已登录
+**测试步骤**：
+1. 进入充值页面
+2. 输入金额1.5元
+3. 点击确定
+**预期结果**：余额增加1.5元
+
+**测试用例2：版本校验**
+**优先级**: Middle
+**测试步骤**：1、选择版本v2.0.1 2、点击升级
+**预期结果**：提示已是最新版本
+"""
+
+
+def test_split_case_blocks_accepts_header_variants():
+    blocks = split_case_blocks(RESPONSE)
+    assert len(blocks) == 2
+    assert blocks[0].startswith("充值成功\n")
+    assert blocks[1].startswith("版本校验**")
+    assert split_case_blocks("") == []
+    assert split_case_blocks("没有用例标题的回复") == []
+
+
+def test_parse_case_block_fields():
+    first, second = (parse_case_block(block) for block in split_case_blocks(RESPONSE))
+    assert first == {
+        "title": "充值成功",
+        "priority": "高",
+        "precondition": "用户已登录",
+        "steps": ["进入充值页面", "输入金额1.5元", "点击确定"],
+        "expected": "余额增加1.5元"
+    }
+    assert second == {
+        "title": "版本校验",
+        "priority": "Middle",
+        "precondition": "",
+        "steps": ["选择版本v2.0.1", "点击升级"],
+        "expected": "提示已是最新版本"
+    }
+
+
+def test_parse_case_block_keeps_first_occurrence_and_stops_at_heading():
+    block = ("标题**优先级**：低\n**预期结果**：第一次\n**预期结果**：第二次\n### 其他内容\n"
+             "**优先级**：高")
+    fields = parse_case_block(block)
+    assert fields["title"] == "标题"
+    assert fields["priority"] == "低"
+    assert fields["expected"] == "第一次"
+    assert parse_case_block("只有标题")["priority"] is None
+
+
+def test_parse_case_block_with_many_repeated_headers():
+    block = "标题\n" + "**前置条件**：**" * 5000 + "\n**测试步骤**：\n1. 操作\n**预期结果**：成功"
+    fields = parse_case_block(block)
+    assert fields["precondition"] == "**"
+    assert fields["steps"] == ["操作"]
+    assert fields["expected"] == "成功"
+
+
+def test_split_steps():
+    assert split_steps("\n1. 第一步\n2. 第二步") == ["第一步", "第二步"]
+    assert split_steps("1、上传10.5MB的文件 2、勾选第2项") == ["上传10.5MB的文件", "勾选第2项"]
+    # 不连续的编号属于上一步
+    assert split_steps("1. 输入3. 个字符\n2. 提交") == ["输入3. 个字符", "提交"]
+    assert split_steps("没有编号") == []
+    assert split_steps("前言 1. 步骤") == ["步骤"]
+
+
+def test_streaming_parser_matches_split_case_blocks():
+    rng = random.Random(0)
+    expected = split_case_blocks(RESPONSE)
+    for _ in range(50):
+        parser = StreamingCaseParser()
+        blocks = []
+        position = 0
+        while position < len(RESPONSE):
+            size = rng.randint(1, 20)
+            blocks += parser.feed(RESPONSE[position:position + size])
+            position += size
+        blocks += parser.close()
+        assert blocks == expected
@@ -0,0 +1,112 @@
+import asyncio
+import types
+import httpx
+import pytest
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(circuit_breaker, "time", types.SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_stays_closed_below_min_calls(clock):
+    breaker = CircuitBreaker(min_calls=5)
+    for _ in range(4):
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_opens_when_failure_rate_reached(clock):
+    breaker = CircuitBreaker(min_calls=4, failure_rate=0.5)
+    breaker.record_success(0.1)
+    breaker.record_success(0.1)
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.trips == 1
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+
+
+def test_slow_successes_count_as_failures(clock):
+    breaker = CircuitBreaker(min_calls=2, failure_rate=1.0, slow_call_seconds=5)
+    breaker.record_success(6)
+    breaker.record_success(7)
+    assert breaker.state == OPEN
+
+
+def test_window_forgets_old_failures(clock):
+    breaker = CircuitBreaker(window=4, min_calls=4, failure_rate=0.75)
+    for _ in range(2):
+        breaker.record_failure()
+    for _ in range(4):
+        breaker.record_success(0.1)
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    assert breaker.to_dict()["recent_failures"] == 1
+
+
+def test_half_open_allows_single_probe_and_closes_on_success(clock):
+    breaker = CircuitBreaker(min_calls=1, open_seconds=30)
+    breaker.record_failure()
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # 试探请求未返回前拒绝其他请求
+    assert not breaker.allow()
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+    assert breaker.to_dict()["recent_calls"] == 0
+    assert breaker.allow()
+
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = CircuitBreaker(min_calls=1, open_seconds=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.trips == 2
+    clock.now += 10
+    assert not breaker.allow()
+
+
+def test_release_frees_the_probe(clock):
+    breaker = CircuitBreaker(min_calls=1, open_seconds=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.release()
+    # 被取消的试探请求不计入统计，下一个请求可以继续试探
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def test_client_fails_over_and_skips_open_breaker(make_client):
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.host)
+        if request.url.host == "primary.test":
+            return httpx.Response(500)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "备用模型的回复"}}]})
+
+    client = make_client(handler, {"primary": {"circuit_breaker": {"min_calls": 1}}, "backup": {}})
+    client.failover_models = ["backup"]
+    messages = [{"role": "user", "content": "生成测试用例"}]
+
+    assert asyncio.run(client.acall("primary", messages, max_retries=1)) == "备用模型的回复"
+    assert client.breakers["primary"].state == OPEN
+    # 主模型熔断期间不再请求，直接切换到备用模型
+    assert asyncio.run(client.acall("primary", messages, max_retries=1)) == "备用模型的回复"
+    assert calls == ["primary.test", "backup.test", "backup.test"]
+    assert client.failovers == 2
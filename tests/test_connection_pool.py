@@ -0,0 +1,88 @@
+import json
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from ai_client import AIClient
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    """HTTP/1.1长连接上返回固定回复的OpenAI兼容接口"""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = json.dumps({"choices": [{"message": {"content": "ok"}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CompletionHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    server.shutdown()
+    server.server_close()
+
+
+def make_pooled_client(monkeypatch, endpoint="http://pool.test/v1/chat/completions", models=("primary",)):
+    monkeypatch.setenv("TEST_API_KEY", "test-key")
+    config = {"api_key_env": "TEST_API_KEY", "endpoint": endpoint,
+              "headers": lambda key: {"Authorization": f"Bearer {key}"},
+              "payload": lambda messages, temperature: {"messages": messages, "temperature": temperature},
+              "response_parser": lambda data: data["choices"][0]["message"]["content"]}
+    return AIClient({name: dict(config) for name in models}, models[0])
+
+
+def test_client_is_reused_within_a_loop(monkeypatch):
+    client = make_pooled_client(monkeypatch, models=("primary", "backup"))
+
+    async def run():
+        primary = client._get_client("primary", client.model_configs["primary"])
+        assert client._get_client("primary", client.model_configs["primary"]) is primary
+        backup = client._get_client("backup", client.model_configs["backup"])
+        assert backup is not primary
+        await client.aclose()
+        return primary, backup
+
+    primary, backup = asyncio.run(run())
+    assert primary.is_closed and backup.is_closed
+    assert client._clients == {}
+
+
+def test_each_loop_gets_its_own_client(monkeypatch):
+    client = make_pooled_client(monkeypatch)
+
+    async def get():
+        return asyncio.get_running_loop(), client._get_client("primary", client.model_configs["primary"])
+
+    first_loop, first = asyncio.run(get())
+    second_loop, second = asyncio.run(get())
+    assert first is not second
+    # 已关闭的事件循环上的连接池不再保留
+    assert list(client._clients) == [second_loop] and first_loop.is_closed()
+    asyncio.run(client.aclose())
+
+
+def test_pool_stats_count_reused_connections(monkeypatch, server_url):
+    client = make_pooled_client(monkeypatch, endpoint=server_url)
+    messages = [{"role": "user", "content": "你好"}]
+
+    async def run():
+        for _ in range(5):
+            assert await client.acall("primary", messages) == "ok"
+        await client.aclose()
+
+    asyncio.run(run())
+    # 顺序请求共用一条长连接
+    assert client.get_pool_stats() == {
+        "primary": {"requests": 5, "new_connections": 1, "reused": 4, "reuse_rate": 0.8}
+    }
@@ -0,0 +1,78 @@
+import asyncio
+import httpx
+from hedging import HedgeStats, LatencyTracker, MIN_HEDGE_SAMPLES
+
+MESSAGES = [{"role": "user", "content": "生成测试用例"}]
+
+
+def test_percentile_uses_nearest_rank():
+    tracker = LatencyTracker()
+    assert tracker.percentile(95) is None
+    for seconds in range(1, 101):
+        tracker.record(seconds / 100)
+    assert tracker.percentile(95) == 0.95
+    assert tracker.percentile(50) == 0.5
+    assert tracker.percentile(100) == 1.0
+    assert tracker.percentile(0) == 0.01
+
+
+def test_hedge_delay_requires_min_samples():
+    tracker = LatencyTracker()
+    for _ in range(MIN_HEDGE_SAMPLES - 1):
+        tracker.record(2.0)
+    assert tracker.hedge_delay() is None
+    tracker.record(2.0)
+    assert tracker.hedge_delay() == 2.0
+
+
+def test_window_keeps_recent_samples():
+    tracker = LatencyTracker(window=20)
+    for _ in range(20):
+        tracker.record(10.0)
+    for _ in range(20):
+        tracker.record(1.0)
+    assert tracker.hedge_delay() == 1.0
+
+
+def test_hedge_stats_rate():
+    stats = HedgeStats()
+    assert stats.hedge_rate == 0.0
+    stats.calls, stats.hedged = 4, 1
+    assert stats.to_dict()["hedge_rate"] == 0.25
+
+
+def reply(content):
+    return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+
+def test_slow_primary_is_hedged_to_secondary(make_client):
+    async def handler(request):
+        if request.url.host == "primary.test":
+            await asyncio.sleep(5)
+            return reply("主模型的回复")
+        return reply("备用模型的回复")
+
+    client = make_client(handler, {"primary": {"hedge_to": "secondary"}, "secondary": {}})
+    for _ in range(MIN_HEDGE_SAMPLES):
+        client.get_latency_tracker("primary").record(0.01)
+
+    assert asyncio.run(client.acall("primary", MESSAGES)) == "备用模型的回复"
+    assert client.get_hedge_stats()["primary"] == {
+        "calls": 1, "hedged": 1, "hedge_rate": 1.0, "primary_wins": 0, "hedge_wins": 1
+    }
+
+
+def test_no_hedge_without_enough_samples(make_client):
+    hosts = []
+
+    async def handler(request):
+        hosts.append(request.url.host)
+        await asyncio.sleep(0.05)
+        return reply("主模型的回复")
+
+    client = make_client(handler, {"primary": {"hedge_to": "secondary"}, "secondary": {}})
+    assert asyncio.run(client.acall("primary", MESSAGES)) == "主模型的回复"
+    assert hosts == ["primary.test"]
+    assert client.hedge_stats["primary"].primary_wins == 1
+    # 成功请求的耗时计入主模型的样本
+    assert len(client.get_latency_tracker("primary").samples) == 1
@@ -0,0 +1,106 @@
+import os
+from incremental import (diff_requirements, find_latest_manifest, fingerprint, load_manifest, manifest_path,
+                         merge_cases, write_manifest)
+
+
+def requirement(req_id, title="标题", **fields):
+    return dict({"需求ID": req_id, "标题": title, "详细描述": "描述", "优先级": "高"}, **fields)
+
+
+def case(req_id, number=1):
+    return {"用例编号": f"TC-{req_id}-{number:02d}", "需求ID": req_id}
+
+
+def test_fingerprint_covers_only_relevant_fields():
+    req = requirement("R1")
+    assert fingerprint(req) == fingerprint(dict(req, 备注="不影响生成结果"))
+    assert fingerprint(req) != fingerprint(dict(req, 详细描述="新的描述"))
+    assert fingerprint(req) != fingerprint(dict(req, 迭代="迭代2"))
+
+
+def test_manifest_round_trip(tmp_path):
+    output = str(tmp_path / "TestCases_1.xlsx")
+    assert manifest_path(output) == str(tmp_path / "TestCases_1.manifest.json")
+    write_manifest(manifest_path(output), [requirement("R1"), requirement(2)], [case("R1"), case(2)], model="m")
+    manifest = load_manifest(manifest_path(output))
+    assert manifest["model"] == "m"
+    assert manifest["requirements"]["2"]["cases"] == [case(2)]
+    assert manifest["requirements"]["R1"]["fingerprint"] == fingerprint(requirement("R1"))
+
+
+def test_load_manifest_tolerates_missing_or_corrupt_files(tmp_path):
+    assert load_manifest(str(tmp_path / "missing.json")) is None
+    (tmp_path / "broken.json").write_text('{"requirements": ', encoding="utf-8")
+    assert load_manifest(str(tmp_path / "broken.json")) is None
+
+
+def test_find_latest_manifest(tmp_path):
+    assert find_latest_manifest(str(tmp_path / "TestCases_*.xlsx")) is None
+    for index, name in enumerate(["TestCases_1", "TestCases_2", "TestCases_3"]):
+        (tmp_path / f"{name}.xlsx").write_bytes(b"")
+        if name != "TestCases_3":
+            (tmp_path / f"{name}.manifest.json").write_text("{}", encoding="utf-8")
+            os.utime(tmp_path / f"{name}.manifest.json", (1000 + index, 1000 + index))
+    # 没有清单的输出文件不参与比较
+    assert find_latest_manifest(str(tmp_path / "TestCases_*.xlsx")) == str(tmp_path / "TestCases_2.manifest.json")
+
+
+def test_diff_requirements(tmp_path):
+    previous = [requirement("R1"), requirement("R2"), requirement("R3"), requirement("R4")]
+    path = str(tmp_path / "m.json")
+    write_manifest(path, previous, [case("R1"), case("R1", 2), case("R2"), case("R3")])
+    current = [
+        requirement("R1"),                  # 未改动
+        requirement("R2", title="新标题"),  # 已修改
+        requirement("R4"),                  # 上次未生成出用例
+        requirement("R5"),                  # 新增
+    ]
+    changed, reused, deleted = diff_requirements(current, load_manifest(path))
+    assert [req["需求ID"] for req in changed] == ["R2", "R4", "R5"]
+    assert reused == {"R1": [case("R1"), case("R1", 2)]}
+    assert deleted == ["R3"]
+
+
+def test_merge_cases_follows_requirement_order():
+    requirements = [requirement("R1"), requirement(2), requirement("R3")]
+    reused = {"R1": [case("R1")], "R9": [case("R9")]}
+    merged = merge_cases(requirements, [case("R3"), case(2), case(2, 2)], reused)
+    assert [item["用例编号"] for item in merged] == ["TC-R1-01", "TC-2-01", "TC-2-02", "TC-R3-01"]
+
+
+def test_incremental_run_reuses_rows_with_blank_cells(tmp_path, monkeypatch):
+    from openpyxl import Workbook
+    import generate_testcase
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["需求ID", "标题", "详细描述", "优先级", "父需求", "迭代"])
+    sheet.append(["R1", "登录", "用户名密码登录", "高", None, None])
+    sheet.append(["R2", "注销", "退出登录", None, "R1", "迭代2"])
+    input_file = str(tmp_path / "需求.xlsx")
+    workbook.save(input_file)
+
+    # 只替换模型调用：记录每次运行实际需要生成的需求，每条需求返回一个用例
+    generated = []
+
+    def fake_generate(requirements, model_name, **options):
+        requirements = list(requirements)
+        generated.append([req["需求ID"] for req in requirements])
+        return [dict(req, 用例编号=f"TC-{req['需求ID']}-01", 优先级="High") for req in requirements]
+
+    run_ids = iter(["20240101_000001", "20240101_000002"])
+    monkeypatch.setattr(generate_testcase, "AI_BASE_URL", "http://llm.test")
+    monkeypatch.setattr(generate_testcase, "get_available_models", lambda: ["default"])
+    monkeypatch.setattr(generate_testcase, "generate_test_cases", fake_generate)
+    monkeypatch.setattr(generate_testcase, "new_run_id", lambda: next(run_ids))
+    args = ["generate_testcase.py", "--input", input_file, "--model", "default", "--no-ledger",
+            "--output-dir", str(tmp_path / "cases"), "--report-dir", str(tmp_path / "reports"),
+            "--journal-dir", str(tmp_path / "journal")]
+
+    monkeypatch.setattr("sys.argv", args)
+    generate_testcase.main()
+    monkeypatch.setattr("sys.argv", args + ["--incremental"])
+    generate_testcase.main()
+
+    assert generated == [["R1", "R2"], []]
+    assert os.path.exists(tmp_path / "cases" / "TestCases_default_20240101_000002.xlsx")
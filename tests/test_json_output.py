@@ -0,0 +1,109 @@
+import json
+import asyncio
+from ai_client import _with_json_format
+from case_generation import CaseGenerator
+from json_output import PACKED_SCHEMA, TEST_CASES_SCHEMA, ParseStats, decode_cases, split_packed_json
+
+CASE = {"title": "登录成功", "priority": "高", "precondition": "已注册", "steps": ["输入账号", "点击登录"],
+        "expected": "进入首页"}
+DEFAULT_CONFIG = {"需求分类": "功能", "迭代": "迭代1", "处理人": "测试"}
+
+
+def test_decode_plain_fenced_and_wrapped_json():
+    text = json.dumps({"test_cases": [CASE]}, ensure_ascii=False)
+    assert decode_cases(text) == [CASE]
+    assert decode_cases(f"```json\n{text}\n```") == [CASE]
+    assert decode_cases(f"以下是测试用例：\n{text}\n请查收。") == [CASE]
+    # 顶层直接是用例数组
+    assert decode_cases(json.dumps([CASE], ensure_ascii=False)) == [CASE]
+
+
+def test_decode_rejects_non_json_replies():
+    assert decode_cases("") is None
+    assert decode_cases("### 测试用例1：登录成功") is None
+    assert decode_cases('{"test_cases": {"title": "不是数组"}}') is None
+    assert decode_cases('{"test_cases": [') is None
+
+
+def test_decode_normalizes_cases():
+    cases = decode_cases(json.dumps({"test_cases": [
+        {"title": " 登录 ", "priority": "", "steps": ["1. 输入账号", "2、点击登录", ""], "expected": ["页面跳转", "显示昵称"]},
+        {"title": "字符串步骤", "steps": "1. 第一步 2. 第二步"},
+        {"priority": "高"},
+        "不是对象"
+    ]}, ensure_ascii=False))
+    assert cases == [
+        {"title": "登录", "priority": None, "precondition": "", "steps": ["输入账号", "点击登录"],
+         "expected": "页面跳转\n显示昵称"},
+        {"title": "字符串步骤", "priority": None, "precondition": "", "steps": ["第一步", "第二步"], "expected": ""}
+    ]
+
+
+def test_split_packed_json():
+    text = json.dumps({"requirements": [
+        {"req_id": "R1", "test_cases": [CASE]},
+        {"req_id": "R9", "test_cases": [CASE]},
+        {"req_id": " R2 "},
+        {"req_id": "R1", "test_cases": []}
+    ]}, ensure_ascii=False)
+    sections = split_packed_json(text, ["R1", "R2"])
+    assert set(sections) == {"R1", "R2"}
+    assert decode_cases(sections["R1"]) == [CASE]
+    assert decode_cases(sections["R2"]) == []
+    assert split_packed_json("## 需求ID: R1", ["R1"]) is None
+
+
+def test_with_json_format():
+    payload = {"model": "m", "parameters": {"temperature": 0.3}}
+    schema_payload = _with_json_format(payload, "json_schema", TEST_CASES_SCHEMA)
+    assert schema_payload["response_format"]["json_schema"] == {"name": "test_cases", "strict": True,
+                                                                "schema": TEST_CASES_SCHEMA}
+    assert _with_json_format(payload, "json_object", PACKED_SCHEMA)["response_format"] == {"type": "json_object"}
+    assert _with_json_format(payload, "dashscope", TEST_CASES_SCHEMA)["parameters"] == {
+        "temperature": 0.3, "response_format": {"type": "json_object"}}
+    assert _with_json_format(payload, None, TEST_CASES_SCHEMA) is payload
+    assert "response_format" not in payload
+
+
+class FakeClient:
+    def __init__(self, reply):
+        self.reply = reply
+        self.schemas = []
+
+    def json_format(self, model_name):
+        return "json_object"
+
+    async def acall(self, model_name, messages, temperature=0.3, json_schema=None):
+        self.schemas.append(json_schema)
+        return self.reply
+
+
+def generate(reply):
+    client = FakeClient(reply)
+    generator = CaseGenerator(client, DEFAULT_CONFIG)
+    requirement = {"需求ID": "R1", "标题": "登录", "详细描述": "描述", "优先级": "中"}
+    cases = asyncio.run(generator.agenerate_test_cases([requirement], "model", output_format="json"))
+    return cases, client, generator.get_parse_stats("model")
+
+
+def test_json_reply_is_decoded():
+    cases, client, stats = generate(json.dumps({"test_cases": [CASE]}, ensure_ascii=False))
+    assert client.schemas == [TEST_CASES_SCHEMA]
+    assert [case["标题"] for case in cases] == ["测试-登录-登录成功"]
+    assert cases[0]["测试步骤"] == "1. 输入账号\n2. 点击登录"
+    assert cases[0]["优先级"] == "High"
+    assert (stats.json_replies, stats.json_decoded, stats.fallbacks) == (1, 1, 0)
+
+
+def test_markdown_reply_falls_back_to_markdown_parser():
+    cases, _, stats = generate("### 测试用例1：登录成功\n**优先级**：低\n**测试步骤**：\n1. 输入账号\n**预期结果**：成功")
+    assert [case["优先级"] for case in cases] == ["Low"]
+    assert (stats.json_replies, stats.json_decoded, stats.fallbacks) == (1, 0, 1)
+
+
+def test_parse_stats():
+    stats = ParseStats()
+    stats.record([{}], json_requested=True, json_decoded=True)
+    stats.record([])
+    assert stats.to_dict() == {"replies": 2, "parsed": 1, "success_rate": 0.5, "json_replies": 1,
+                               "json_decoded": 1, "markdown_fallbacks": 0, "cases": 1}
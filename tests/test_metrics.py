@@ -0,0 +1,77 @@
+import json
+import pytest
+from metrics import METRIC_PREFIX, Histogram, MetricsRegistry
+
+
+def test_histogram_bucket_counts_include_upper_bound():
+    histogram = Histogram((1, 2, 5))
+    for value in [0.5, 1, 1.5, 2, 4, 7]:
+        histogram.observe(value)
+    # 桶上限含等于，最后一个为+Inf桶
+    assert histogram.counts == [2, 2, 1, 1]
+    assert histogram.count == 6 and histogram.sum == 16.0
+    assert (histogram.min, histogram.max) == (0.5, 7)
+
+
+def test_histogram_quantile_stays_within_observed_range():
+    histogram = Histogram((1, 2.5, 5))
+    assert histogram.quantile(0.5) is None
+    for _ in range(10):
+        histogram.observe(3.0)
+    # 桶内插值得到2.5~5之间的估算值，限制在实际观测到的3.0
+    assert histogram.quantile(0.5) == 3.0
+    assert histogram.quantile(0.99) == 3.0
+
+
+def test_histogram_quantile_interpolates_within_bucket():
+    histogram = Histogram((1, 2, 3, 4))
+    for value in [0.5, 1.5, 2.5, 3.5]:
+        for _ in range(25):
+            histogram.observe(value)
+    assert histogram.quantile(0.5) == 2.0
+    assert histogram.quantile(0.8) == pytest.approx(3.2)
+    assert histogram.quantile(0.9) == 3.5  # 插值得3.6，不超过最大值
+    assert histogram.quantile(0.1) == 0.5  # 插值得0.4，不小于最小值
+
+
+def test_to_prometheus_exposition_format():
+    registry = MetricsRegistry()
+    registry.inc("requests_total", model="m")
+    registry.inc("requests_total", 2, model="m")
+    registry.set("run_requirements", 3, model='a"b')
+    for value in [0, 2, 30]:
+        registry.observe("cases_per_requirement", value, model="m")
+
+    lines = registry.to_prometheus().splitlines()
+    name = METRIC_PREFIX + "cases_per_requirement"
+    assert f"# TYPE {name} histogram" in lines
+    assert f'{name}_bucket{{model="m",le="0"}} 1' in lines
+    assert f'{name}_bucket{{model="m",le="2"}} 2' in lines
+    assert f'{name}_bucket{{model="m",le="20"}} 2' in lines
+    assert f'{name}_bucket{{model="m",le="+Inf"}} 3' in lines
+    assert f'{name}_sum{{model="m"}} 32.0' in lines
+    assert f'{name}_count{{model="m"}} 3' in lines
+    assert f"# TYPE {METRIC_PREFIX}requests_total counter" in lines
+    assert f'{METRIC_PREFIX}requests_total{{model="m"}} 3' in lines
+    assert f'{METRIC_PREFIX}run_requirements{{model="a\\"b"}} 3' in lines
+    # 每个指标只输出一次HELP和TYPE
+    assert sum(line.startswith("# TYPE") for line in lines) == 3
+
+
+def test_json_summary(tmp_path):
+    registry = MetricsRegistry()
+    registry.inc("errors_total", type="http", model="m")
+    for _ in range(4):
+        registry.observe("stage_duration_seconds", 0.2, stage="http", model="m")
+    path = tmp_path / "metrics" / "summary.json"
+    registry.write_json(str(path), run_id="r1")
+
+    summary = json.loads(path.read_text(encoding="utf-8"))
+    assert summary["run_id"] == "r1"
+    assert summary["metrics"]["errors_total"] == {
+        "type": "counter", "series": [{"labels": {"model": "m", "type": "http"}, "value": 1}]
+    }
+    series = summary["metrics"]["stage_duration_seconds"]["series"][0]
+    assert series["labels"] == {"model": "m", "stage": "http"}
+    assert series["count"] == 4 and series["mean"] == 0.2
+    assert series["p50"] == series["p99"] == 0.2
@@ -0,0 +1,28 @@
+import asyncio
+from types import SimpleNamespace
+import httpx
+from benchmark import start_mock_server
+from case_parser import split_case_blocks
+
+
+def test_mock_server_answers_one_request():
+    args = SimpleNamespace(latency_ms=10, latency_dist="fixed", latency_sigma=0.5, error_rate=0.0,
+                           rate_limit_rate=0.0, retry_after=1.0, cases=2, seed=1)
+    process, endpoint = start_mock_server(args)
+    try:
+        async def request():
+            async with httpx.AsyncClient(timeout=10) as client:
+                response = await client.post(endpoint, json={
+                    "model": "mock", "messages": [{"role": "user", "content": "需求ID: R1\n需求标题: 登录"}]
+                })
+                stats = await client.get(endpoint.split("/v1/")[0] + "/stats")
+                return response, stats.json()
+
+        response, stats = asyncio.run(request())
+        assert response.status_code == 200
+        content = response.json()["choices"][0]["message"]["content"]
+        assert len(split_case_blocks(content)) == 2
+        assert stats["requests"] == 1
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
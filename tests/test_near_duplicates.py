@@ -0,0 +1,74 @@
+import random
+from near_duplicates import (SIMHASH_BITS, NearDuplicateFinder, SimHashIndex, find_near_duplicates, restamp_cases,
+                             similarity, simhash)
+
+DESCRIPTION = "用户在登录页面输入正确的手机号和短信验证码后点击登录按钮，系统校验通过后跳转到首页，并记录登录日志和登录设备信息"
+
+
+def requirement(req_id, title, description=DESCRIPTION):
+    return {"需求ID": req_id, "标题": title, "详细描述": description}
+
+
+def test_simhash_ignores_case_whitespace_and_punctuation():
+    assert simhash("Login, 登录！") == simhash("login 登录")
+    assert similarity(simhash(DESCRIPTION), simhash(DESCRIPTION)) == 1.0
+    assert simhash("ab") == simhash("AB")
+
+
+def test_small_edit_stays_similar():
+    edited = DESCRIPTION.replace("登录按钮", "登陆按钮")
+    unrelated = "导出报表时按部门汇总每月的考勤数据并生成图表，支持按月份筛选并下载为Excel文件"
+    assert similarity(simhash(DESCRIPTION), simhash(edited)) > similarity(simhash(DESCRIPTION), simhash(unrelated))
+    assert similarity(simhash(DESCRIPTION), simhash(unrelated)) < 0.85
+
+
+def test_index_finds_every_hash_within_max_distance():
+    rng = random.Random(0)
+    index = SimHashIndex(0.9)
+    assert index.max_distance == 6
+    values = [rng.getrandbits(SIMHASH_BITS) for _ in range(200)]
+    for key, value in enumerate(values):
+        index.add(key, value)
+    for key, value in enumerate(values):
+        # 翻转不超过max_distance位仍能找到，抽屉原理保证至少一段完全相同
+        bits = rng.sample(range(SIMHASH_BITS), rng.randint(0, index.max_distance))
+        assert index.query(value ^ sum(1 << bit for bit in bits)) == key
+
+
+def test_index_ignores_hash_beyond_max_distance():
+    index = SimHashIndex(0.9)
+    index.add("a", 0)
+    assert index.query((1 << index.max_distance) - 1) == "a"
+    assert index.query((1 << (index.max_distance + 1)) - 1) is None
+
+
+def test_find_near_duplicates_keeps_first_occurrence():
+    requirements = [
+        requirement("R1", "短信验证码登录"),
+        requirement("R2", "导出考勤报表", "导出报表时按部门汇总每月的考勤数据并生成图表，支持下载为Excel文件"),
+        requirement("R3", "短信验证码登录。", DESCRIPTION + "。"),
+    ]
+    unique, duplicates = find_near_duplicates(requirements, 0.9)
+    assert [req["需求ID"] for req in unique] == ["R1", "R2"]
+    assert [(req["需求ID"], source["需求ID"]) for req, source in duplicates] == [("R3", "R1")]
+
+
+def test_finder_compares_across_batches():
+    finder = NearDuplicateFinder(0.9)
+    assert finder.split([requirement("R1", "短信验证码登录")]) == ([requirement("R1", "短信验证码登录")], [])
+    unique, duplicates = finder.split([requirement("R2", "短信验证码登录")])
+    assert unique == [] and duplicates[0][1]["需求ID"] == "R1"
+
+
+def test_restamp_cases():
+    source = {"需求ID": "R1", "标题": "登录"}
+    target = {"需求ID": "R3", "标题": "登录（移动端）", "父需求": "P1"}
+    cases = [{"用例编号": "TC-R1-01", "需求ID": "R1", "父需求": "", "标题": "测试-登录-成功"},
+             {"用例编号": "TC-R1-02", "需求ID": "R1", "父需求": "", "标题": "其他标题"}]
+    restamped = restamp_cases(cases, source, target)
+    assert [case["用例编号"] for case in restamped] == ["TC-R3-01", "TC-R3-02"]
+    assert restamped[0]["标题"] == "测试-登录（移动端）-成功"
+    assert restamped[1]["标题"] == "其他标题"
+    assert all(case["需求ID"] == "R3" and case["父需求"] == "P1" for case in restamped)
+    # 原用例不被修改
+    assert cases[0]["用例编号"] == "TC-R1-01"
@@ -0,0 +1,63 @@
+import json
+import random
+import asyncio
+import httpx
+import pdf_generate_testcase
+from pdf_generate_testcase import CASE_PROMPT, EXTRACT_PROMPT, TEST_POINT_PROMPT
+
+REQUIREMENTS = [f"需求{i}" for i in range(1, 9)]
+
+
+def case_reply(requirement):
+    # 模型给出的编号不连续，输出时按需求重新编号
+    return "\n".join(f"### 测试用例{number}：{requirement}目标{number}\n**优先级**：高\n**测试步骤**：\n1. 操作\n"
+                     f"**预期结果**：成功" for number in (3, 7))
+
+
+def test_agenerate_test_cases_bounds_concurrency_and_keeps_order(make_client, monkeypatch):
+    rng = random.Random(7)
+    active = set()
+    peak = 0
+
+    async def handler(request):
+        nonlocal peak
+        text = json.loads(request.content)["messages"][-1]["content"]
+        if text.startswith(EXTRACT_PROMPT):
+            content = "\n".join(f"{i}. {requirement}" for i, requirement in enumerate(REQUIREMENTS, 1))
+        elif text.startswith(TEST_POINT_PROMPT):
+            requirement = text.rsplit("：", 1)[1]
+            active.add(requirement)
+            peak = max(peak, len(active))
+            content = f"测试点：{requirement}"
+        else:
+            assert text.startswith(CASE_PROMPT)
+            requirement = text.rsplit("：", 1)[1]
+            content = case_reply(requirement)
+            active.discard(requirement)
+        # 随机延迟，需求的完成顺序与提交顺序不同
+        await asyncio.sleep(rng.uniform(0, 0.02))
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    monkeypatch.setattr(pdf_generate_testcase, "AI_CLIENT", make_client(handler, {"qianwen": {}}))
+    monkeypatch.setattr(pdf_generate_testcase, "iter_pages", lambda pdf_path, pool=None: iter(["需求文档正文"]))
+    cases = asyncio.run(pdf_generate_testcase.agenerate_test_cases("需求.pdf", concurrency=3, extract_mode="model"))
+
+    assert 1 < peak <= 3
+    assert [case["用例编号"] for case in cases] == [
+        f"TC-REQ{index:03d}-{number:02d}" for index in range(1, len(REQUIREMENTS) + 1) for number in (1, 2)
+    ]
+    assert [case["测试目标"] for case in cases] == [
+        f"{requirement}目标{number}" for requirement in REQUIREMENTS for number in (3, 7)
+    ]
+
+
+def test_agenerate_for_requirement_renumbers_cases(make_client, monkeypatch):
+    async def handler(request):
+        text = json.loads(request.content)["messages"][-1]["content"]
+        content = "测试点：登录" if text.startswith(TEST_POINT_PROMPT) else case_reply("登录")
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    monkeypatch.setattr(pdf_generate_testcase, "AI_CLIENT", make_client(handler, {"qianwen": {}}))
+    cases = asyncio.run(pdf_generate_testcase.agenerate_for_requirement("REQ005", "用户登录"))
+    assert [(case["用例编号"], case["测试目标"]) for case in cases] == [("TC-REQ005-01", "登录目标3"),
+                                                                       ("TC-REQ005-02", "登录目标7")]
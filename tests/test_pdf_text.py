@@ -0,0 +1,234 @@
+import io
+import random
+import PyPDF2
+import pdf_text
+from pdf_text import PageTextCache, is_heading, iter_chunks, iter_pages, page_fingerprint
+from pdf_requirements import format_requirement_list, merge_requirements, split_requirement_list
+from prompt_packing import estimate_tokens
+
+
+def section(number, lines):
+    return [f"{number}. 第{number}节"] + [f"第{number}节的需求描述第{i}行。" for i in range(lines)]
+
+
+def test_is_heading():
+    for line in ["# 概述", "第三章 用户管理", "一、登录", "（二）注册", "1. 用户注册接口", "2.3 修改密码"]:
+        assert is_heading(line), line
+    for line in ["", "1.5元", "用户登录后跳转到首页。", "1. 用户输入手机号，", "x" * 41]:
+        assert not is_heading(line), line
+
+
+def test_sections_stay_together_and_chunks_fit():
+    pages = ["\n".join(section(1, 3) + section(2, 3)), "\n".join(section(3, 3))]
+    chunks = list(iter_chunks(pages, max_tokens=45))
+    assert all(estimate_tokens(chunk) <= 45 for chunk in chunks)
+    # 每块都从章节标题开始，章节不被拆开
+    assert [chunk.split("\n")[0] for chunk in chunks] == ["1. 第1节", "2. 第2节", "3. 第3节"]
+    assert "\n".join(chunks).split("\n") == "\n".join(pages).split("\n")
+
+
+def test_small_sections_share_a_chunk():
+    pages = ["\n".join(section(1, 1) + section(2, 1) + section(3, 1))]
+    assert list(iter_chunks(pages, max_tokens=1000)) == pages
+
+
+def test_long_section_is_split_within_budget():
+    lines = section(1, 200)
+    chunks = list(iter_chunks(["\n".join(lines)], max_tokens=100))
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 100 for chunk in chunks)
+    assert "\n".join(chunks).split("\n") == lines
+
+
+def test_overlap_repeats_previous_tail():
+    rng = random.Random(0)
+    lines = [line for number in range(1, 30) for line in section(number, rng.randint(1, 6))]
+    chunks = list(iter_chunks(["\n".join(lines)], max_tokens=120, overlap_tokens=30))
+    assert all(estimate_tokens(chunk) <= 120 for chunk in chunks)
+    covered = []
+    for previous, chunk in zip([None] + chunks, chunks):
+        chunk_lines = chunk.split("\n")
+        if previous is not None:
+            # 开头若干行与上一块末尾相同，且不超过重叠上限
+            overlap = next(size for size in range(len(chunk_lines), -1, -1)
+                           if previous.split("\n")[len(previous.split("\n")) - size:] == chunk_lines[:size])
+            assert sum(estimate_tokens(line) + 1 for line in chunk_lines[:overlap]) <= 30
+            chunk_lines = chunk_lines[overlap:]
+        covered.extend(chunk_lines)
+    assert covered == lines
+
+
+def test_blank_pages_produce_no_chunks():
+    assert list(iter_chunks(["", "\n  \n"], max_tokens=100)) == []
+
+
+def test_split_requirement_list():
+    text = ("以下是提取的需求：\n"
+            "1. 用户可以通过**手机号**注册\n"
+            "   注册后自动登录\n"
+            "2、用户可以修改密码\n"
+            "（3）管理员可以禁用用户\n"
+            "- 支持导出用户列表\n"
+            "以上共4条。\n"
+            "   不属于任何条目的缩进行")
+    assert split_requirement_list(text) == [
+        "用户可以通过手机号注册 注册后自动登录", "用户可以修改密码", "管理员可以禁用用户", "支持导出用户列表"
+    ]
+
+
+def test_merge_requirements_drops_overlap_duplicates():
+    first = ["用户可以通过手机号和短信验证码注册账号并自动登录系统", "用户可以在个人中心修改登录密码"]
+    second = ["用户可以在个人中心修改登录密码。", "管理员可以在后台禁用或启用指定的用户账号"]
+    merged = merge_requirements([first, second])
+    assert merged == [first[0], "用户可以在个人中心修改登录密码。", second[1]]
+    assert format_requirement_list(merged[:2]) == f"1. {first[0]}\n2. 用户可以在个人中心修改登录密码。"
+
+
+def build_pdf(pages, cyclic=False):
+    """生成最小的PDF：pages为[(页面文本, 表单文本)]，每页的表单文本画在该页引用的Form XObject中
+
+    cyclic为True时表单在自己的资源中引用自身。
+    """
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>", 3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    for index, (page_text, form_text) in enumerate(pages):
+        page, contents, form = 4 + index * 3, 5 + index * 3, 6 + index * 3
+        kids.append(f"{page} 0 R")
+        objects[page] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {contents} 0 R "
+                         f"/Resources << /Font << /F1 3 0 R >> /XObject << /X1 {form} 0 R >> >> >>").encode()
+        stream = f"BT /F1 12 Tf 72 720 Td ({page_text}) Tj ET /X1 Do"
+        objects[contents] = f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream".encode()
+        stream = f"BT /F1 12 Tf 72 600 Td ({form_text}) Tj ET"
+        nested = f"/XObject << /X1 {form} 0 R >> " if cyclic else ""
+        objects[form] = (f"<< /Type /XObject /Subtype /Form /BBox [0 0 612 792] "
+                         f"/Resources << /Font << /F1 3 0 R >> {nested}>> /Length {len(stream)} >>\n"
+                         f"stream\n{stream}\nendstream").encode()
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = out.tell()
+        out.write(f"{number} 0 obj\n".encode() + objects[number] + b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for number in sorted(objects):
+        out.write(f"{offsets[number]:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def first_page(data):
+    return PyPDF2.PdfReader(io.BytesIO(data)).pages[0]
+
+
+def test_fingerprint_covers_form_xobjects():
+    alpha = first_page(build_pdf([("Hello", "Alpha")]))
+    beta = first_page(build_pdf([("Hello", "Beta")]))
+    assert alpha.extract_text() != beta.extract_text()
+    assert page_fingerprint(alpha) != page_fingerprint(beta)
+    assert page_fingerprint(alpha) == page_fingerprint(first_page(build_pdf([("Hello", "Alpha")])))
+
+
+def test_fingerprint_handles_cyclic_forms():
+    assert page_fingerprint(first_page(build_pdf([("Hello", "Alpha")], cyclic=True)))
+
+
+def test_page_cache_reuses_unchanged_pages(tmp_path, monkeypatch):
+    pdf_path = tmp_path / "doc.pdf"
+    cache_dir = str(tmp_path / "cache")
+    extracted = []
+    extract_text = PyPDF2.PageObject.extract_text
+
+    def counting_extract_text(page, *args, **kwargs):
+        text = extract_text(page, *args, **kwargs)
+        extracted.append(text)
+        return text
+
+    monkeypatch.setattr(PyPDF2.PageObject, "extract_text", counting_extract_text)
+    pdf_path.write_bytes(build_pdf([("One", "FormOne"), ("Two", "FormTwo"), ("Three", "FormThree")]))
+    first = list(iter_pages(str(pdf_path), workers=1, cache_dir=cache_dir))
+    assert [text.split() for text in first] == [["One", "FormOne"], ["Two", "FormTwo"], ["Three", "FormThree"]]
+    assert len(extracted) == 3
+
+    # 文件未改动：从文档级条目读出全部页面，不再解析PDF
+    with monkeypatch.context() as patch:
+        patch.setattr(pdf_text.PyPDF2, "PdfReader", None)
+        assert list(iter_pages(str(pdf_path), workers=1, cache_dir=cache_dir)) == first
+
+    # 只改动第二页表单中的文本：只有第二页重新提取
+    extracted.clear()
+    pdf_path.write_bytes(build_pdf([("One", "FormOne"), ("Two", "FormTwo2"), ("Three", "FormThree")]))
+    second = list(iter_pages(str(pdf_path), workers=1, cache_dir=cache_dir))
+    assert second[1].split() == ["Two", "FormTwo2"]
+    assert second[0] == first[0] and second[2] == first[2]
+    assert len(extracted) == 1
+    assert PageTextCache(cache_dir).get_fingerprints(pdf_text.file_digest(str(pdf_path))) is not None
+
+
+def test_iter_pages_uses_caller_pool_from_worker_thread(tmp_path):
+    import asyncio
+    pdf_path = tmp_path / "pages.pdf"
+    pages = [(f"Page{i}", f"Form{i}") for i in range(pdf_text.SERIAL_PAGE_LIMIT + 4)]
+    pdf_path.write_bytes(build_pdf(pages))
+    expected = [text.split() for text in iter_pages(str(pdf_path), workers=1, cache_dir=None)]
+
+    # 与pdf_generate_testcase相同：进程池先创建，页面在asyncio.to_thread的工作线程中读取
+    with pdf_text.page_pool(2) as pool:
+        assert pool._mp_context.get_start_method() == "spawn"
+        read = asyncio.run(asyncio.to_thread(lambda: list(iter_pages(str(pdf_path), workers=2, cache_dir=None,
+                                                                     pool=pool))))
+        assert [text.split() for text in read] == expected
+        assert pool._processes
+        # 调用方的进程池不随生成器结束而关闭
+        assert pool.submit(pdf_text._extract_pages, str(pdf_path), [0]).result()[0].split() == ["Page0", "Form0"]
+
+
+def test_iter_pages_extracts_at_most_two_windows_ahead(tmp_path, monkeypatch):
+    pdf_path = tmp_path / "pages.pdf"
+    pdf_path.write_bytes(build_pdf([(f"Page{i}", f"Form{i}") for i in range(10)]))
+    extracted = []
+    extract_text = PyPDF2.PageObject.extract_text
+
+    def counting_extract_text(page, *args, **kwargs):
+        extracted.append(page)
+        return extract_text(page, *args, **kwargs)
+
+    monkeypatch.setattr(PyPDF2.PageObject, "extract_text", counting_extract_text)
+    pages = iter_pages(str(pdf_path), workers=1, cache_dir=None, window=3)
+    progress = []
+    for index, text in enumerate(pages):
+        assert text.split() == [f"Page{index}", f"Form{index}"]
+        progress.append(len(extracted))
+    # 产出某一页时只提取了当前窗口和预取的下一窗口
+    assert progress == [6, 6, 6, 9, 9, 9, 10, 10, 10, 10]
+
+
+def test_overlap_spans_page_boundaries():
+    rng = random.Random(1)
+    lines = [line for number in range(1, 20) for line in section(number, rng.randint(2, 8))]
+    # 按固定行数分页，章节跨页，页面边界不影响切分结果
+    pages = ["\n".join(lines[start:start + 7]) for start in range(0, len(lines), 7)]
+    by_page = list(iter_chunks(pages, max_tokens=100, overlap_tokens=25))
+    assert by_page == list(iter_chunks(["\n".join(lines)], max_tokens=100, overlap_tokens=25))
+    assert all(estimate_tokens(chunk) <= 100 for chunk in by_page)
+    for previous, chunk in zip(by_page, by_page[1:]):
+        assert chunk.split("\n")[0] in previous.split("\n")
+
+
+def test_iter_chunks_reads_pages_lazily():
+    consumed = []
+
+    def pages():
+        for number in range(1, 1001):
+            consumed.append(number)
+            yield "\n".join(section(number, 5))
+
+    chunks = iter_chunks(pages(), max_tokens=80)
+    for index, chunk in enumerate(chunks):
+        # 每页一个章节、每块一个章节：产出第index块时只预读了常数页，不读入整份文档
+        assert len(consumed) <= index + 3
+        if index == 20:
+            break
+    assert len(consumed) < 30
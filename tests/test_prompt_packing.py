@@ -0,0 +1,86 @@
+import asyncio
+from case_generation import CaseGenerator
+from prompt_packing import estimate_tokens, pack_requirements, split_packed_response
+
+DEFAULT_CONFIG = {"需求分类": "功能", "迭代": "迭代1", "处理人": "测试"}
+
+
+def requirement(req_id):
+    return {"需求ID": req_id, "标题": f"需求{req_id}", "详细描述": "描述", "优先级": "高"}
+
+
+def cases_text(title):
+    return f"### 测试用例1：{title}\n**优先级**：高\n**测试步骤**：\n1. 操作\n**预期结果**：成功\n"
+
+
+class FakeClient:
+    """按顺序返回预设回复的模型客户端，记录每次请求的提示"""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.prompts = []
+
+    def json_format(self, model_name):
+        return None
+
+    def prompt_budget(self, model_name):
+        return 100000
+
+    async def acall(self, model_name, messages, temperature=0.3, json_schema=None):
+        self.prompts.append(messages[-1]["content"])
+        return self.replies.pop(0)
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("测试") == 2
+    assert estimate_tokens("测试abcd") == 3
+    assert estimate_tokens("abcde") == 2
+
+
+def test_pack_by_item_count():
+    assert pack_requirements(list(range(5)), max_items=2) == [[0, 1], [2, 3], [4]]
+    assert pack_requirements(list(range(3)), max_items=0) == [[0, 1, 2]]
+
+
+def test_pack_by_token_budget():
+    items = ["aaaa" * 3, "aaaa" * 3, "aaaa" * 10, "aaaa"]
+    # 单条超过预算时独占一批
+    assert pack_requirements(items, max_items=0, max_tokens=7) == [items[:2], [items[2]], [items[3]]]
+    assert pack_requirements(items, max_items=1, max_tokens=100) == [[item] for item in items]
+
+
+def test_split_packed_response():
+    text = ("好的，以下是各需求的测试用例。\n"
+            "## 需求ID: R1\n用例一\n"
+            "### 需求ID：**R2**\n用例二\n"
+            "## 需求ID: R9\n不在本批中的需求\n"
+            "## 需求ID: R3\n\n"
+            "## 需求ID: R1\n用例一补充")
+    sections = split_packed_response(text, ["R1", "R2", "R3"])
+    assert sections == {"R1": "用例一\n\n用例一补充", "R2": "用例二"}
+    assert split_packed_response(None, ["R1"]) == {}
+
+
+def test_missing_section_falls_back_to_single_request():
+    packed = f"## 需求ID: R1\n{cases_text('一')}\n## 需求ID: R2\n没有用例\n"
+    client = FakeClient([packed, cases_text("二"), cases_text("三")])
+    generator = CaseGenerator(client, DEFAULT_CONFIG)
+    cases = asyncio.run(generator.agenerate_test_cases(
+        [requirement("R1"), requirement("R2"), requirement("R3")], "model", pack_size=3))
+
+    assert [case["用例编号"] for case in cases] == ["TC-R1-01", "TC-R2-01", "TC-R3-01"]
+    assert [case["标题"] for case in cases] == ["测试-需求R1-一", "测试-需求R2-二", "测试-需求R3-三"]
+    # 一个打包请求，R2（无法解析）和R3（缺失）各单独请求一次
+    assert len(client.prompts) == 3
+    assert "3条需求" in client.prompts[0]
+    assert all("需求ID: R1" not in prompt for prompt in client.prompts[1:])
+
+
+def test_failed_packed_request_is_not_split():
+    client = FakeClient([None])
+    generator = CaseGenerator(client, DEFAULT_CONFIG)
+    cases = asyncio.run(generator.agenerate_test_cases(
+        [requirement("R1"), requirement("R2")], "model", pack_size=2))
+    assert cases == []
+    assert len(client.prompts) == 1
@@ -0,0 +1,127 @@
+import asyncio
+import types
+import httpx
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+import pytest
+import rate_limiter
+from rate_limiter import RateLimiter, TokenBucket, parse_retry_after
+
+
+class FakeClock:
+    """替换rate_limiter中的time.monotonic和asyncio.sleep：sleep只推进时钟并记录等待的秒数"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", types.SimpleNamespace(monotonic=clock.monotonic, time=rate_limiter.time.time))
+    monkeypatch.setattr(rate_limiter, "asyncio", types.SimpleNamespace(sleep=clock.sleep))
+    return clock
+
+
+def test_token_bucket_reserve_returns_wait_for_overdraft(clock):
+    bucket = TokenBucket(60)  # 每秒补充1个
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(30) == pytest.approx(30.0)
+    # 预支之后的请求排在后面
+    assert bucket.reserve(1) == pytest.approx(31.0)
+
+
+def test_token_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket(60)
+    bucket.reserve(60)
+    clock.now += 10
+    assert bucket.reserve(10) == 0.0
+    clock.now += 3600
+    bucket._refill(clock.now)
+    assert bucket.tokens == 60
+
+
+def test_first_wave_reserves_estimate_against_tpm(clock):
+    limiter = RateLimiter(tpm=1000)
+    reserved = [asyncio.run(limiter.acquire(estimated_tokens=400)) for _ in range(3)]
+    assert reserved == [400, 400, 400]
+    # 前两次用掉800，第三次透支200，按每秒1000/60补充需等待12秒
+    assert clock.sleeps == [pytest.approx(12.0)]
+
+
+def test_without_estimate_first_wave_is_not_limited(clock):
+    limiter = RateLimiter(tpm=1000)
+    for _ in range(5):
+        assert asyncio.run(limiter.acquire()) == 0
+    assert clock.sleeps == []
+
+
+def test_record_usage_refunds_overestimate_and_updates_average(clock):
+    limiter = RateLimiter(tpm=1000)
+    reserved = asyncio.run(limiter.acquire(estimated_tokens=400))
+    limiter.record_usage(100, reserved)
+    assert limiter.token_bucket.tokens == pytest.approx(900)
+    # 有实际用量后按滑动平均预扣，不再使用请求前的估算
+    assert asyncio.run(limiter.acquire(estimated_tokens=400)) == 100
+    limiter.record_usage(200, 100)
+    assert limiter.avg_tokens == pytest.approx(120)
+
+
+def test_rpm_limits_request_count(clock):
+    limiter = RateLimiter(rpm=2)
+    for _ in range(3):
+        asyncio.run(limiter.acquire())
+    assert clock.sleeps == [pytest.approx(30.0)]
+
+
+def test_block_for_pauses_following_requests(clock):
+    limiter = RateLimiter()
+    limiter.block_for(5)
+    asyncio.run(limiter.acquire())
+    assert clock.sleeps == [pytest.approx(5.0)]
+    assert limiter.throttled == 1
+    assert limiter.waited_seconds == pytest.approx(5.0)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after(" 1.5 ") == 1.5
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after("") is None
+    assert parse_retry_after("soon") is None
+    past = format_datetime(datetime.now(timezone.utc) - timedelta(minutes=1), usegmt=True)
+    assert parse_retry_after(past) == 0.0
+    future = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=60), usegmt=True)
+    assert 55 <= parse_retry_after(future) <= 60
+
+
+def test_parse_retry_after_rejects_non_finite_values():
+    for value in ("inf", "-inf", "nan", "Infinity", "1e999"):
+        assert parse_retry_after(value) is None, value
+
+
+def test_parse_retry_after_caps_delay():
+    assert parse_retry_after("3600", max_seconds=30) == 30.0
+    assert parse_retry_after("5", max_seconds=30) == 5.0
+    future = format_datetime(datetime.now(timezone.utc) + timedelta(days=1), usegmt=True)
+    assert parse_retry_after(future, max_seconds=30) == 30.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT", max_seconds=30) == 0.0
+
+
+def test_client_caps_retry_after_at_breaker_open_seconds(make_client):
+    responses = [httpx.Response(429, headers={"Retry-After": "86400"}),
+                 httpx.Response(200, json={"choices": [{"message": {"content": "回复"}}]})]
+    client = make_client(lambda request: responses.pop(0), {"primary": {"circuit_breaker": {"open_seconds": 0.01}}})
+    messages = [{"role": "user", "content": "生成测试用例"}]
+    assert asyncio.run(client.acall("primary", messages)) == "回复"
+    limiter = client.limiters["primary"]
+    assert limiter.throttled == 1
+    assert limiter.waited_seconds < 1
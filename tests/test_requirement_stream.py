@@ -0,0 +1,84 @@
+import asyncio
+from openpyxl import Workbook
+import generate_testcase
+from requirement_stream import aiter_chunks, requirement_defaults, stream_excel_requirements
+
+DEFAULT_CONFIG = generate_testcase.DEFAULT_CONFIG
+
+
+def write_workbook(path, header, *rows):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+    return str(path)
+
+
+def test_columns_are_mapped_by_header(tmp_path):
+    path = write_workbook(tmp_path / "需求.xlsx", ["详细描述", None, "备注", "标题", "需求ID"],
+                          ["登录描述", "无表头的列", "备注1", "登录", "R1"])
+    assert list(stream_excel_requirements(path, DEFAULT_CONFIG)) == [
+        dict(requirement_defaults(DEFAULT_CONFIG), 需求ID="R1", 标题="登录", 详细描述="登录描述", 备注="备注1")
+    ]
+
+
+def test_blank_cells_take_the_defaults_of_missing_columns(tmp_path):
+    optional = ["优先级", "父需求", "需求分类", "迭代", "处理人"]
+    blank = write_workbook(tmp_path / "blank.xlsx", ["需求ID", "标题", "详细描述"] + optional,
+                           ["R1", "登录", "描述", None, None, None, None, None],
+                           [None, None, None, None, None, None, None, None],
+                           [None, "注销", None, "高", "R1", None, None, None])
+    missing = write_workbook(tmp_path / "missing.xlsx", ["需求ID", "标题", "详细描述"],
+                             ["R1", "登录", "描述"])
+
+    requirements = list(stream_excel_requirements(blank, DEFAULT_CONFIG))
+    # 全空的行跳过，缺少需求ID时按产出顺序编号，其余空单元格为空字符串
+    assert [req["需求ID"] for req in requirements] == ["R1", "REQ002"]
+    assert requirements[1]["详细描述"] == ""
+    assert requirements[1]["优先级"] == "高" and requirements[1]["父需求"] == "R1"
+    # 空单元格与pandas读取器中缺少该列时的默认值相同
+    assert requirements[0] == generate_testcase.read_excel_requirements(missing)[0]
+
+
+def test_missing_optional_columns_match_pandas_loader(tmp_path):
+    path = write_workbook(tmp_path / "需求.xlsx", ["标题", "详细描述"], ["登录", "描述1"], ["注销", "描述2"])
+    requirements = list(stream_excel_requirements(path, DEFAULT_CONFIG))
+    assert requirements == generate_testcase.read_excel_requirements(path)
+    assert [req["需求ID"] for req in requirements] == ["REQ001", "REQ002"]
+
+
+def test_fully_filled_workbook_matches_pandas_loader(tmp_path):
+    header = ["需求ID", "标题", "详细描述", "优先级", "父需求", "需求分类", "迭代", "处理人"]
+    path = write_workbook(tmp_path / "需求.xlsx", header,
+                          ["R1", "登录", "描述1", "高", "R0", "账号", "迭代2", "张三"],
+                          ["R2", "注销", "描述2", "低", "R1", "账号", "迭代3", "李四"])
+    assert list(stream_excel_requirements(path, DEFAULT_CONFIG)) == generate_testcase.read_excel_requirements(path)
+
+
+def test_collect_receives_each_requirement_as_it_is_read(tmp_path):
+    path = write_workbook(tmp_path / "需求.xlsx", ["标题", "详细描述"], ["登录", "描述1"], ["注销", "描述2"])
+    collected = []
+    stream = stream_excel_requirements(path, DEFAULT_CONFIG, collect=collected)
+    first = next(stream)
+    assert collected == [first]
+    rest = list(stream)
+    assert collected == [first] + rest and len(collected) == 2
+
+
+def test_missing_required_columns_or_unreadable_file_yield_nothing(tmp_path):
+    path = write_workbook(tmp_path / "需求.xlsx", ["需求ID", "标题"], ["R1", "登录"])
+    collected = []
+    assert list(stream_excel_requirements(path, DEFAULT_CONFIG, collect=collected)) == []
+    assert collected == []
+    assert list(stream_excel_requirements(str(tmp_path / "missing.xlsx"), DEFAULT_CONFIG)) == []
+
+
+def test_aiter_chunks():
+    async def chunks(requirements, size):
+        return [chunk async for chunk in aiter_chunks(requirements, size)]
+
+    assert asyncio.run(chunks([1, 2, 3], 2)) == [[1, 2, 3]]
+    assert asyncio.run(chunks([], 2)) == []
+    assert asyncio.run(chunks(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
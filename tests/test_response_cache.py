@@ -0,0 +1,69 @@
+import os
+import asyncio
+import httpx
+import pytest
+from response_cache import ResponseCache
+
+VALUE = {"content": "### 测试用例1：登录成功", "usage": {"total_tokens": 10}}
+
+
+def test_make_key_is_stable_and_payload_sensitive():
+    key = ResponseCache.make_key("m", "http://a", {"messages": [1], "temperature": 0.7})
+    assert key == ResponseCache.make_key("m", "http://a", {"temperature": 0.7, "messages": [1]})
+    assert key != ResponseCache.make_key("m", "http://a", {"messages": [1], "temperature": 0.3})
+    assert key != ResponseCache.make_key("other", "http://a", {"messages": [1], "temperature": 0.7})
+
+
+def test_put_and_get_round_trip(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    assert cache.get("ab" * 32) is None
+    cache.put("ab" * 32, VALUE)
+    assert cache.get("ab" * 32) == VALUE
+    assert cache.get_stats() == {"mode": "readwrite", "hits": 1, "misses": 1, "hit_rate": 0.5,
+                                 "writes": 1, "evictions": 0}
+
+
+def test_modes(tmp_path):
+    with pytest.raises(ValueError):
+        ResponseCache(str(tmp_path), mode="sometimes")
+    ResponseCache(str(tmp_path), mode="read").put("01" * 32, VALUE)
+    assert not os.path.exists(tmp_path / "01")
+    ResponseCache(str(tmp_path), mode="write").put("01" * 32, VALUE)
+    assert ResponseCache(str(tmp_path), mode="write").get("01" * 32) is None
+    assert ResponseCache(str(tmp_path), mode="read").get("01" * 32) == VALUE
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    keys = {name: name * 64 for name in "abcd"}
+    for name in "abc":
+        cache.put(keys[name], VALUE)
+    # 明确设定写入时间，不依赖文件系统时间戳的精度
+    for offset, name in enumerate("abc"):
+        os.utime(cache._path(keys[name]), (1000 + offset, 1000 + offset))
+
+    # 重新打开缓存时从目录重建索引；读取a后a成为最近访问的条目
+    cache = ResponseCache(str(tmp_path))
+    assert cache.get(keys["a"]) == VALUE
+    cache.max_bytes = cache._total_bytes
+    cache.put(keys["d"], VALUE)
+
+    assert cache.evictions == 1
+    assert cache.get(keys["b"]) is None
+    assert all(cache.get(keys[name]) == VALUE for name in "acd")
+
+
+def test_client_serves_repeated_request_from_cache(make_client, tmp_path):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "回复"}}], "usage": {}})
+
+    client = make_client(handler)
+    client.cache = ResponseCache(str(tmp_path))
+    messages = [{"role": "user", "content": "生成测试用例"}]
+    assert asyncio.run(client.acall("primary", messages)) == "回复"
+    assert asyncio.run(client.acall("primary", messages)) == "回复"
+    assert len(calls) == 1
+    assert client.cache.hits == 1
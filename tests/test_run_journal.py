@@ -0,0 +1,108 @@
+import asyncio
+from ai_client import StreamInterrupted
+from case_generation import CaseGenerator
+from run_journal import RunJournal, json_default
+
+DEFAULT_CONFIG = {"需求分类": "功能", "迭代": "迭代1", "处理人": "测试"}
+CASES_TEXT = ("### 测试用例1：登录成功\n**优先级**：高\n**测试步骤**：\n1. 输入账号\n**预期结果**：成功\n"
+              "### 测试用例2：密码错误\n**优先级**：中\n**测试步骤**：\n1. 输入错误密码\n**预期结果**：提示错误\n")
+
+
+def requirement(req_id):
+    return {"需求ID": req_id, "标题": f"需求{req_id}", "详细描述": "描述", "优先级": "高"}
+
+
+class FakeClient:
+    """普通调用返回CASES_TEXT；流式调用按块产出CASES_TEXT，interrupt_after不为None时产出该数量的块后中断"""
+
+    def __init__(self, interrupt_after=None):
+        self.interrupt_after = interrupt_after
+        self.calls = []
+
+    def json_format(self, model_name):
+        return None
+
+    async def acall(self, model_name, messages, temperature=0.3, json_schema=None):
+        self.calls.append(messages[-1]["content"])
+        return CASES_TEXT
+
+    async def astream(self, model_name, messages, temperature=0.3):
+        self.calls.append(messages[-1]["content"])
+        for index, start in enumerate(range(0, len(CASES_TEXT), 10)):
+            if index == self.interrupt_after:
+                raise StreamInterrupted("连接断开")
+            yield CASES_TEXT[start:start + 10]
+
+
+def test_records_survive_reopen(tmp_path):
+    journal = RunJournal("run1", str(tmp_path))
+    journal.start(model="m")
+    journal.record("R2", "回复2", [{"用例编号": "TC-R2-01"}])
+    journal.record(1, "回复1", [{"用例编号": "TC-1-01"}, {"用例编号": "TC-1-02"}])
+    journal.close()
+
+    journal = RunJournal("run1", str(tmp_path))
+    assert journal.exists
+    assert journal.meta["model"] == "m"
+    assert journal.is_done("1") and journal.is_done("R2") and not journal.is_done("R3")
+    # 按需求顺序重建，与完成先后无关
+    cases = journal.cases_for([{"需求ID": 1}, {"需求ID": "R2"}, {"需求ID": "R3"}])
+    assert [case["用例编号"] for case in cases] == ["TC-1-01", "TC-1-02", "TC-R2-01"]
+    # 续跑时不重复记录运行参数
+    journal.start(model="other")
+    journal.close()
+    assert sum('"type": "run"' in line for line in open(journal.path, encoding="utf-8")) == 1
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    journal = RunJournal("run1", str(tmp_path))
+    journal.record("R1", "回复", [])
+    journal.close()
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"type": "requirement", "req_id": "R2", "cas')
+
+    journal = RunJournal("run1", str(tmp_path))
+    assert journal.is_done("R1") and not journal.is_done("R2")
+    journal.record("R3", "回复", [])
+    journal.close()
+    assert set(RunJournal("run1", str(tmp_path)).entries) == {"R1", "R3"}
+
+
+def test_json_default_converts_scalars():
+    class Scalar:
+        def item(self):
+            return 3
+
+    assert json_default(Scalar()) == 3
+    assert json_default(object).startswith("<class")
+
+
+def test_resume_skips_completed_requirements(tmp_path):
+    journal = RunJournal("run1", str(tmp_path))
+    journal.record("R1", "旧回复", [{"用例编号": "TC-R1-01", "标题": "上次生成的用例"}])
+    client = FakeClient()
+    cases = asyncio.run(CaseGenerator(client, DEFAULT_CONFIG).agenerate_test_cases(
+        [requirement("R1"), requirement("R2")], "model", journal=journal))
+
+    assert len(client.calls) == 1 and "需求ID: R2" in client.calls[0]
+    assert [case["用例编号"] for case in cases] == ["TC-R1-01", "TC-R2-01", "TC-R2-02"]
+    assert cases[0]["标题"] == "上次生成的用例"
+    assert journal.is_done("R2")
+
+
+def test_interrupted_stream_is_not_journaled(tmp_path):
+    journal = RunJournal("run1", str(tmp_path))
+    generator = CaseGenerator(FakeClient(interrupt_after=8), DEFAULT_CONFIG)
+    received = []
+    cases = asyncio.run(generator.agenerate_test_cases(
+        [requirement("R1")], "model", stream=True, on_case=received.append, journal=journal))
+
+    # 只保留中断前已闭合的用例，且不写入日志，续跑时重新生成
+    assert [case["用例编号"] for case in received] == ["TC-R1-01"]
+    assert cases == []
+    assert not journal.is_done("R1")
+
+    generator = CaseGenerator(FakeClient(), DEFAULT_CONFIG)
+    cases = asyncio.run(generator.agenerate_test_cases([requirement("R1")], "model", stream=True, journal=journal))
+    assert [case["用例编号"] for case in cases] == ["TC-R1-01", "TC-R1-02"]
+    assert journal.entries["R1"]["response"] == CASES_TEXT
@@ -0,0 +1,116 @@
+import json
+import asyncio
+import httpx
+import pytest
+from ai_client import StreamInterrupted, _stream_delta
+from case_parser import StreamingCaseParser, parse_case_block
+
+MESSAGES = [{"role": "user", "content": "生成测试用例"}]
+
+
+def sse(*events):
+    return "".join(f"data: {json.dumps(event, ensure_ascii=False)}\n\n" for event in events) + "data: [DONE]\n\n"
+
+
+def openai_chunk(content):
+    return {"choices": [{"delta": {"content": content}}]}
+
+
+async def collect(stream):
+    return [delta async for delta in stream]
+
+
+def test_stream_delta_formats():
+    assert _stream_delta("openai", openai_chunk("你好")) == "你好"
+    assert _stream_delta("openai", {"choices": [{"delta": {"role": "assistant"}}]}) == ""
+    assert _stream_delta("openai", {"choices": [], "usage": {"total_tokens": 3}}) == ""
+    assert _stream_delta("dashscope", {"output": {"choices": [{"message": {"content": "你好"}}]}}) == "你好"
+    assert _stream_delta("dashscope", {"output": {"text": "你好"}}) == "你好"
+    assert _stream_delta("dashscope", {"output": {}}) == ""
+
+
+def test_openai_stream_yields_deltas_and_records_usage(make_client):
+    payloads = []
+
+    def handler(request):
+        payloads.append(json.loads(request.content))
+        body = ": keep-alive\n\n" + sse(openai_chunk("### 测试用例1："), openai_chunk("登录"),
+                                        {"choices": [], "usage": {"prompt_tokens": 7, "total_tokens": 12}})
+        return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+
+    client = make_client(handler)
+    assert asyncio.run(collect(client.astream("primary", MESSAGES))) == ["### 测试用例1：", "登录"]
+    assert payloads[0]["stream"] is True
+    assert payloads[0]["stream_options"] == {"include_usage": True}
+    stats = client.get_token_stats("primary")
+    assert (stats.requests, stats.actual_prompt, stats.actual_total) == (1, 7, 12)
+    assert len(client.get_latency_tracker("primary").samples) == 1
+
+
+def test_dashscope_stream_requests_incremental_output(make_client):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        body = sse({"output": {"choices": [{"message": {"content": "第一段"}}]}},
+                   {"output": {"choices": [{"message": {"content": "第二段"}}]}, "usage": {"total_tokens": 9}})
+        return httpx.Response(200, text=body)
+
+    client = make_client(handler, {"primary": {"stream_format": "dashscope"}})
+    assert asyncio.run(collect(client.astream("primary", MESSAGES))) == ["第一段", "第二段"]
+    assert requests[0].headers["X-DashScope-SSE"] == "enable"
+    assert json.loads(requests[0].content)["parameters"]["incremental_output"] is True
+    assert client.get_token_stats("primary").actual_total == 9
+
+
+def test_stream_cut_off_after_output_raises(make_client):
+    calls = []
+
+    async def body():
+        yield f"data: {json.dumps(openai_chunk('部分内容'), ensure_ascii=False)}\n\n".encode()
+        raise httpx.ReadError("连接断开")
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, content=body())
+
+    client = make_client(handler)
+    received = []
+
+    async def consume():
+        async for delta in client.astream("primary", MESSAGES):
+            received.append(delta)
+
+    with pytest.raises(StreamInterrupted):
+        asyncio.run(consume())
+    # 已产出内容后不重试，以免重复产出
+    assert received == ["部分内容"]
+    assert len(calls) == 1
+
+
+def test_stream_error_before_output_is_retried(make_client):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(200, text=sse(openai_chunk("完整内容")))
+
+    client = make_client(handler)
+    assert asyncio.run(collect(client.astream("primary", MESSAGES))) == ["完整内容"]
+    assert len(calls) == 2
+
+
+def test_streaming_parser_emits_blocks_as_headers_arrive():
+    parser = StreamingCaseParser()
+    text = ("好的：\n### 测试用例1：登录成功\n**优先级**：高\n**测试步骤**：\n1. 输入账号\n**预期结果**：登录成功\n"
+            "### 测试用例2：密码错误\n**优先级**：中\n**预期结果**：提示错误")
+    blocks = []
+    for start in range(0, len(text), 7):
+        blocks += parser.feed(text[start:start + 7])
+    assert len(blocks) == 1
+    blocks += parser.close()
+    assert [parse_case_block(block)["title"] for block in blocks] == ["登录成功", "密码错误"]
+    assert parse_case_block(blocks[0])["steps"] == ["输入账号"]
+    assert parser.emitted == 2
@@ -0,0 +1,77 @@
+import io
+import json
+import asyncio
+import logging
+import pytest
+from structured_log import RUN_ID, ROOT_LOGGER, configure_logging, get_logger, request_context, set_run_id
+
+logger = get_logger("test")
+
+
+@pytest.fixture
+def log_stream():
+    """把aitestsuite日志输出到StringIO，测试结束后恢复原有配置"""
+    root = logging.getLogger(ROOT_LOGGER)
+    saved = (list(root.handlers), root.level, root.propagate)
+    token = RUN_ID.set(None)
+    yield io.StringIO()
+    RUN_ID.reset(token)
+    root.handlers[:] = saved[0]
+    root.setLevel(saved[1])
+    root.propagate = saved[2]
+
+
+def test_json_format(log_stream):
+    configure_logging("info", "json", log_stream)
+    set_run_id("run1")
+    logger.debug("不输出")
+    with request_context("REQ001"):
+        logger.info("生成 %d 条用例", 3, extra={"model": "m"})
+    logger.warning("结束")
+
+    entries = [json.loads(line) for line in log_stream.getvalue().splitlines()]
+    assert len(entries) == 2
+    assert entries[0]["msg"] == "生成 3 条用例"
+    assert entries[0]["level"] == "INFO" and entries[0]["logger"] == f"{ROOT_LOGGER}.test"
+    assert (entries[0]["run_id"], entries[0]["req_id"], entries[0]["model"]) == ("run1", "REQ001", "m")
+    assert entries[1]["req_id"] is None and entries[1]["run_id"] == "run1"
+
+
+def test_text_format(log_stream):
+    configure_logging("DEBUG", "text", log_stream)
+    with request_context("REQ002"):
+        logger.debug("调试信息", extra={"model": "m"})
+    logger.info("无上下文")
+
+    lines = log_stream.getvalue().splitlines()
+    assert lines[0].endswith("DEBUG 调试信息 [req_id=REQ002 model=m]")
+    assert lines[1].endswith("INFO 无上下文")
+
+
+def test_configure_logging_rejects_unknown_format(log_stream):
+    with pytest.raises(ValueError):
+        configure_logging("INFO", "xml", log_stream)
+
+
+def test_context_is_kept_per_concurrent_task(log_stream):
+    configure_logging("INFO", "json", log_stream)
+
+    async def handle(req_id, delay):
+        with request_context(req_id):
+            logger.info("开始")
+            await asyncio.sleep(delay)
+            logger.info("完成")
+
+    async def run():
+        set_run_id("run2")
+        # 后开始的任务先完成，日志交错输出
+        await asyncio.gather(handle("REQ001", 0.02), handle("REQ002", 0.01), handle("REQ003", 0))
+
+    asyncio.run(run())
+    entries = [json.loads(line) for line in log_stream.getvalue().splitlines()]
+    assert len(entries) == 6
+    assert {entry["run_id"] for entry in entries} == {"run2"}
+    finished = [entry["req_id"] for entry in entries if entry["msg"] == "完成"]
+    assert finished == ["REQ003", "REQ002", "REQ001"]
+    # 事件循环中设置的运行ID不影响外层
+    assert RUN_ID.get() is None
@@ -0,0 +1,64 @@
+import asyncio
+import httpx
+from metrics import MetricsRegistry
+from prompt_packing import estimate_tokens
+from token_budget import MESSAGE_OVERHEAD_TOKENS, estimate_messages_tokens, split_text
+
+
+def test_split_text_keeps_short_text_whole():
+    assert split_text("第一段\n\n第二段", 100) == ["第一段\n\n第二段"]
+
+
+def test_split_text_chunks_stay_within_budget():
+    paragraphs = ["\n".join(f"第{p}段第{i}行的内容。" for i in range(4)) for p in range(10)]
+    text = "\n\n".join(paragraphs)
+    chunks = split_text(text, 40)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 40 for chunk in chunks)
+    # 切分点在行尾，不丢失也不拆开任何一行
+    assert [line for chunk in chunks for line in chunk.split("\n") if line] == [line for line in text.split("\n") if line]
+
+
+def test_split_text_prefers_paragraph_boundaries():
+    paragraphs = ["\n".join(f"第{p}段第{i}行" for i in range(3)) for p in range(4)]
+    chunks = split_text("\n\n".join(paragraphs), 30)
+    # 每段约18 tokens，第二段放不下时整段移到下一块，不在段落中间断开
+    assert chunks == paragraphs
+
+
+def test_split_text_hard_splits_long_lines():
+    line = "长" * 95
+    chunks = split_text(f"开头\n{line}\n结尾", 30)
+    assert all(estimate_tokens(chunk) <= 30 for chunk in chunks)
+    assert "".join(chunks).replace("\n", "") == f"开头{line}结尾"
+
+
+def test_estimate_messages_tokens():
+    messages = [{"role": "system", "content": "你好"}, {"role": "user", "content": "abcdefgh"}]
+    assert estimate_messages_tokens(messages) == 2 + 2 + 2 * MESSAGE_OVERHEAD_TOKENS
+
+
+def test_preflight_rejects_prompt_over_budget(make_client):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+    client = make_client(handler, {"primary": {"context_tokens": 120, "output_reserve": 20}})
+    client.metrics = MetricsRegistry()
+    assert client.prompt_budget("primary") == 100
+
+    within = [{"role": "user", "content": "短" * (100 - MESSAGE_OVERHEAD_TOKENS)}]
+    over = [{"role": "user", "content": "长" * (101 - MESSAGE_OVERHEAD_TOKENS)}]
+    assert asyncio.run(client.acall("primary", within)) == "ok"
+    assert asyncio.run(client.acall("primary", over)) is None
+
+    async def stream():
+        return [delta async for delta in client.astream("primary", over)]
+
+    assert asyncio.run(stream()) == []
+    # 超出上限的请求不发起网络请求
+    assert len(requests) == 1
+    assert client.get_token_stats("primary").rejected == 2
+    assert client.metrics.value("errors_total", model="primary", type="context_overflow") == 2
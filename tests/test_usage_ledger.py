@@ -0,0 +1,92 @@
+import json
+import time
+import asyncio
+import sqlite3
+import httpx
+import pytest
+import usage_ledger
+from usage_ledger import UsageLedger, format_summary, main, usage_tokens
+
+TODAY = time.strftime("%Y-%m-%d")
+
+
+def test_usage_tokens_field_names():
+    assert usage_tokens({"prompt_tokens": 10, "completion_tokens": 5}) == (10, 5, False)
+    assert usage_tokens({"input_tokens": 7, "output_tokens": 3}) == (7, 3, False)
+    assert usage_tokens({}, estimated_prompt=42) == (42, 0, True)
+    assert usage_tokens(None) == (0, 0, True)
+
+
+def test_summary_groups_costs_and_throughput(tmp_path):
+    ledger = UsageLedger(str(tmp_path / "ledger.db"), input_file="需求.xlsx")
+    ledger.record("a", {"prompt_tokens": 1000, "completion_tokens": 500, "total_tokens": 1500}, 2.0,
+                  price=(2.0, 8.0), run_id="run1", req_id="R1")
+    ledger.record("a", {"prompt_tokens": 1000, "completion_tokens": 300}, 1.0, price=(2.0, 8.0), run_id="run1")
+    ledger.record("b", {}, 0.5, estimated_prompt=200, stream=True, run_id="run2")
+
+    rows = ledger.summary(("model",))
+    assert rows[0] == {
+        "model": "a", "calls": 2, "prompt_tokens": 2000, "completion_tokens": 800, "total_tokens": 2800,
+        "estimated_calls": 0, "latency_seconds": 3.0, "avg_latency_seconds": 1.5, "tokens_per_second": 266.7,
+        "cost": pytest.approx((2000 * 2.0 + 800 * 8.0) / 1_000_000)
+    }
+    assert rows[1]["model"] == "b" and rows[1]["estimated_calls"] == 1 and rows[1]["prompt_tokens"] == 200
+    assert [row["run"] for row in ledger.summary(("run",))] == ["run1", "run2"]
+    assert ledger.summary(("day", "input"))[0] == dict(ledger.summary(())[0], day=TODAY, input="需求.xlsx")
+    assert ledger.summary((), model="b")[0]["calls"] == 1
+    assert ledger.summary((), since="2999-01-01") == []
+    ledger.close()
+
+
+def test_records_are_buffered_until_flush(tmp_path, monkeypatch):
+    monkeypatch.setattr(usage_ledger, "FLUSH_SECONDS", 3600)
+    path = str(tmp_path / "ledger.db")
+    ledger = UsageLedger(path)
+
+    def stored():
+        with sqlite3.connect(path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM calls").fetchone()[0]
+
+    for _ in range(usage_ledger.FLUSH_ROWS - 1):
+        ledger.record("a", {"total_tokens": 1}, 0.1)
+    assert stored() == 0
+    ledger.record("a", {"total_tokens": 1}, 0.1)
+    assert stored() == usage_ledger.FLUSH_ROWS
+    ledger.record("a", {"total_tokens": 1}, 0.1)
+    ledger.close()
+    assert stored() == usage_ledger.FLUSH_ROWS + 1
+
+
+def test_format_summary_aligns_wide_characters():
+    rows = [{"model": "模型", "calls": 1, "prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2,
+             "avg_latency_seconds": 0.5, "tokens_per_second": None, "cost": 0.0}]
+    header, line = format_summary(rows, ["model"]).split("\n")
+    assert header.startswith("model  调用次数")
+    assert line.startswith("模型   1")
+    assert "-" in line.split()
+
+
+def test_cli_prints_json(tmp_path, capsys):
+    path = str(tmp_path / "ledger.db")
+    ledger = UsageLedger(path)
+    ledger.record("a", {"prompt_tokens": 3, "completion_tokens": 4}, 1.0)
+    ledger.close()
+    main(["--ledger", path, "--by", "model", "--json"])
+    assert json.loads(capsys.readouterr().out)[0]["total_tokens"] == 7
+    with pytest.raises(SystemExit) as exit_info:
+        main(["--ledger", path, "--by", "week"])
+    assert exit_info.value.code == 2
+
+
+def test_client_records_each_call(make_client, tmp_path):
+    def handler(request):
+        return httpx.Response(200, json={"choices": [{"message": {"content": "回复"}}],
+                                         "usage": {"prompt_tokens": 9, "completion_tokens": 2, "total_tokens": 11}})
+
+    client = make_client(handler, {"primary": {"price": {"prompt": 1.0, "completion": 2.0}}})
+    client.ledger = UsageLedger(str(tmp_path / "ledger.db"))
+    asyncio.run(client.acall("primary", [{"role": "user", "content": "生成测试用例"}]))
+    row = client.ledger.summary(("model",))[0]
+    client.ledger.close()
+    assert (row["model"], row["prompt_tokens"], row["completion_tokens"]) == ("primary", 9, 2)
+    assert row["cost"] == pytest.approx(13 / 1_000_000)
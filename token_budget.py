@@ -0,0 +1,95 @@
+from prompt_packing import estimate_tokens
+
+# 上下文窗口默认参数，可在模型配置的"context_tokens"/"output_reserve"字段或
+# 环境变量 {前缀}_CONTEXT_TOKENS/{前缀}_OUTPUT_RESERVE 中覆盖
+DEFAULT_CONTEXT_TOKENS = 32000
+DEFAULT_OUTPUT_RESERVE = 4000
+
+# 每条消息的角色、分隔符等额外开销
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_messages_tokens(messages):
+    """估算消息列表占用的输入tokens数"""
+    return sum(estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def split_text(text, max_tokens):
+    """把文本按行切分为若干段，每段估算不超过max_tokens
+
+    优先在空行（段落）处断开，其次在行尾断开；单行超过预算时按字符硬切。
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    chunks = []
+    lines = []
+    size = 0
+
+    def flush():
+        nonlocal lines, size
+        if lines:
+            chunks.append("\n".join(lines).strip("\n"))
+        lines, size = [], 0
+
+    for line in text.split("\n"):
+        line_tokens = estimate_tokens(line) + 1
+        if line_tokens > max_tokens:
+            flush()
+            # 每个字符至多1个token，按max_tokens个字符切分一定不超预算
+            pieces = [line[i:i + max_tokens] for i in range(0, len(line), max_tokens)]
+            chunks.extend(pieces[:-1])
+            lines, size = [pieces[-1]], estimate_tokens(pieces[-1]) + 1
+            continue
+        if size + line_tokens > max_tokens:
+            # 回退到最近的段落边界，把不完整的段落整体移到下一段
+            cut = max((i for i, prev in enumerate(lines) if not prev.strip()), default=0)
+            carry = lines[cut:] if cut else []
+            lines = lines[:cut] if cut else lines
+            flush()
+            lines, size = carry, sum(estimate_tokens(prev) + 1 for prev in carry)
+            if size + line_tokens > max_tokens:
+                flush()
+        lines.append(line)
+        size += line_tokens
+    flush()
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+class TokenStats:
+    """单个模型的tokens预估与实际用量统计"""
+
+    def __init__(self):
+        self.requests = 0
+        self.estimated_prompt = 0
+        self.actual_prompt = 0
+        self.actual_total = 0
+        self.rejected = 0
+        self._matched_estimate = 0  # 有实际用量可对照的请求的预估值之和
+
+    def record(self, estimated, usage):
+        self.requests += 1
+        self.estimated_prompt += estimated
+        actual = usage.get("prompt_tokens", usage.get("input_tokens", 0)) or 0
+        if actual:
+            self.actual_prompt += actual
+            self._matched_estimate += estimated
+        self.actual_total += usage.get("total_tokens", 0) or 0
+
+    @property
+    def estimate_error(self):
+        """预估输入tokens相对实际值的偏差比例，没有实际值时返回None"""
+        if not self.actual_prompt:
+            return None
+        return (self._matched_estimate - self.actual_prompt) / self.actual_prompt
+
+    def to_dict(self):
+        error = self.estimate_error
+        return {
+            "requests": self.requests,
+            "estimated_prompt_tokens": self.estimated_prompt,
+            "actual_prompt_tokens": self.actual_prompt,
+            "actual_total_tokens": self.actual_total,
+            "estimate_error": round(error, 4) if error is not None else None,
+            "rejected": self.rejected
+        }
@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+
+DEFAULT_LEDGER_PATH = "./.usage/ledger.db"
+
+# 汇总时可用的分组维度 -> SQL表达式
+GROUP_COLUMNS = {
+    "day": "day",
+    "model": "model",
+    "input": "input_file",
+    "run": "run_id"
+}
+
+# 缓冲的记录达到该条数或距上次写入超过该秒数时写入数据库
+FLUSH_ROWS = 50
+FLUSH_SECONDS = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    run_id TEXT,
+    req_id TEXT,
+    input_file TEXT,
+    model TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    total_tokens INTEGER NOT NULL,
+    estimated INTEGER NOT NULL,
+    latency_seconds REAL NOT NULL,
+    stream INTEGER NOT NULL,
+    prompt_price REAL NOT NULL,
+    completion_price REAL NOT NULL,
+    cost REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS calls_day ON calls (day);
+CREATE INDEX IF NOT EXISTS calls_model ON calls (model);
+"""
+
+_COLUMNS = ("ts", "day", "run_id", "req_id", "input_file", "model", "prompt_tokens", "completion_tokens",
+            "total_tokens", "estimated", "latency_seconds", "stream", "prompt_price", "completion_price", "cost")
+
+
+def usage_tokens(usage, estimated_prompt=0):
+    """从响应的usage中取出(输入tokens, 输出tokens, 是否为预估值)
+
+    兼容OpenAI（prompt_tokens/completion_tokens）和通义千问（input_tokens/output_tokens）的字段名；
+    响应未返回用量时输入tokens取请求前的预估值，输出tokens记为0。
+    """
+    usage = usage or {}
+    prompt = usage.get("prompt_tokens") or usage.get("input_tokens") or 0
+    completion = usage.get("completion_tokens") or usage.get("output_tokens") or 0
+    if not prompt and not completion:
+        return estimated_prompt, 0, True
+    return prompt, completion, False
+
+
+class UsageLedger:
+    """跨运行持久保存的模型调用台账（SQLite）
+
+    每次成功的模型请求记录一行：输入/输出tokens、耗时、当时配置的单价和费用，以及运行ID、
+    需求ID和输入文件，用于按天、模型、输入文件汇总费用和吞吐。
+    记录先缓存在内存中批量写入，不在事件循环中为每个请求单独提交事务；close()时写入剩余记录。
+    """
+
+    def __init__(self, path=DEFAULT_LEDGER_PATH, input_file=None):
+        self.path = path
+        self.input_file = input_file
+        self.recorded = 0
+        self._rows = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 记录来自后台事件循环线程，汇总和关闭可能在主线程
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def record(self, model, usage, latency, price=(0.0, 0.0), estimated_prompt=0, stream=False,
+               run_id=None, req_id=None):
+        """记录一次模型调用；price为(输入, 输出)每百万tokens的单价"""
+        prompt, completion, estimated = usage_tokens(usage, estimated_prompt)
+        total = (usage or {}).get("total_tokens") or prompt + completion
+        cost = (prompt * price[0] + completion * price[1]) / 1_000_000
+        now = time.time()
+        row = (now, time.strftime("%Y-%m-%d", time.localtime(now)), run_id, req_id, self.input_file, model,
+               prompt, completion, total, int(estimated), round(latency, 6), int(stream),
+               price[0], price[1], cost)
+        with self._lock:
+            self._rows.append(row)
+            self.recorded += 1
+            if len(self._rows) >= FLUSH_ROWS or time.monotonic() - self._last_flush >= FLUSH_SECONDS:
+                self._flush()
+
+    def _flush(self):
+        if self._rows:
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT INTO calls ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                    self._rows
+                )
+            self._rows = []
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """立即写入缓存的记录"""
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._conn.close()
+
+    def summary(self, group_by=("day", "model"), since=None, until=None, model=None):
+        """按维度汇总调用次数、tokens、费用和吞吐，返回字典列表
+
+        since/until为YYYY-MM-DD（含当天），tokens_per_second为输出tokens除以请求耗时之和。
+        """
+        self.flush()
+        columns = [GROUP_COLUMNS[key] for key in group_by]
+        where, params = [], []
+        if since:
+            where.append("day >= ?")
+            params.append(since)
+        if until:
+            where.append("day <= ?")
+            params.append(until)
+        if model:
+            where.append("model = ?")
+            params.append(model)
+        select = ", ".join(columns + [
+            "COUNT(*)", "SUM(prompt_tokens)", "SUM(completion_tokens)", "SUM(total_tokens)",
+            "SUM(estimated)", "SUM(latency_seconds)", "SUM(cost)"
+        ])
+        sql = f"SELECT {select} FROM calls"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if columns:
+            sql += f" GROUP BY {', '.join(columns)} ORDER BY {', '.join(columns)}"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        results = []
+        for row in rows:
+            keys, values = row[:len(columns)], row[len(columns):]
+            calls, prompt, completion, total, estimated, latency, cost = values
+            if not calls:
+                continue
+            results.append(dict(zip(group_by, keys), **{
+                "calls": calls,
+                "prompt_tokens": prompt,
+                "completion_tokens": completion,
+                "total_tokens": total,
+                "estimated_calls": estimated,
+                "latency_seconds": round(latency, 3),
+                "avg_latency_seconds": round(latency / calls, 3),
+                "tokens_per_second": round(completion / latency, 1) if latency else None,
+                "cost": round(cost, 6)
+            }))
+        return results
+
+
+def format_summary(rows, group_by):
+    """把summary()的结果格式化为对齐的文本表格"""
+    headers = list(group_by) + ["调用次数", "输入tokens", "输出tokens", "总tokens", "平均耗时(秒)", "输出tokens/秒", "费用"]
+    keys = list(group_by) + ["calls", "prompt_tokens", "completion_tokens", "total_tokens",
+                             "avg_latency_seconds", "tokens_per_second", "cost"]
+    table = [headers] + [[("-" if row[key] is None else str(row[key])) for key in keys] for row in rows]
+    widths = [max(_display_width(line[i]) for line in table) for i in range(len(headers))]
+    return "\n".join(
+        "  ".join(cell + " " * (width - _display_width(cell)) for cell, width in zip(line, widths)).rstrip()
+        for line in table
+    )
+
+
+def _display_width(text):
+    # 中文字符在终端中占两列
+    return sum(2 if ord(ch) > 0x2E80 else 1 for ch in text)
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='汇总模型调用台账中的tokens用量、费用和吞吐')
+    parser.add_argument('--ledger', type=str, default=DEFAULT_LEDGER_PATH,
+                        help=f'台账数据库路径（默认：{DEFAULT_LEDGER_PATH}）')
+    parser.add_argument('--by', type=str, default='day,model',
+                        help=f'分组维度，逗号分隔，可选：{", ".join(GROUP_COLUMNS)}（默认：day,model）')
+    parser.add_argument('--since', type=str, help='起始日期YYYY-MM-DD（含）')
+    parser.add_argument('--until', type=str, help='结束日期YYYY-MM-DD（含）')
+    parser.add_argument('--model', type=str, help='只汇总指定模型')
+    parser.add_argument('--json', action='store_true', help='以JSON输出')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    group_by = [key.strip() for key in args.by.split(",") if key.strip()]
+    unknown = [key for key in group_by if key not in GROUP_COLUMNS]
+    if unknown:
+        print(f"错误：不支持的分组维度 {', '.join(unknown)}，可选：{', '.join(GROUP_COLUMNS)}")
+        sys.exit(2)
+    if not os.path.exists(args.ledger):
+        print(f"错误：台账 {args.ledger} 不存在")
+        sys.exit(1)
+
+    ledger = UsageLedger(args.ledger)
+    try:
+        rows = ledger.summary(group_by, args.since, args.until, args.model)
+    finally:
+        ledger.close()
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+    elif rows:
+        print(format_summary(rows, group_by))
+    else:
+        print("台账中没有符合条件的记录")
+
+
+if __name__ == "__main__":
+    main()